@@ -19,7 +19,9 @@ aws --endpoint-url $Endpoint --region $Region sqs create-queue --queue-name outb
 
 aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name Tenants --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=tenant_id,AttributeType=S --key-schema AttributeName=tenant_id,KeyType=HASH
 
-aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name Conversations --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH
+aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name Conversations --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S AttributeName=sk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH AttributeName=sk,KeyType=RANGE
+
+aws --endpoint-url $Endpoint --region $Region dynamodb update-time-to-live --table-name Conversations --time-to-live-specification "Enabled=true,AttributeName=expires_at"
 
 aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name Messages --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S AttributeName=sk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH AttributeName=sk,KeyType=RANGE
 
@@ -27,13 +29,26 @@ aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name
 
 aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name Campaigns --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH
 
+aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name CampaignRuns --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S AttributeName=sk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH AttributeName=sk,KeyType=RANGE
+
+aws --endpoint-url $Endpoint --region $Region dynamodb update-time-to-live --table-name CampaignRuns --time-to-live-specification "Enabled=true,AttributeName=expires_at"
+
 aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name Consents --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH
 
-aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name IntentsStats --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH
+aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name IntentsStats --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S AttributeName=sk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH AttributeName=sk,KeyType=RANGE
+
+aws --endpoint-url $Endpoint --region $Region dynamodb update-time-to-live --table-name IntentsStats --time-to-live-specification "Enabled=true,AttributeName=expires_at"
 
-aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name MembersIndex --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH
+aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name MembersIndex --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S AttributeName=tenant_id,AttributeType=S AttributeName=phone,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH --global-secondary-indexes "IndexName=tenant_phone_index,KeySchema=[{AttributeName=tenant_id,KeyType=HASH},{AttributeName=phone,KeyType=RANGE}],Projection={ProjectionType=ALL}"
 
 aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name Consents --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH
+aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name NluCache --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH
+
+aws --endpoint-url $Endpoint --region $Region dynamodb update-time-to-live --table-name NluCache --time-to-live-specification "Enabled=true,AttributeName=expires_at"
+
+aws --endpoint-url $Endpoint --region $Region dynamodb create-table --table-name ClassSchedule --billing-mode PAY_PER_REQUEST --attribute-definitions AttributeName=pk,AttributeType=S AttributeName=sk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH AttributeName=sk,KeyType=RANGE
+
+aws --endpoint-url $Endpoint --region $Region dynamodb update-time-to-live --table-name ClassSchedule --time-to-live-specification "Enabled=true,AttributeName=expires_at"
 
 #"=== S3 bucket ==="
 
@@ -3,12 +3,14 @@ Adapter do OpenAI Chat Completions używany jako NLU.
 
 Udostępnia metody:
 - chat / chat_async: surowe wywołanie modelu z mechanizmem retry,
-- classify / classify_async: wygodny wrapper do klasyfikacji intencji.
+- classify / classify_async: wygodny wrapper do klasyfikacji intencji,
+- embed: embeddingi tekstów (semantyczne wyszukiwanie FAQ).
 """
 
 from __future__ import annotations
 
 from typing import Dict, Any, Optional
+import hashlib
 import json
 import time
 import random
@@ -32,6 +34,10 @@ pg_contract_status slots: {"email": optional}
 """
 
 
+# Wersja promptu – część klucza cache klasyfikacji (zmiana promptu = nowe klucze).
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+
 _VALID_INTENTS = {
     "reserve_class", "faq", "handover", "clarify", "ticket",
     "pg_available_classes", "pg_contract_status",
@@ -58,6 +64,7 @@ class OpenAIClient:
         self.api_key = api_key or getattr(settings, "openai_api_key", None)
         self.enabled = bool(self.api_key)
         self.model = model or getattr(settings, "llm_model", "gpt-4o-mini")
+        self.embedding_model = getattr(settings, "embedding_model", "text-embedding-3-small")
         self.client = OpenAI(api_key=self.api_key) if self.enabled else None
 
     def _chat_once(
@@ -186,6 +193,21 @@ class OpenAIClient:
         content = await self.chat_async(messages, model=self.model, max_tokens=256)
         return self._parse_classification(content)
 
+    def embed(self, texts: list[str], model: Optional[str] = None) -> Optional[list[list[float]]]:
+        """
+        Zwraca embeddingi dla listy tekstów (w tej samej kolejności).
+
+        Bez API key albo przy błędzie API zwraca None – wywołujący traktuje to
+        jak brak dopasowania i idzie dalej zwykłą ścieżką.
+        """
+        if not self.enabled or not self.client or not texts:
+            return None
+        try:
+            resp = self.client.embeddings.create(model=model or self.embedding_model, input=texts)
+        except APIError:
+            return None
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
     def _parse_classification(self, content: str) -> Dict[str, Any]:
         """
         Normalizuje odpowiedź modelu do słownika o polach:
@@ -1,4 +1,12 @@
+import asyncio
+import os
+import threading
+from urllib.parse import urljoin
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+
 from ..common.config import settings
 from ..common.logging import logger
 from datetime import datetime
@@ -24,12 +32,95 @@ BASE_CLASS_FIELDS = [
     "ClubId",
 ]
 
+# Pula połączeń keep-alive do PerfectGym (współdzielona w procesie).
+PG_POOL_SIZE = int(os.getenv("PG_POOL_SIZE", "10"))
+PG_CONNECT_TIMEOUT = float(os.getenv("PG_CONNECT_TIMEOUT", "3.05"))
+
+# Timeout odczytu per endpoint (sekundy); nadpisywalne przez PG_TIMEOUT_<ENDPOINT>.
+_DEFAULT_READ_TIMEOUTS = {
+    "member": 5,
+    "reserve": 10,
+    "classes": 5,
+    "contracts": 5,
+    "balance": 5,
+}
+PG_READ_TIMEOUTS = {
+    name: float(os.getenv(f"PG_TIMEOUT_{name.upper()}", str(default)))
+    for name, default in _DEFAULT_READ_TIMEOUTS.items()
+}
+
+_SESSION: requests.Session | None = None
+_SESSION_LOCK = threading.Lock()
+
+
+def pg_session() -> requests.Session:
+    """
+    Współdzielona sesja HTTP (keep-alive + pula połączeń) – kolejne wywołania
+    w ciepłym kontenerze nie otwierają nowego połączenia TCP+TLS.
+    """
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=PG_POOL_SIZE, pool_maxsize=PG_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _SESSION = session
+    return _SESSION
+
+
+def reset_pg_session() -> None:
+    """Zamyka współdzieloną sesję (testy, zmiana konfiguracji)."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is not None:
+            _SESSION.close()
+        _SESSION = None
+
+
+def pg_timeout(endpoint: str) -> tuple[float, float]:
+    """(connect, read) timeout dla danego endpointu."""
+    return PG_CONNECT_TIMEOUT, PG_READ_TIMEOUTS.get(endpoint, 10.0)
+
+
 class PerfectGymClient:
-    def __init__(self):
+    """
+    Klient PerfectGym (OData).
+
+    Metody synchroniczne idą przez współdzieloną sesję requests (pg_session),
+    wersje *_async przez httpx.AsyncClient z tą samą wielkością puli.
+    Ten sam obiekt może być używany przez cały proces (RoutingService trzyma jeden).
+
+    AsyncClient nie jest trzymany między pętlami zdarzeń (każde asyncio.run
+    w Lambdzie to nowa pętla, a pula httpx jest z nią związana). Żeby kilka
+    wywołań *_async dzieliło połączenia, obejmujemy je blokiem:
+
+        async with pg:
+            await asyncio.gather(pg.get_member_async(...), ...)
+
+    Poza blokiem każde wywołanie otwiera i zamyka własnego klienta.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session | None = None,
+        async_transport: httpx.AsyncBaseTransport | None = None,
+    ):
         self.base_url = settings.pg_base_url  # np. "https://<club>.perfectgym.com/api/v2.2/odata"
         self.client_id = settings.pg_client_id
         self.client_secret = settings.pg_client_secret
         self.logger = logger
+        self._session = session
+        # transport httpx dla klientów async (np. MockTransport w testach)
+        self._async_transport = async_transport
+        self._async_client: httpx.AsyncClient | None = None
+        self._async_loop = None
+        self._async_depth = 0
+
+    @property
+    def session(self) -> requests.Session:
+        return self._session or pg_session()
 
     def _headers(self):
         return {
@@ -38,13 +129,78 @@ class PerfectGymClient:
             "Content-Type": "application/json"
         }
 
+    def _new_async_http(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=PG_POOL_SIZE,
+                max_keepalive_connections=PG_POOL_SIZE,
+            ),
+            transport=self._async_transport,
+        )
+
+    def _scoped_async_http(self) -> httpx.AsyncClient | None:
+        """Klient otwarty przez `async with` w bieżącej pętli albo None."""
+        if self._async_client is not None and self._async_loop is asyncio.get_running_loop():
+            return self._async_client
+        return None
+
+    async def __aenter__(self) -> "PerfectGymClient":
+        if self._scoped_async_http() is None:
+            # klient z poprzedniej (zakończonej) pętli nie został zamknięty przez __aexit__
+            # – nie da się go już zamknąć w tej pętli, porzucamy referencję
+            self._async_client = self._new_async_http()
+            self._async_loop = asyncio.get_running_loop()
+            self._async_depth = 0
+        self._async_depth += 1
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._async_depth -= 1
+        if self._async_depth <= 0:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        client, self._async_client, self._async_loop = self._async_client, None, None
+        self._async_depth = 0
+        if client is not None:
+            await client.aclose()
+
+    def _get_json(self, endpoint: str, url: str, params: dict | None = None) -> Any:
+        r = self.session.get(url, headers=self._headers(), params=params, timeout=pg_timeout(endpoint))
+        r.raise_for_status()
+        return r.json()
+
+    async def _aget_json(self, endpoint: str, url: str, params: dict | None = None) -> Any:
+        client = self._scoped_async_http()
+        if client is None:
+            # wywołanie poza `async with` – klient tylko na to jedno zapytanie
+            async with self._new_async_http() as own:
+                return await self._arequest(own, endpoint, url, params)
+        return await self._arequest(client, endpoint, url, params)
+
+    async def _arequest(self, client: httpx.AsyncClient, endpoint: str, url: str, params: dict | None) -> Any:
+        connect, read = pg_timeout(endpoint)
+        r = await client.get(
+            url,
+            headers=self._headers(),
+            params=params,
+            timeout=httpx.Timeout(read, connect=connect),
+        )
+        r.raise_for_status()
+        return r.json()
+
+    def _member_url(self, member_id: str) -> str:
+        return f"{self.base_url}/Members({member_id})?$expand=Contracts($filter=Status eq 'Current'),memberbalance"
+
     def get_member(self, member_id: str):
         if not self.base_url:
             return {"member_id": member_id, "status": "Current", "balance": 0}
-        url = f"{self.base_url}/Members({member_id})?$expand=Contracts($filter=Status eq 'Current'),memberbalance"
-        r = requests.get(url, headers=self._headers(), timeout=10)
-        r.raise_for_status()
-        return r.json()
+        return self._get_json("member", self._member_url(member_id))
+
+    async def get_member_async(self, member_id: str):
+        if not self.base_url:
+            return {"member_id": member_id, "status": "Current", "balance": 0}
+        return await self._aget_json("member", self._member_url(member_id))
 
     def reserve_class(self, member_id: str, class_id: str, idempotency_key: str):
         if not self.base_url:
@@ -53,10 +209,46 @@ class PerfectGymClient:
         payload = {"MemberId": member_id}
         headers = self._headers()
         headers["Idempotency-Key"] = idempotency_key
-        r = requests.post(url, json=payload, headers=headers, timeout=10)
+        r = self.session.post(url, json=payload, headers=headers, timeout=pg_timeout("reserve"))
         r.raise_for_status()
         return r.json()
-        
+
+    def _classes_params(
+        self,
+        from_iso,
+        top: int | None,
+        to_iso=None,
+        club_id: int | None = None,
+        fields: list[str] | None = None,
+    ) -> Dict[str, Any]:
+        # domyślnie – od teraz
+        if from_iso is None:
+            from_iso = datetime.utcnow()
+
+        # OData oczekuje formatu bez "Z" – dokładnie jak w Twoim curlu.
+        # Przykład: 2025-11-22T19:33:10.201Z
+        # Tu robimy prosty ISO bez mikrosekund; możesz ewentualnie dopracować.
+        start_str = from_iso.replace(microsecond=0).isoformat() + "Z"
+
+        filter_expr = f"isDeleted eq false and startdate gt {start_str}"
+        if to_iso is not None:
+            filter_expr += f" and startdate lt {to_iso.replace(microsecond=0).isoformat()}Z"
+        if club_id is not None:
+            filter_expr += f" and clubId eq {int(club_id)}"
+
+        params: Dict[str, Any] = {
+            "$filter": filter_expr,
+            "$orderby": "startdate",
+        }
+        if fields:
+            # lekkie zapytanie (np. tylko liczniki miejsc) – bez rozwijania classType
+            params["$select"] = ",".join(fields)
+        else:
+            params["$expand"] = "classType"
+        if top is not None:
+            params["$top"] = str(top)
+        return params
+
     def get_available_classes(
         self,
         club_id: int | None = None,
@@ -64,7 +256,7 @@ class PerfectGymClient:
         to_iso: str | None = None,
         member_id: int | None = None,
         fields: list[str] | None = None,
-        top: int | None = None, 
+        top: int | None = None,
     ) -> list[dict]:
         """
         Pobiera listę zaplanowanych zajęć z PerfectGym.
@@ -76,49 +268,21 @@ class PerfectGymClient:
             &$expand=classType
             &$orderby=startdate
 
-        Wrzucamy minimalną logikę – w przyszłości możesz tu dorzucić
-        dodatkowe filtry (typ zajęć, klub, zakres dat).
+        Opcjonalnie zawęża zakres dat (to_iso), klub (club_id) i pola
+        ($select z fields – wtedy bez $expand=classType).
         """
-        select_fields = fields or BASE_CLASS_FIELDS
-        params: dict[str, str] = {
-            "$select": ",".join(select_fields),
-        }
         if not settings.pg_base_url:
             logger.warning({"pg": "pg_base_url_missing"})
         if not self.base_url:
             self.logger.warning({"pg": "base_url_missing"})
             return {"value": []}
 
-        url = f"{self.base_url}/Classes"
-
-        # domyślnie – od teraz
-        if from_iso is None:
-            from_iso = datetime.utcnow()
-
-        # OData oczekuje formatu bez "Z" – dokładnie jak w Twoim curlu.
-        # Przykład: 2025-11-22T19:33:10.201Z
-        # Tu robimy prosty ISO bez mikrosekund; możesz ewentualnie dopracować.
-        start_str = from_iso.replace(microsecond=0).isoformat() + "Z"
-
-        filter_expr = f"isDeleted eq false and startdate gt {start_str}"
-
-        params: Dict[str, Any] = {
-            "$filter": filter_expr,
-            "$expand": "classType",
-            "$orderby": "startdate",
-        }
-        if top is not None:
-            params["$top"] = str(top)
-
         try:
-            resp = requests.get(
-                url,
-                headers=self._headers(),
-                params=params,
-                timeout=10,
+            data = self._get_json(
+                "classes",
+                f"{self.base_url}/Classes",
+                self._classes_params(from_iso, top, to_iso=to_iso, club_id=club_id, fields=fields),
             )
-            resp.raise_for_status()
-            data = resp.json()
             self.logger.info(
                 {
                     "pg": "get_available_classes_ok",
@@ -131,6 +295,63 @@ class PerfectGymClient:
             # Bezpieczny fallback – pusta lista
             return {"value": []}
 
+    async def get_available_classes_async(self, from_iso=None, top: int | None = None) -> dict:
+        """Asynchroniczna wersja get_available_classes (ten sam fallback przy błędzie)."""
+        if not self.base_url:
+            self.logger.warning({"pg": "base_url_missing"})
+            return {"value": []}
+        try:
+            data = await self._aget_json("classes", f"{self.base_url}/Classes", self._classes_params(from_iso, top))
+            self.logger.info({"pg": "get_available_classes_ok", "count": len(data.get("value", []))})
+            return data
+        except httpx.HTTPError as e:
+            self.logger.error({"pg": "get_available_classes_error", "error": str(e)})
+            return {"value": []}
+
+    def iter_available_classes(
+        self,
+        from_iso=None,
+        to_iso=None,
+        club_id: int | None = None,
+        page_size: int | None = None,
+        fields: list[str] | None = None,
+    ):
+        """
+        Generator po wszystkich zajęciach z zakresu – przechodzi kolejne strony
+        OData (@odata.nextLink). W przeciwieństwie do get_available_classes
+        błędy HTTP są propagowane (job synchronizacji nie może uznać
+        niepełnej listy za pełny grafik).
+        """
+        if not self.base_url:
+            self.logger.warning({"pg": "base_url_missing"})
+            return
+        url: str | None = f"{self.base_url}/Classes"
+        params: dict | None = self._classes_params(
+            from_iso, page_size, to_iso=to_iso, club_id=club_id, fields=fields
+        )
+        pages = 0
+        while url:
+            data = self._get_json("classes", url, params)
+            pages += 1
+            yield from data.get("value", []) or []
+            # nextLink zawiera już wszystkie parametry zapytania (w tym $skip / skiptoken)
+            next_link = data.get("@odata.nextLink")
+            url = urljoin(self.base_url.rstrip("/") + "/", next_link) if next_link else None
+            params = None
+        self.logger.info({"pg": "iter_available_classes_done", "pages": pages})
+
+    def _contracts_params(self, email: str, phone_number: str) -> Dict[str, Any]:
+        # Uwaga: w OData stringi muszą być w pojedynczych cudzysłowach.
+        # requests zajmie się URL-encodingiem.
+        filter_expr = (
+            f"Member/email eq '{email}' and Member/phoneNumber eq '{phone_number}'"
+        )
+
+        return {
+            "$expand": "Member,PaymentPlan",
+            "$filter": filter_expr,
+        }
+
     def get_contracts_by_email_and_phone(
         self,
         email: str,
@@ -151,28 +372,10 @@ class PerfectGymClient:
             self.logger.warning({"pg": "base_url_missing"})
             return {"value": []}
 
-        url = f"{self.base_url}/Contracts"
-
-        # Uwaga: w OData stringi muszą być w pojedynczych cudzysłowach.
-        # requests zajmie się URL-encodingiem.
-        filter_expr = (
-            f"Member/email eq '{email}' and Member/phoneNumber eq '{phone_number}'"
-        )
-
-        params = {
-            "$expand": "Member,PaymentPlan",
-            "$filter": filter_expr,
-        }
-
         try:
-            resp = requests.get(
-                url,
-                headers=self._headers(),
-                params=params,
-                timeout=10,
+            data = self._get_json(
+                "contracts", f"{self.base_url}/Contracts", self._contracts_params(email, phone_number)
             )
-            resp.raise_for_status()
-            data = resp.json()
             self.logger.info(
                 {
                     "pg": "get_contracts_by_email_and_phone_ok",
@@ -183,7 +386,21 @@ class PerfectGymClient:
         except requests.RequestException as e:
             self.logger.error({"pg": "get_contracts_by_email_and_phone_error", "error": str(e)})
             return {"value": []}
-    
+
+    async def get_contracts_by_email_and_phone_async(self, email: str, phone_number: str) -> Dict[str, Any]:
+        if not self.base_url:
+            self.logger.warning({"pg": "base_url_missing"})
+            return {"value": []}
+        try:
+            data = await self._aget_json(
+                "contracts", f"{self.base_url}/Contracts", self._contracts_params(email, phone_number)
+            )
+            self.logger.info({"pg": "get_contracts_by_email_and_phone_ok", "count": len(data.get("value", []))})
+            return data
+        except httpx.HTTPError as e:
+            self.logger.error({"pg": "get_contracts_by_email_and_phone_error", "error": str(e)})
+            return {"value": []}
+
     def get_member_balance(self, member_id: int) -> dict:
         """
         Zwraca informację o saldzie membera.
@@ -191,9 +408,7 @@ class PerfectGymClient:
         """
         url = f"{self.base_url}/Members({member_id})/Balance"
         try:
-            resp = requests.get(url, headers=self._headers(), timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
+            data = self._get_json("balance", url)
             self.logger.info(
                 {"pg": "get_member_balance_ok", "member_id": member_id}
             )
@@ -203,4 +418,14 @@ class PerfectGymClient:
                 {"pg": "get_member_balance_error", "member_id": member_id, "error": str(e)}
             )
             # fallback – zero zaległości
-            return {"balance": 0}
\ No newline at end of file
+            return {"balance": 0}
+
+    async def get_member_balance_async(self, member_id: int) -> dict:
+        url = f"{self.base_url}/Members({member_id})/Balance"
+        try:
+            data = await self._aget_json("balance", url)
+            self.logger.info({"pg": "get_member_balance_ok", "member_id": member_id})
+            return data
+        except httpx.HTTPError as e:
+            self.logger.error({"pg": "get_member_balance_error", "member_id": member_id, "error": str(e)})
+            return {"balance": 0}
@@ -1,37 +1,146 @@
 # src/common/aws.py
 import os
+import threading
 import boto3
 from botocore.config import Config
 
+from .cache import TTLCache, MISSING
+from .logging import logger
+
+# Klienci/resource'y boto3 są drogie w budowie (parsowanie modeli usług,
+# nowa pula połączeń => nowe handshake'i TLS), więc je memoizujemy.
+# Klucz: (rodzaj, usługa, endpoint, region).
+# - klienci są bezpieczni wątkowo – jeden na proces,
+# - resource'y (i obiekty Table) nie są – jeden na wątek (threading.local).
+_CLIENTS: dict[tuple, object] = {}
+_CLIENTS_LOCK = threading.Lock()
+_LOCAL = threading.local()
+# podbijane przez reset_clients – unieważnia cache wszystkich wątków
+_GENERATION = 0
+
+# URL-e kolejek rozwiązywane przez get_queue_url (gdy brak zmiennej env).
+_QUEUE_URLS = TTLCache(
+    maxsize=64,
+    ttl_seconds=int(os.getenv("QUEUE_URL_CACHE_TTL_SECONDS", "3600")),
+)
+QUEUE_URL_NEGATIVE_TTL_SECONDS = int(os.getenv("QUEUE_URL_NEGATIVE_TTL_SECONDS", "30"))
+# Liczba faktycznych wywołań get_queue_url per kolejka (metryka skuteczności cache).
+QUEUE_URL_LOOKUPS: dict[str, int] = {}
+
 def _region():
     return os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "eu-central-1"
 
 def _cfg():
     return Config(
-        retries={"max_attempts": int(os.getenv("AWS_MAX_ATTEMPTS", "3")), "mode": "standard"}
+        retries={"max_attempts": int(os.getenv("AWS_MAX_ATTEMPTS", "3")), "mode": "standard"},
+        max_pool_connections=int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "20")),
+        connect_timeout=float(os.getenv("AWS_CONNECT_TIMEOUT", "2")),
+        read_timeout=float(os.getenv("AWS_READ_TIMEOUT", "10")),
+        tcp_keepalive=os.getenv("AWS_TCP_KEEPALIVE", "true").lower() == "true",
     )
 
+def _cached(kind: str, service: str):
+    ep = _endpoint_for(service)
+    region = _region()
+    key = (kind, service, ep, region)
+    obj = _CLIENTS.get(key)
+    if obj is not None:
+        return obj
+
+    with _CLIENTS_LOCK:
+        obj = _CLIENTS.get(key)
+        if obj is None:
+            kwargs = {"region_name": region, "config": _cfg()}
+            if ep:
+                kwargs["endpoint_url"] = ep
+            factory = boto3.client if kind == "client" else boto3.resource
+            obj = factory(service, **kwargs)
+            _CLIENTS[key] = obj
+        return obj
+
+def _thread_cache() -> dict:
+    cache = getattr(_LOCAL, "cache", None)
+    if cache is None or getattr(_LOCAL, "generation", None) != _GENERATION:
+        cache = _LOCAL.cache = {}
+        _LOCAL.generation = _GENERATION
+    return cache
+
+def _thread_resource(service: str):
+    """Resource boto3 dla bieżącego wątku (resource'y nie są bezpieczne wątkowo)."""
+    ep = _endpoint_for(service)
+    region = _region()
+    key = ("resource", service, ep, region)
+    cache = _thread_cache()
+    obj = cache.get(key)
+    if obj is None:
+        kwargs = {"region_name": region, "config": _cfg()}
+        if ep:
+            kwargs["endpoint_url"] = ep
+        # domyślna sesja boto3 jest współdzielona – samo tworzenie serializujemy
+        with _CLIENTS_LOCK:
+            obj = boto3.resource(service, **kwargs)
+        cache[key] = obj
+    return obj
+
+def reset_clients() -> None:
+    """Czyści cache klientów i resource'ów wszystkich wątków (np. w testach albo po zmianie endpointów)."""
+    global _GENERATION
+    with _CLIENTS_LOCK:
+        _CLIENTS.clear()
+        _GENERATION += 1
+
+def _lookup_queue_url(env_name: str) -> str | None:
+    """
+    get_queue_url po nazwie kolejki (fallback LocalStack), z cache per proces.
+    Brak kolejki też jest cache'owany, ale krócej (QUEUE_URL_NEGATIVE_TTL_SECONDS).
+    """
+    key = (env_name, _region())
+    cached = _QUEUE_URLS.get(key)
+    if cached is not MISSING:
+        return cached
+
+    QUEUE_URL_LOOKUPS[env_name] = QUEUE_URL_LOOKUPS.get(env_name, 0) + 1
+    try:
+        url = sqs_client().get_queue_url(QueueName=env_name)["QueueUrl"]
+    except Exception:
+        url = None
+
+    logger.info(
+        {
+            "metric": "queue_url_lookup",
+            "queue": env_name,
+            "found": url is not None,
+            "lookups": QUEUE_URL_LOOKUPS[env_name],
+        }
+    )
+    if url:
+        _QUEUE_URLS.set(key, url)
+    else:
+        _QUEUE_URLS.set(key, None, ttl_seconds=QUEUE_URL_NEGATIVE_TTL_SECONDS)
+    return url
+
 def resolve_queue_url(env_name: str) -> str:
     url = os.getenv(env_name)
     if url:
         return url
 
     # LocalStack fallback by queue name
-    try:
-        sqs = sqs_client()
-        return sqs.get_queue_url(QueueName=env_name)["QueueUrl"]
-    except Exception:
+    url = _lookup_queue_url(env_name)
+    if not url:
         raise ValueError(f"Missing queue URL env: {env_name}")
+    return url
 
 def resolve_optional_queue_url(env_name: str) -> str | None:
     url = os.getenv(env_name)
     if url:
         return url
-    try:
-        return sqs_client().get_queue_url(QueueName=env_name)["QueueUrl"]
-    except Exception:
-        return None
-    
+    return _lookup_queue_url(env_name)
+
+def reset_queue_urls() -> None:
+    """Czyści cache URL-i kolejek i licznik lookupów."""
+    _QUEUE_URLS.clear()
+    QUEUE_URL_LOOKUPS.clear()
+
 def _endpoint_for(service: str) -> str | None:
     # 1) endpoint per-usługa (najwyższy priorytet)
     per_service = os.getenv(f"{service.upper()}_ENDPOINT") or os.getenv("LOCALSTACK_ENDPOINT") # np. S3_ENDPOINT, SQS_ENDPOINT
@@ -56,22 +165,37 @@ def _endpoint_for(service: str) -> str | None:
     return None
 
 def s3_client():
-    ep = _endpoint_for("s3")
-    kwargs = {"region_name": _region(), "config": _cfg()}
-    if ep:
-        kwargs["endpoint_url"] = ep
-    return boto3.client("s3", **kwargs)
+    return _cached("client", "s3")
 
 def sqs_client():
-    ep = _endpoint_for("sqs")
-    kwargs = {"region_name": _region(), "config": _cfg()}
-    if ep:
-        kwargs["endpoint_url"] = ep
-    return boto3.client("sqs", **kwargs)
+    return _cached("client", "sqs")
 
 def ddb_resource():
-    ep = _endpoint_for("dynamodb")
-    kwargs = {"region_name": _region(), "config": _cfg()}
-    if ep:
-        kwargs["endpoint_url"] = ep
-    return boto3.resource("dynamodb", **kwargs)
+    return _thread_resource("dynamodb")
+
+class ThreadLocalTable:
+    """
+    Tabela DynamoDB bezpieczna do współdzielenia między wątkami: każde użycie
+    deleguje do obiektu Table z resource'a bieżącego wątku.
+    Repozytoria trzymają ją w self.table zamiast ddb_resource().Table(...).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _table(self):
+        cache = _thread_cache()
+        key = ("table", _endpoint_for("dynamodb"), _region(), self.name)
+        table = cache.get(key)
+        if table is None:
+            table = cache[key] = ddb_resource().Table(self.name)
+        return table
+
+    def __getattr__(self, attr):
+        return getattr(self._table(), attr)
+
+    def __repr__(self) -> str:
+        return f"ThreadLocalTable({self.name!r})"
+
+def ddb_table(name: str) -> ThreadLocalTable:
+    return ThreadLocalTable(name)
@@ -0,0 +1,97 @@
+"""
+Prosty cache w pamięci procesu (per kontener Lambdy).
+
+TTLCache = LRU z limitem liczby wpisów + TTL per wpis.
+Używany do cache'owania odczytów z DDB/S3, które zmieniają się rzadko
+(szablony, konfiguracja tenantów itp.).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+# Sentinel odróżniający "brak w cache" od zapisanej wartości None
+# (negative caching).
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Ograniczony cache LRU z TTL i licznikami trafień.
+
+    - get() zwraca MISSING (lub podany default), jeśli klucza nie ma lub wygasł,
+    - set() pozwala nadpisać TTL dla pojedynczego wpisu (np. krótszy TTL dla braków),
+    - invalidate() / invalidate_where() / clear() to hooki do ręcznego unieważniania.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl_seconds: float = 300,
+        now_fn: Optional[Callable[[], float]] = None,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._now_fn = now_fn or time.monotonic
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        now = self._now_fn()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = self._now_fn() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Usuwa wszystkie wpisy, których klucz spełnia predicate. Zwraca liczbę usuniętych."""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+        }
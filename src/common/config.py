@@ -33,6 +33,7 @@ class Settings:
     # OpenAI / LLM
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     llm_model: str = os.getenv("LLM_MODEL", "gpt-4o-mini")
+    embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 
     # PerfectGym
     pg_base_url: str = os.getenv("PG_BASE_URL", "")
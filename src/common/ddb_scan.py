@@ -0,0 +1,180 @@
+"""
+Pełny (stronicowany) i równoległy scan tabel DynamoDB dla jobów batchowych.
+
+Pojedyncze table.scan() zwraca maksymalnie 1 MB danych – reszta jest
+dostępna dopiero po kolejnym wywołaniu z ExclusiveStartKey=LastEvaluatedKey.
+Helper:
+
+- przechodzi wszystkie strony (LastEvaluatedKey),
+- dzieli tabelę na TotalSegments segmentów skanowanych na puli wątków,
+- buduje ProjectionExpression z listy atrybutów (przez #aliasy, więc nazwy
+  zarezerwowane w DDB typu "status" czy "name" też działają),
+- zwraca generator – pozycje są przetwarzane w trakcie scanu, bez
+  ładowania całej tabeli do pamięci (kolejka między wątkami a konsumentem
+  jest ograniczona, więc wolny konsument spowalnia scan).
+
+Wątki korzystają z table.meta.client (klienci boto3 są bezpieczni wątkowo,
+resource'y nie), z tą samą (de)serializacją typów co table.scan().
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Iterator, Optional
+
+DDB_SCAN_SEGMENTS = int(os.getenv("DDB_SCAN_SEGMENTS", "4"))
+DDB_SCAN_MAX_WORKERS = int(os.getenv("DDB_SCAN_MAX_WORKERS", "4"))
+
+_DONE = object()
+
+
+def projection_kwargs(attributes: Iterable[str], names: Optional[dict] = None) -> dict:
+    """
+    ["pk", "status"] -> {"ProjectionExpression": "#p0, #p1",
+                         "ExpressionAttributeNames": {"#p0": "pk", "#p1": "status"}}
+    Istniejące ExpressionAttributeNames (np. z FilterExpression) są zachowane.
+    """
+    merged = dict(names or {})
+    aliases = []
+    for i, attr in enumerate(attributes):
+        alias = f"#p{i}"
+        merged[alias] = attr
+        aliases.append(alias)
+    if not aliases:
+        return {"ExpressionAttributeNames": merged} if merged else {}
+    return {"ProjectionExpression": ", ".join(aliases), "ExpressionAttributeNames": merged}
+
+
+def _scan_kwargs(
+    table,
+    projection: Optional[Iterable[str]],
+    filter_expression: Any,
+    page_size: Optional[int],
+    extra: dict,
+) -> dict:
+    kwargs = {"TableName": table.name, **extra}
+    if filter_expression is not None:
+        kwargs["FilterExpression"] = filter_expression
+    if page_size:
+        kwargs["Limit"] = int(page_size)
+    if projection:
+        kwargs.update(projection_kwargs(projection, kwargs.get("ExpressionAttributeNames")))
+    return kwargs
+
+
+def scan_segment_pages(table, segment: int = 0, total_segments: int = 1, **scan_kwargs) -> Iterator[dict]:
+    """
+    Odpowiedzi scan (strony) jednego segmentu, aż do braku LastEvaluatedKey.
+    scan_kwargs to gotowe parametry API (TableName, FilterExpression, ...).
+    """
+    kwargs = dict(scan_kwargs)
+    kwargs.setdefault("TableName", table.name)
+    if total_segments > 1:
+        kwargs["Segment"] = segment
+        kwargs["TotalSegments"] = total_segments
+    client = table.meta.client
+    while True:
+        resp = client.scan(**kwargs)
+        yield resp
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+class ScanStats:
+    """Liczniki scanu (ScannedCount to pozycje przeczytane przed FilterExpression)."""
+
+    def __init__(self) -> None:
+        self.pages = 0
+        self.scanned = 0
+        self.returned = 0
+        self._lock = threading.Lock()
+
+    def add(self, resp: dict) -> None:
+        with self._lock:
+            self.pages += 1
+            self.scanned += int(resp.get("ScannedCount", 0))
+            self.returned += int(resp.get("Count", 0))
+
+    def as_dict(self) -> dict:
+        return {"pages": self.pages, "scanned": self.scanned, "returned": self.returned}
+
+
+def parallel_scan(
+    table,
+    segments: int = DDB_SCAN_SEGMENTS,
+    max_workers: int = DDB_SCAN_MAX_WORKERS,
+    projection: Optional[Iterable[str]] = None,
+    filter_expression: Any = None,
+    page_size: Optional[int] = None,
+    stats: Optional[ScanStats] = None,
+    **scan_kwargs,
+) -> Iterator[dict]:
+    """
+    Generator wszystkich pozycji tabeli (po FilterExpression).
+
+    segments    – TotalSegments; 1 = zwykły stronicowany scan,
+    max_workers – wątki skanujące segmenty; 1 = segmenty po kolei w bieżącym
+                  wątku (np. moto w testach, które nie jest bezpieczne wątkowo),
+    projection  – lista atrybutów do pobrania,
+    page_size   – Limit na jedno wywołanie scan,
+    stats       – opcjonalny ScanStats uzupełniany w trakcie scanu.
+
+    Kolejność pozycji między segmentami nie jest określona. Błąd w dowolnym
+    segmencie jest rzucany z generatora; przerwanie iteracji zatrzymuje wątki.
+    """
+    segments = max(1, int(segments))
+    workers = max(1, min(int(max_workers), segments))
+    kwargs = _scan_kwargs(table, projection, filter_expression, page_size, scan_kwargs)
+
+    if workers == 1:
+        for segment in range(segments):
+            for resp in scan_segment_pages(table, segment, segments, **kwargs):
+                if stats is not None:
+                    stats.add(resp)
+                yield from resp.get("Items", []) or []
+        return
+
+    pages: queue.Queue = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+
+    def _put(value) -> bool:
+        # nie blokujemy się na pełnej kolejce, gdy konsument już skończył
+        while not stop.is_set():
+            try:
+                pages.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(segment: int) -> None:
+        try:
+            for resp in scan_segment_pages(table, segment, segments, **kwargs):
+                if stats is not None:
+                    stats.add(resp)
+                if not _put(resp.get("Items", []) or []):
+                    return
+        except BaseException as e:  # przekazujemy do konsumenta
+            _put(e)
+        finally:
+            _put(_DONE)
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ddb-scan")
+    try:
+        for segment in range(segments):
+            pool.submit(_run, segment)
+        remaining = segments
+        while remaining:
+            value = pages.get()
+            if value is _DONE:
+                remaining -= 1
+            elif isinstance(value, BaseException):
+                raise value
+            else:
+                yield from value
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
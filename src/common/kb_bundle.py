@@ -0,0 +1,139 @@
+"""
+Binarny bundle KB tenanta: wszystkie języki i tematy FAQ w jednym pliku.
+
+Zamiast osobnego faq_<lang>.json (GET + json.loads + normalizacja kluczy
+przy każdym ładowaniu) builder pakuje offline wszystko do jednego pliku,
+który KBService mapuje do pamięci (mmap) z /tmp. Odczyt odpowiedzi to
+wyszukiwanie binarne w indeksie, bez parsowania całości.
+
+Układ pliku (little-endian):
+  header  : magic "GIKB", format_version u16, reserved u16, count u32, built_at u64
+  index   : count × (key_off u32, key_len u16, val_off u32, val_len u32),
+            posortowany po kluczu (bajtowo)
+  keys    : klucze "<lang>\\x1f<topic>" w UTF-8 (topic znormalizowany: strip + lower)
+  values  : odpowiedzi w UTF-8
+Offsety są liczone od początku pliku.
+"""
+
+import mmap
+import struct
+import time
+from typing import Any, Optional
+
+MAGIC = b"GIKB"
+FORMAT_VERSION = 1
+KEY_SEP = "\x1f"
+
+_HEADER = struct.Struct("<4sHHIQ")
+_ENTRY = struct.Struct("<IHII")
+
+
+class BundleFormatError(ValueError):
+    pass
+
+
+def _key(lang: str, topic: str) -> bytes:
+    return f"{lang}{KEY_SEP}{topic}".encode("utf-8")
+
+
+def pack_bundle(faqs: dict[str, dict[str, Any]], built_at: Optional[int] = None) -> bytes:
+    """
+    Pakuje {lang: {topic: answer | {"answer": ...}}} do formatu bundla.
+    Wpisy bez odpowiedzi są pomijane.
+    """
+    pairs: dict[bytes, bytes] = {}
+    for lang, faq in (faqs or {}).items():
+        for topic, entry in (faq or {}).items():
+            answer = entry.get("answer") if isinstance(entry, dict) else entry
+            topic_key = (topic or "").strip().lower()
+            if not topic_key or not isinstance(answer, str):
+                continue
+            pairs[_key(lang, topic_key)] = answer.encode("utf-8")
+
+    keys = sorted(pairs)
+    count = len(keys)
+    keys_start = _HEADER.size + count * _ENTRY.size
+    values_start = keys_start + sum(len(k) for k in keys)
+
+    index = bytearray()
+    key_off, val_off = keys_start, values_start
+    for k in keys:
+        index += _ENTRY.pack(key_off, len(k), val_off, len(pairs[k]))
+        key_off += len(k)
+        val_off += len(pairs[k])
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, count, int(built_at or time.time()))
+    return b"".join([header, bytes(index), *keys, *(pairs[k] for k in keys)])
+
+
+class KbBundle:
+    """
+    Czytnik bundla nad dowolnym buforem (bytes albo mmap).
+    Bundle z open() trzyma mapowanie i deskryptor pliku do close().
+    """
+
+    def __init__(self, buf) -> None:
+        if len(buf) < _HEADER.size:
+            raise BundleFormatError("bundle too short")
+        magic, version, _, count, built_at = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise BundleFormatError("bad magic")
+        if version != FORMAT_VERSION:
+            raise BundleFormatError(f"unsupported bundle version {version}")
+        if len(buf) < _HEADER.size + count * _ENTRY.size:
+            raise BundleFormatError("truncated index")
+        self._buf = buf
+        self.count = count
+        self.built_at = built_at
+        self._languages: Optional[set[str]] = None
+
+    @classmethod
+    def open(cls, path: str) -> "KbBundle":
+        """Mapuje plik do pamięci – strony są doczytywane z dysku dopiero przy odczycie."""
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(buf)
+        except BundleFormatError:
+            buf.close()
+            raise
+
+    def close(self) -> None:
+        """Zwalnia mapowanie (i jego deskryptor); odczyt po close() rzuca ValueError."""
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+
+    @property
+    def closed(self) -> bool:
+        return isinstance(self._buf, mmap.mmap) and self._buf.closed
+
+    def _entry(self, i: int) -> tuple[int, int, int, int]:
+        return _ENTRY.unpack_from(self._buf, _HEADER.size + i * _ENTRY.size)
+
+    def _key_at(self, i: int) -> bytes:
+        key_off, key_len, _, _ = self._entry(i)
+        return self._buf[key_off : key_off + key_len]
+
+    def get(self, lang: str, topic: str) -> Optional[str]:
+        wanted = _key(lang, (topic or "").strip().lower())
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < wanted:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._key_at(lo) == wanted:
+            _, _, val_off, val_len = self._entry(lo)
+            return bytes(self._buf[val_off : val_off + val_len]).decode("utf-8")
+        return None
+
+    def languages(self) -> set[str]:
+        if self._languages is None:
+            self._languages = {
+                self._key_at(i).split(KEY_SEP.encode(), 1)[0].decode("utf-8") for i in range(self.count)
+            }
+        return self._languages
+
+    def has_language(self, lang: str) -> bool:
+        return lang in self.languages()
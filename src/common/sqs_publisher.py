@@ -0,0 +1,138 @@
+"""
+Buforowany publisher SQS oparty o send_message_batch.
+
+Zamiast jednego send_message (jednego wywołania HTTPS) na wiadomość
+zbieramy wiadomości per kolejka i wysyłamy je paczkami po 10.
+"""
+
+import json
+import random
+import time
+from typing import Any
+
+from .aws import sqs_client
+from .logging import logger
+
+# Limity SQS dla send_message_batch
+SQS_BATCH_MAX_ENTRIES = 10
+SQS_BATCH_MAX_BYTES = 256 * 1024
+
+
+class SqsBatchPublisher:
+    """
+    Bufor wiadomości SQS z flushowaniem przez send_message_batch.
+
+    - publish() dokłada wiadomość do bufora danej kolejki i wysyła paczkę,
+      gdy zbierze się 10 wiadomości (lub zbliżamy się do limitu 256 KB),
+    - flush() wysyła resztę; wpisy odrzucone przez SQS (Failed bez SenderFault)
+      są ponawiane per wpis z backoffem,
+    - użyty jako context manager flushuje bufor przy wyjściu, także po wyjątku.
+
+    Wpisy, których nie udało się wysłać, lądują w `failed`.
+    """
+
+    def __init__(self, client=None, max_retries: int = 3) -> None:
+        self._client = client
+        self.max_retries = max_retries
+        self._buffers: dict[str, list[dict]] = {}
+        self._buffer_bytes: dict[str, int] = {}
+        self.sent = 0
+        self.failed: list[dict] = []
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = sqs_client()
+        return self._client
+
+    def publish(self, queue_url: str, message: Any, ref: str | None = None, **entry_kwargs) -> None:
+        """
+        Dodaje wiadomość do bufora. message: dict (serializowany do JSON) albo gotowy string.
+        entry_kwargs trafiają do wpisu batcha (np. MessageGroupId, DelaySeconds).
+        ref to opcjonalny identyfikator po stronie wywołującego (np. messageId rekordu
+        wejściowego) – nie idzie do SQS, ale jest zwracany w `failed`.
+        """
+        body = message if isinstance(message, str) else json.dumps(message)
+        size = len(body.encode("utf-8"))
+
+        if self._buffer_bytes.get(queue_url, 0) + size > SQS_BATCH_MAX_BYTES:
+            self._flush_queue(queue_url)
+
+        self._buffers.setdefault(queue_url, []).append(
+            {"entry": {"MessageBody": body, **entry_kwargs}, "ref": ref}
+        )
+        self._buffer_bytes[queue_url] = self._buffer_bytes.get(queue_url, 0) + size
+
+        if len(self._buffers[queue_url]) >= SQS_BATCH_MAX_ENTRIES:
+            self._flush_queue(queue_url)
+
+    def flush(self) -> list[dict]:
+        """Wysyła wszystkie zbuforowane wiadomości. Zwraca listę wpisów, które się nie udały."""
+        for queue_url in list(self._buffers):
+            self._flush_queue(queue_url)
+        return self.failed
+
+    def _flush_queue(self, queue_url: str) -> None:
+        entries = self._buffers.pop(queue_url, [])
+        self._buffer_bytes.pop(queue_url, None)
+        if not entries:
+            return
+
+        pending = {str(i): entry for i, entry in enumerate(entries)}
+        attempt = 0
+
+        while pending:
+            batch = [{"Id": entry_id, **item["entry"]} for entry_id, item in pending.items()]
+            try:
+                resp = self.client.send_message_batch(QueueUrl=queue_url, Entries=batch)
+                failures = resp.get("Failed") or []
+                self.sent += len(resp.get("Successful") or [])
+            except Exception as e:
+                # całe wywołanie padło (sieć, throttling) – ponawiamy wszystkie wpisy
+                failures = [
+                    {"Id": entry_id, "SenderFault": False, "Code": "CallFailed", "Message": str(e)}
+                    for entry_id in pending
+                ]
+
+            retryable: dict[str, dict] = {}
+            for f in failures:
+                entry = pending.get(f.get("Id"))
+                if entry is None:
+                    continue
+                if f.get("SenderFault"):
+                    self._mark_failed(queue_url, entry, f)
+                else:
+                    retryable[f["Id"]] = entry
+
+            attempt += 1
+            if retryable and attempt > self.max_retries:
+                for entry_id, entry in retryable.items():
+                    self._mark_failed(
+                        queue_url,
+                        entry,
+                        next(f for f in failures if f.get("Id") == entry_id),
+                    )
+                break
+
+            pending = retryable
+            if pending:
+                time.sleep(min(0.1 * 2**attempt, 2.0) + random.uniform(0, 0.05))
+
+    def _mark_failed(self, queue_url: str, item: dict, failure: dict) -> None:
+        self.failed.append(
+            {"QueueUrl": queue_url, **item["entry"], "Ref": item["ref"], "Error": failure.get("Code")}
+        )
+        logger.error(
+            {
+                "sqs_publisher": "send_failed",
+                "queue_url": queue_url,
+                "code": failure.get("Code"),
+                "err": failure.get("Message"),
+            }
+        )
+
+    def __enter__(self) -> "SqsBatchPublisher":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.flush()
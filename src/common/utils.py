@@ -1,4 +1,4 @@
-import json, uuid
+import json, re, uuid
 import secrets
 import string
 from typing import Any
@@ -7,6 +7,31 @@ from .config import settings
 def to_json(o: Any) -> str:
     return json.dumps(o, ensure_ascii=False, separators=(",", ":"))
 
+def normalize_phone(phone: str | None) -> str | None:
+    """
+    Normalizuje numer do formatu E.164 (np. "whatsapp:+48 600-100-200" -> "+48600100200").
+    Tak zapisujemy telefony w MembersIndex i tak po nich szukamy.
+    """
+    if not phone:
+        return phone
+    raw = phone.strip()
+    if raw.startswith("whatsapp:"):
+        raw = raw.split(":", 1)[1]
+    digits = "".join(ch for ch in raw if ch.isdigit())
+    if raw.startswith("00"):
+        digits = digits[2:]
+    return f"+{digits}" if digits else None
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+def normalize_text(text: str | None) -> str:
+    """
+    Normalizuje tekst wiadomości do porównań (klucz cache NLU, reguły intencji):
+    casefold, usunięcie interpunkcji i zwinięcie białych znaków.
+    "  Godziny otwarcia?! " -> "godziny otwarcia"
+    """
+    return " ".join(_NON_WORD_RE.sub(" ", (text or "").casefold()).split())
+
 def new_id(prefix: str = "") -> str:
     return f"{prefix}{uuid.uuid4().hex}"
 
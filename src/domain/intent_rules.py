@@ -0,0 +1,60 @@
+# Domyślne reguły szybkiej klasyfikacji intencji (bez LLM), per język.
+# Tenant może je nadpisać plikiem <tenant_id>/intent_rules_<lang>.json w buckecie KB
+# o tym samym formacie (lista reguł).
+#
+# Reguła:
+#   intent      – zwracana intencja,
+#   slots       – stałe sloty (np. topic dla FAQ),
+#   phrases     – frazy, którym musi odpowiadać CAŁA wiadomość po normalizacji
+#                 ("Godziny otwarcia?" == "godziny otwarcia"),
+#   keywords    – całe słowa/frazy wyszukiwane w wiadomości ("karnet" nie łapie "karnety"),
+#   patterns    – wyrażenia regularne (re.search) na znormalizowanym tekście,
+#   confidence  – pewność zwracana przy trafieniu.
+#
+# Domyślne reguły to wyłącznie krótkie, dokładne frazy – słowa kluczowe
+# w dowolnym miejscu wiadomości myliły intencje ("odwołaj moje zajęcia",
+# "zmieniłem numer telefonu"). Szersze reguły tenant dodaje świadomie w pliku.
+#
+# reserve_class celowo nie ma reguły domyślnej – LLM wyciąga z tekstu class_id.
+DEFAULT_INTENT_RULES = {
+    "pl": [
+        {"intent": "faq", "slots": {"topic": "hours"},
+         "phrases": ["godziny otwarcia", "godziny", "w jakich godzinach jesteście otwarci"]},
+        {"intent": "faq", "slots": {"topic": "price"},
+         "phrases": ["cennik", "ceny", "ile kosztuje karnet", "ile kosztuje wejście"]},
+        {"intent": "faq", "slots": {"topic": "location"},
+         "phrases": ["adres", "lokalizacja", "gdzie jesteście", "dojazd"]},
+        {"intent": "faq", "slots": {"topic": "contact"},
+         "phrases": ["kontakt", "numer telefonu do klubu", "jak się z wami skontaktować"]},
+        {"intent": "handover", "slots": {},
+         "phrases": ["konsultant", "chcę rozmawiać z konsultantem", "połącz z konsultantem",
+                     "chcę rozmawiać z człowiekiem"]},
+        {"intent": "pg_available_classes", "slots": {},
+         "phrases": ["grafik", "grafik zajęć", "harmonogram zajęć", "jakie są zajęcia"]},
+    ],
+    "en": [
+        {"intent": "faq", "slots": {"topic": "hours"},
+         "phrases": ["opening hours", "hours", "what are your opening hours"]},
+        {"intent": "faq", "slots": {"topic": "price"},
+         "phrases": ["price", "prices", "pricing", "price list"]},
+        {"intent": "faq", "slots": {"topic": "location"},
+         "phrases": ["address", "location", "where are you"]},
+        {"intent": "faq", "slots": {"topic": "contact"},
+         "phrases": ["contact", "contact details"]},
+        {"intent": "handover", "slots": {},
+         "phrases": ["agent", "human", "talk to a human", "talk to an agent", "speak to a consultant"]},
+        {"intent": "pg_available_classes", "slots": {},
+         "phrases": ["class schedule", "timetable", "what classes are there"]},
+    ],
+}
+
+# Słowa, przy których reguły nigdy nie rozstrzygają (także reguły tenanta):
+# czasowniki rezerwacji/odwołania/zmiany niosą szczegóły, które wyciąga LLM,
+# a przeczenie odwraca sens ("nie chcę konsultanta").
+# Całe słowa; "*" na końcu oznacza rdzeń ("odwoł*" łapie "odwołaj" i "odwołać").
+INTENT_RULES_FALLTHROUGH = {
+    "pl": ["rezerw*", "zarezerw*", "zapis*", "odwoł*", "anul*", "zmian*", "zmieni*", "przenie*",
+           "przesu*", "nie", "bez"],
+    "en": ["book*", "reserv*", "cancel*", "chang*", "reschedul*", "sign up",
+           "not", "no", "don t", "dont", "never", "without"],
+}
@@ -9,3 +9,40 @@ def render_template(template_str: str, context: dict) -> str:
     for k, v in (context or {}).items():
         out = out.replace("{"+k+"}", str(v))
     return out
+
+
+# Szablony używane przez RoutingService – TemplateService ładuje je hurtowo
+# (BatchGetItem) przy pierwszym użyciu tenanta w danym języku.
+ROUTER_TEMPLATE_NAMES = (
+    "clarify_generic",
+    "faq_no_info",
+    "handover_to_staff",
+    "pg_available_classes",
+    "pg_available_classes_capacity_free",
+    "pg_available_classes_capacity_full",
+    "pg_available_classes_capacity_no_limit",
+    "pg_available_classes_empty",
+    "pg_available_classes_item",
+    "pg_challenge_ask_dob",
+    "pg_challenge_fail_handover",
+    "pg_challenge_retry",
+    "pg_challenge_success",
+    "pg_contract_ask_email",
+    "pg_contract_details",
+    "pg_contract_not_found",
+    "pg_member_balance",
+    "pg_member_not_linked",
+    "pg_web_verification_required",
+    "reserve_class_confirm",
+    "reserve_class_confirm_words",
+    "reserve_class_confirmed",
+    "reserve_class_decline_words",
+    "reserve_class_declined",
+    "reserve_class_failed",
+    "ticket_created_failed",
+    "ticket_created_ok",
+    "ticket_summary",
+    "www_not_verified",
+    "www_user_not_found",
+    "www_verified",
+)
@@ -5,21 +5,55 @@ Działa w trybie batch:
 - czyta aktywne kampanie z tabeli DDB,
 - wybiera odbiorców,
 - wrzuca wiadomości do kolejki outbound.
+
+Fan-out jest wznawialny: odbiorcy są przetwarzani paczkami
+(CAMPAIGN_CHUNK_SIZE), a po każdej paczce kursor przebiegu trafia do tabeli
+CampaignRuns. Przebieg = kampania + dzień startu (UTC). Każdy odbiorca ma klucz
+wysyłki zapisywany warunkowo przed wrzuceniem wiadomości do kolejki, więc
+wznowienie (albo zdublowany komunikat SQS) nie wyśle mu wiadomości drugi raz.
+
+Przebieg jest kontynuowany do statusu done niezależnie od daty – także po
+północy UTC (duża kampania, odłożenie na quiet hours do rana). Dopóki
+kampania ma niedokończony przebieg, harmonogram nie zaczyna nowego, tylko
+wznawia stary (CampaignRunsRepo.pending_run_id).
+
+- Wywołanie z harmonogramu zakłada przebieg i wrzuca po jednym komunikacie na
+  kampanię do kolejki CampaignFanoutQueueUrl; workery (ta sama Lambda z eventem
+  SQS) przetwarzają paczki do wyczerpania czasu wywołania i wtedy wrzucają
+  komunikat kontynuacji.
+- Bez kolejki fan-out (lokalnie) kampanie są przetwarzane od razu, a
+  niedokończony przebieg wznawia kolejne wywołanie.
 """
 
-import os
 import json
+import os
+from datetime import datetime, timezone
+from typing import Callable
 
 from ...services.campaign_service import CampaignService
-from ...common.aws import sqs_client, ddb_resource, resolve_queue_url
+from ...common.aws import sqs_client, ddb_resource, resolve_queue_url, resolve_optional_queue_url
+from ...common.ddb_scan import parallel_scan
+from ...common.sqs_publisher import SqsBatchPublisher
+from ...repos.campaign_runs_repo import CampaignRunsRepo
 from ...services.consent_service import ConsentService
 from ...common.logging import logger
 
 OUTBOUND_QUEUE_URL = os.getenv("OutboundQueueUrl")
 CAMPAIGNS_TABLE = os.getenv("DDB_TABLE_CAMPAIGNS", "Campaigns")
+# równoległy scan tabeli kampanii (TotalSegments / wątki)
+CAMPAIGNS_SCAN_SEGMENTS = int(os.getenv("CAMPAIGNS_SCAN_SEGMENTS", "4"))
+CAMPAIGNS_SCAN_MAX_WORKERS = int(os.getenv("CAMPAIGNS_SCAN_MAX_WORKERS", "4"))
+# odbiorców na paczkę (jeden zapis kursora na paczkę)
+CAMPAIGN_CHUNK_SIZE = int(os.getenv("CAMPAIGN_CHUNK_SIZE", "200"))
+# zapas czasu przed timeoutem Lambdy – poniżej tej granicy nie bierzemy kolejnego odbiorcy,
+# tylko flushujemy paczkę i zapisujemy kursor
+CAMPAIGN_TIME_MARGIN_MS = int(os.getenv("CAMPAIGN_TIME_MARGIN_MS", "5000"))
+# kontynuacja poza oknem wysyłki wraca po tym czasie (maksimum DelaySeconds w SQS)
+CAMPAIGN_WINDOW_RETRY_SECONDS = int(os.getenv("CAMPAIGN_WINDOW_RETRY_SECONDS", "900"))
 
 svc = CampaignService()
 consents = ConsentService()
+runs = CampaignRunsRepo()
 
 
 def _resolve_outbound_queue_url() -> str:
@@ -34,46 +68,87 @@ def _resolve_outbound_queue_url() -> str:
     return resolve_queue_url("OutboundQueueUrl")
 
 
-def lambda_handler(event, context):
+def current_run_id() -> str:
+    """Identyfikator nowego przebiegu kampanii (harmonogram jest dzienny)."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _time_check(context) -> Callable[[], bool]:
+    """Funkcja "czy zdążymy z kolejnym odbiorcą" na podstawie kontekstu Lambdy."""
+    remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if remaining is None:
+        return lambda: True
+    return lambda: remaining() > CAMPAIGN_TIME_MARGIN_MS
+
+
+def process_campaign(
+    campaign: dict,
+    run_id: str,
+    publisher: SqsBatchPublisher,
+    out_q_url: str,
+    runs_repo: CampaignRunsRepo | None = None,
+    has_time: Callable[[], bool] = lambda: True,
+    chunk_size: int = CAMPAIGN_CHUNK_SIZE,
+) -> dict:
     """
-    Główny handler kampanii:
-    - skanuje tabelę kampanii,
-    - dla każdej aktywnej kampanii wysyła wiadomości do odbiorców
-      o ile nie jesteśmy w quiet hours.
+    Wysyła kampanię od zapisanego kursora, paczka po paczce.
+
+    Zwraca {"status": ...}:
+      done    – wszyscy odbiorcy przetworzeni,
+      partial – zabrakło czasu (paczka jest przerywana w trakcie, flushowana,
+                a kursor przesuwany za ostatniego przetworzonego odbiorcę)
+                albo kolejka outbound odrzuciła część wiadomości
+                (kursor zostaje na początku paczki, wznowienie ją powtórzy),
+      busy    – kursor przesunął inny worker; ten kończy pracę.
+
+    Kursor to indeks na liście select_recipients(); zmiana listy w trakcie
+    przebiegu nie powoduje podwójnych wysyłek (klucze wysyłki), ale może
+    pominąć odbiorców dopisanych przed kursorem.
     """
-    table = ddb_resource().Table(CAMPAIGNS_TABLE)
-    resp = table.scan()
-    out_q_url = _resolve_outbound_queue_url()
+    runs_repo = runs_repo or runs
+    campaign_pk = campaign["pk"]
+    tenant_id = campaign.get("tenant_id", "default")
+    recipients = svc.select_recipients(campaign)
 
-    for item in resp.get("Items", []):
-        if not item.get("active", False):
-            continue
-
-        # QUIET HOURS – jeśli teraz jest poza oknem wysyłki, pomijamy kampanię
-        if not svc.is_within_send_window(item):
-            logger.info(
-                {
-                    "campaign": "skipped_quiet_hours",
-                    "campaign_id": item.get("campaign_id"),
-                    "tenant_id": item.get("tenant_id", "default"),
-                }
-            )
-            continue
+    run = runs_repo.start_run(campaign_pk, run_id, len(recipients))
+    cursor = int(run.get("cursor", 0))
+    result = {"campaign_pk": campaign_pk, "run_id": run_id, "total": len(recipients)}
+    if run.get("status") == "done":
+        return {**result, "status": "done", "cursor": cursor}
 
-        tenant_id = item.get("tenant_id", "default")
+    while True:
+        if cursor < len(recipients) and not has_time():
+            return {**result, "status": "partial", "cursor": cursor}
+
+        chunk = recipients[cursor:cursor + max(1, chunk_size)]
+        failed_before = len(publisher.failed)
+        sent = skipped = processed = 0
+        out_of_time = False
+        for phone in chunk:
+            # każdy odbiorca to kilka wywołań DDB/SQS – cała paczka może nie zmieścić
+            # się w zapasie czasu, więc budżet sprawdzamy przed każdym (pierwszy wyżej)
+            if processed and not has_time():
+                out_of_time = True
+                break
+            processed += 1
 
-        for phone in svc.select_recipients(item):
             if not consents.has_opt_in(tenant_id, phone):
+                skipped += 1
                 continue
 
             # tutaj w przyszłości możesz zbudować context z danych odbiorcy (imię, saldo, klub itd.)
             msg = svc.build_message(
-                campaign=item,
+                campaign=campaign,
                 tenant_id=tenant_id,
                 recipient_phone=phone,
                 context={},  # na razie puste
             )
 
+            # odbiorca dostał już wiadomość w tym przebiegu (wznowienie / duplikat SQS)
+            if not runs_repo.claim_send(campaign_pk, run_id, phone):
+                skipped += 1
+                continue
+
             payload = {
                 "to": phone,
                 "body": msg["body"],
@@ -82,9 +157,156 @@ def lambda_handler(event, context):
             if msg.get("language_code"):
                 payload["language_code"] = msg["language_code"]
 
-            sqs_client().send_message(
-                QueueUrl=out_q_url,
-                MessageBody=json.dumps(payload),
-            )
+            publisher.publish(out_q_url, payload, ref=phone)
+            sent += 1
+
+        publisher.flush()
+        failed = publisher.failed[failed_before:]
+        if failed:
+            for entry in failed:
+                runs_repo.release_send(campaign_pk, run_id, entry["Ref"])
+            return {**result, "status": "partial", "cursor": cursor, "failed": len(failed)}
+
+        new_cursor = cursor + processed
+        done = new_cursor >= len(recipients)
+        if not runs_repo.advance(campaign_pk, run_id, cursor, new_cursor, sent, skipped, done):
+            return {**result, "status": "busy", "cursor": cursor}
+        cursor = new_cursor
+        if done:
+            return {**result, "status": "done", "cursor": cursor}
+        if out_of_time:
+            return {**result, "status": "partial", "cursor": cursor}
+
+
+def _enqueue_continuation(queue_url: str, campaign_pk: str, run_id: str, delay_seconds: int = 0) -> None:
+    sqs_client().send_message(
+        QueueUrl=queue_url,
+        MessageBody=json.dumps({"campaign_pk": campaign_pk, "run_id": run_id}),
+        DelaySeconds=delay_seconds,
+    )
+
+
+def _start_campaigns(event, context) -> dict:
+    """Wywołanie z harmonogramu: wszystkie aktywne kampanie w oknie wysyłki."""
+    table = ddb_resource().Table(CAMPAIGNS_TABLE)
+    campaigns = parallel_scan(
+        table,
+        segments=CAMPAIGNS_SCAN_SEGMENTS,
+        max_workers=CAMPAIGNS_SCAN_MAX_WORKERS,
+    )
+    out_q_url = _resolve_outbound_queue_url()
+    fanout_q_url = resolve_optional_queue_url("CampaignFanoutQueueUrl")
+    run_id = (event or {}).get("run_id") or current_run_id()
+    has_time = _time_check(context)
+
+    # wiadomości kampanii idą do SQS paczkami po 10 (send_message_batch),
+    # bufor jest flushowany przy wyjściu z bloku, także po wyjątku
+    with SqsBatchPublisher(sqs_client()) as publisher:
+        for item in campaigns:
+            if not item.get("active", False):
+                continue
+
+            # QUIET HOURS – jeśli teraz jest poza oknem wysyłki, pomijamy kampanię
+            if not svc.is_within_send_window(item):
+                logger.info(
+                    {
+                        "campaign": "skipped_quiet_hours",
+                        "campaign_id": item.get("campaign_id"),
+                        "tenant_id": item.get("tenant_id", "default"),
+                    }
+                )
+                continue
+
+            # niedokończony wcześniejszy przebieg ma pierwszeństwo – nowy zaczniemy,
+            # gdy tamten dojdzie do końca (inaczej odbiorcy dostaliby dwie wiadomości naraz)
+            item_run_id = runs.pending_run_id(item["pk"]) or run_id
+            if item_run_id != run_id:
+                logger.info({"campaign": "previous_run_pending", "campaign_pk": item["pk"],
+                             "run_id": item_run_id, "skipped_run_id": run_id})
+
+            if fanout_q_url:
+                # przebieg istnieje w CampaignRuns, zanim worker odbierze komunikat –
+                # worker kontynuuje tylko zapisane przebiegi
+                runs.start_run(item["pk"], item_run_id, len(svc.select_recipients(item)))
+                # zdublowana kontynuacja jest bezpieczna (kursor warunkowy + klucze wysyłki)
+                _enqueue_continuation(fanout_q_url, item["pk"], item_run_id)
+                logger.info({"campaign": "fanout_queued", "campaign_pk": item["pk"], "run_id": item_run_id})
+                continue
+
+            result = process_campaign(item, item_run_id, publisher, out_q_url, has_time=has_time)
+            logger.info({"campaign": "run_" + result["status"], **result})
+
+    if publisher.failed:
+        logger.error(
+            {
+                "campaign": "outbound_queue_failed",
+                "failed": len(publisher.failed),
+                "sent": publisher.sent,
+            }
+        )
 
     return {"statusCode": 200}
+
+
+def _continue_campaign(record: dict, context) -> bool:
+    """
+    Jeden komunikat kolejki fan-out. Zwraca False, gdy rekord ma wrócić
+    do kolejki (np. outbound odrzucił część wiadomości).
+    """
+    body = json.loads(record.get("body") or "{}")
+    campaign_pk, run_id = body.get("campaign_pk"), body.get("run_id")
+    fanout_q_url = resolve_queue_url("CampaignFanoutQueueUrl")
+
+    run = runs.get_run(campaign_pk, run_id) if campaign_pk and run_id else None
+    if not run or run.get("status") == "done":
+        # przebieg zakończony albo usunięty przez TTL (CAMPAIGN_RUN_TTL_SECONDS)
+        logger.info({"campaign": "run_finished", "campaign_pk": campaign_pk, "run_id": run_id,
+                     "found": bool(run)})
+        return True
+
+    item = ddb_resource().Table(CAMPAIGNS_TABLE).get_item(Key={"pk": campaign_pk}).get("Item")
+    if not item or not item.get("active", False):
+        logger.info({"campaign": "run_dropped_inactive", "campaign_pk": campaign_pk, "run_id": run_id})
+        return True
+
+    if not svc.is_within_send_window(item):
+        _enqueue_continuation(fanout_q_url, campaign_pk, run_id, CAMPAIGN_WINDOW_RETRY_SECONDS)
+        logger.info({"campaign": "run_deferred_quiet_hours", "campaign_pk": campaign_pk, "run_id": run_id})
+        return True
+
+    with SqsBatchPublisher(sqs_client()) as publisher:
+        result = process_campaign(item, run_id, publisher, _resolve_outbound_queue_url(),
+                                  has_time=_time_check(context))
+    logger.info({"campaign": "run_" + result["status"], **result})
+
+    if result["status"] == "partial":
+        if result.get("failed"):
+            return False
+        _enqueue_continuation(fanout_q_url, campaign_pk, run_id)
+    return True
+
+
+def lambda_handler(event, context):
+    """
+    Główny handler kampanii:
+    - z harmonogramu: skanuje tabelę kampanii (wszystkie strony, segmenty
+      równolegle) i dla każdej aktywnej kampanii w oknie wysyłki (quiet hours)
+      zaczyna albo wznawia dzisiejszy przebieg,
+    - z kolejki fan-out: kontynuuje przebiegi od zapisanego kursora;
+      błędy są izolowane per rekord (batchItemFailures).
+    """
+    records = (event or {}).get("Records")
+    if not records:
+        return _start_campaigns(event, context)
+
+    failures = []
+    for r in records:
+        try:
+            ok = _continue_campaign(r, context)
+        except Exception as e:
+            logger.error({"campaign": "run_failed", "err": str(e), "message_id": r.get("messageId")})
+            ok = False
+        if not ok and r.get("messageId"):
+            failures.append({"itemIdentifier": r["messageId"]})
+
+    return {"statusCode": 200, "batchItemFailures": failures}
@@ -2,43 +2,54 @@
 import os
 import time
 
+from boto3.dynamodb.conditions import Attr
+
 from ...common.logging import logger
 from ...common.aws import ddb_resource
+from ...common.ddb_scan import ScanStats, parallel_scan
 
 INTENTS_STATS_TABLE = os.getenv("DDB_TABLE_INTENTS_STATS", "IntentsStats")
+# Liczba segmentów równoległego scanu (TotalSegments) i wątków.
+HOUSEKEEPING_SCAN_SEGMENTS = int(os.getenv("HOUSEKEEPING_SCAN_SEGMENTS", "4"))
+HOUSEKEEPING_MAX_WORKERS = int(os.getenv("HOUSEKEEPING_MAX_WORKERS", "4"))
 
 
 def lambda_handler(event, context):
     """
     Prosty housekeeping:
-    - czyści bardzo stare rekordy z tabeli IntentsStats (rate limiter),
+    - liczniki rate limitera w IntentsStats wygasają przez TTL (expires_at),
+      tu sprzątamy tylko starsze wiersze bez expires_at (równoległy scan),
     - docelowo: retention Messages/Conversations + GDPR delete.
     """
     now_ts = int(time.time())
     max_age_seconds = int(os.getenv("SPAM_STATS_MAX_AGE_SECONDS", "86400"))  # domyślnie 1 dzień
     threshold = now_ts - max_age_seconds
 
+    segments = max(1, int((event or {}).get("segments") or HOUSEKEEPING_SCAN_SEGMENTS))
     table = ddb_resource().Table(INTENTS_STATS_TABLE)
-
+    stats = ScanStats()
     deleted = 0
-    scanned = 0
-
-    # Uwaga: bardzo prosty scan bez paginacji – OK dla małych wolumenów
-    resp = table.scan()
-    items = resp.get("Items", []) or []
-    scanned += len(items)
-
-    for item in items:
-        last_ts = int(item.get("last_ts", 0))
-        if last_ts < threshold:
-            table.delete_item(Key={"pk": item["pk"], "sk": item["sk"]})
+    with table.batch_writer() as batch:
+        for item in parallel_scan(
+            table,
+            segments=segments,
+            max_workers=HOUSEKEEPING_MAX_WORKERS,
+            projection=["pk", "sk"],
+            # pozycje z expires_at usuwa TTL DynamoDB – tu tylko stare wiersze bez TTL
+            filter_expression=Attr("expires_at").not_exists()
+            & (Attr("last_ts").not_exists() | Attr("last_ts").lt(threshold)),
+            stats=stats,
+        ):
+            batch.delete_item(Key={"pk": item["pk"], "sk": item["sk"]})
             deleted += 1
+    scanned = stats.scanned
 
     logger.info(
         {
             "housekeeping": "spam_cleanup",
             "scanned": scanned,
             "deleted": deleted,
+            "segments": segments,
             "threshold_ts": threshold,
         }
     )
@@ -6,6 +6,9 @@ i przekazuje do RoutingService, a następnie wrzuca odpowiedzi do kolejki outbou
 """
 
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from ...services.routing_service import RoutingService
 from ...services.template_service import TemplateService
@@ -14,13 +17,45 @@ from ...adapters.openai_client import OpenAIClient
 from ...repos.conversations_repo import ConversationsRepo
 from ...repos.messages_repo import MessagesRepo
 from ...repos.tenants_repo import TenantsRepo 
-from ...common.aws import resolve_queue_url, sqs_client 
+from ...common.aws import resolve_queue_url, sqs_client
+from ...common.sqs_publisher import SqsBatchPublisher
 from ...domain.models import Message
 from ...common.logging import logger
 from ...common.logging_utils import mask_phone, shorten_body
 
 ROUTER = RoutingService()
 
+# Ile rozmów (różnych channel_user_id) z jednego batcha routujemy równolegle.
+# 1 = przetwarzanie sekwencyjne.
+ROUTER_MAX_CONCURRENCY_DEFAULT = 1
+
+
+def _max_concurrency() -> int:
+    try:
+        return max(1, int(os.getenv("ROUTER_MAX_CONCURRENCY", ROUTER_MAX_CONCURRENCY_DEFAULT)))
+    except ValueError:
+        return ROUTER_MAX_CONCURRENCY_DEFAULT
+
+
+# Pula wątków żyje między wywołaniami (ciepły kontener), więc resource'y
+# DynamoDB cache'owane per wątek (common.aws) nie są budowane od nowa
+# przy każdym batchu. Repozytoria używają ddb_table – każdy wątek
+# pracuje na własnych obiektach Table.
+_POOL: ThreadPoolExecutor | None = None
+_POOL_SIZE = 0
+_POOL_LOCK = threading.Lock()
+
+
+def _pool(workers: int) -> ThreadPoolExecutor:
+    global _POOL, _POOL_SIZE
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_SIZE < workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False)
+            _POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="router")
+            _POOL_SIZE = workers
+        return _POOL
+
 def _parse_record(record: dict) -> dict | None:
     raw_body = record.get("body", "")
     try:
@@ -53,22 +88,14 @@ def _build_message(body: dict) -> Message:
     )
 
 
-def _publish_actions(actions, original_body: dict):
+def _publish_actions(actions, original_body: dict, publisher: SqsBatchPublisher, ref: str | None = None):
     queue_url = resolve_queue_url("OutboundQueueUrl")
     for a in actions or []:
         if a.type != "reply":
             continue
-        elif a.type == "ticket":
-            sqs_client().send_message(
-                QueueUrl=tickets_url,
-                MessageBody=json.dumps(a.payload),
-            )
 
         payload = a.payload
-        sqs_client().send_message(
-            QueueUrl=queue_url,
-            MessageBody=json.dumps(payload),
-        )
+        publisher.publish(queue_url, payload, ref=ref)
 
         logger.info(
             {
@@ -81,6 +108,65 @@ def _publish_actions(actions, original_body: dict):
             }
         )
 
+
+def _conversation_key(msg_body: dict, idx: int) -> tuple:
+    """
+    Klucz rozmowy, w obrębie którego zachowujemy kolejność rekordów.
+    Rekordy bez identyfikatora użytkownika traktujemy jako osobne rozmowy.
+    """
+    user_id = msg_body.get("channel_user_id") or msg_body.get("from")
+    if not user_id:
+        return ("record", idx)
+    return (msg_body.get("tenant_id", "default"), msg_body.get("channel", "whatsapp"), user_id)
+
+
+def _route_message(msg_body: dict):
+    logger.info(
+        {
+            "handler": "message_router",
+            "event": "received",
+            "from": mask_phone(msg_body.get("from")),
+            "to": mask_phone(msg_body.get("to")),
+            "body": shorten_body(msg_body.get("body")),
+            "tenant_id": msg_body.get("tenant_id"),
+            "channel": msg_body.get("channel", "whatsapp"),
+        }
+    )
+    return ROUTER.handle(_build_message(msg_body))
+
+
+def _route_conversation(items: list[tuple[int, str | None, dict]]) -> dict[int, tuple[bool, list]]:
+    """
+    Routuje rekordy jednej rozmowy po kolei. Zwraca {idx: (ok, actions)}.
+
+    Po pierwszym błędzie kolejne rekordy tej rozmowy nie są przetwarzane
+    (też wracają do kolejki), żeby ponowienie nie zamieniło kolejności wiadomości.
+    """
+    results: dict[int, tuple[bool, list]] = {}
+    failed = False
+    for idx, message_id, msg_body in items:
+        if failed:
+            logger.warning(
+                {"handler": "message_router", "event": "record_skipped", "message_id": message_id}
+            )
+            results[idx] = (False, [])
+            continue
+        try:
+            results[idx] = (True, _route_message(msg_body))
+        except Exception as e:
+            logger.error(
+                {
+                    "handler": "message_router",
+                    "event": "record_failed",
+                    "message_id": message_id,
+                    "err": str(e),
+                }
+            )
+            results[idx] = (False, [])
+            failed = True
+    return results
+
+
 def lambda_handler(event, context):
     """
     Główny handler AWS Lambda dla message_routera.
@@ -90,32 +176,70 @@ def lambda_handler(event, context):
     - buduje obiekt Message,
     - wywołuje RoutingService.handle,
     - dla akcji typu "reply" publikuje komunikat do kolejki outbound.
+
+    Rekordy różnych rozmów są routowane równolegle (ROUTER_MAX_CONCURRENCY
+    wątków), rekordy tego samego channel_user_id – po kolei. Odpowiedzi
+    publikujemy w kolejności rekordów z batcha.
+
+    Błędy są izolowane per rekord: zwracamy batchItemFailures
+    (ReportBatchItemFailures), więc SQS ponawia tylko rekordy, które padły,
+    a nie cały batch.
     """
     records = event.get("Records") or []
     if not records:
         logger.info({"handler": "message_router", "event": "no_records"})
         return {"statusCode": 200, "body": "no-records"}
 
-    for r in records:
+    parsed: list[tuple[int, dict, dict]] = []
+    conversations: dict[tuple, list[tuple[int, str | None, dict]]] = {}
+    for idx, r in enumerate(records):
         msg_body = _parse_record(r)
         if not msg_body:
+            # zły JSON nie zniknie przy ponowieniu – nie zgłaszamy go jako failure
             continue
-
-        logger.info(
-            {
-                "handler": "message_router",
-                "event": "received",
-                "from": mask_phone(msg_body.get("from")),
-                "to": mask_phone(msg_body.get("to")),
-                "body": shorten_body(msg_body.get("body")),
-                "tenant_id": msg_body.get("tenant_id"),
-                "channel": msg_body.get("channel", "whatsapp"),
-            }
+        parsed.append((idx, r, msg_body))
+        conversations.setdefault(_conversation_key(msg_body, idx), []).append(
+            (idx, r.get("messageId"), msg_body)
         )
 
-        msg = _build_message(msg_body)
-        actions = ROUTER.handle(msg)
-        _publish_actions(actions, msg_body)
-
-    logger.info({"handler": "message_router", "event": "done"})
-    return {"statusCode": 200}
+    results: dict[int, tuple[bool, list]] = {}
+    workers = min(_max_concurrency(), len(conversations))
+    if workers <= 1:
+        for items in conversations.values():
+            results.update(_route_conversation(items))
+    else:
+        for part in _pool(workers).map(_route_conversation, conversations.values()):
+            results.update(part)
+
+    failed_ids: list[str] = []
+
+    # odpowiedzi z całego batcha wysyłamy paczkami (send_message_batch)
+    publisher = SqsBatchPublisher(sqs_client())
+    with publisher:
+        for idx, r, msg_body in parsed:
+            message_id = r.get("messageId")
+            ok, actions = results[idx]
+            if ok:
+                try:
+                    _publish_actions(actions, msg_body, publisher, ref=message_id)
+                except Exception as e:
+                    logger.error(
+                        {
+                            "handler": "message_router",
+                            "event": "publish_failed",
+                            "message_id": message_id,
+                            "err": str(e),
+                        }
+                    )
+                    ok = False
+            if not ok and message_id:
+                failed_ids.append(message_id)
+
+    # odpowiedzi, które nie trafiły do kolejki – ponawiamy rekord źródłowy
+    for f in publisher.failed:
+        if f.get("Ref"):
+            failed_ids.append(f["Ref"])
+
+    failures = [{"itemIdentifier": mid} for mid in dict.fromkeys(failed_ids)]
+    logger.info({"handler": "message_router", "event": "done", "failed": len(failures)})
+    return {"statusCode": 200, "batchItemFailures": failures}
@@ -0,0 +1,80 @@
+# src/lambdas/schedule_sync/handler.py
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from ...adapters.perfectgym_client import PerfectGymClient
+from ...common.logging import logger
+from ...repos.class_schedule_repo import ClassScheduleRepo
+from ...repos.tenants_repo import TenantsRepo
+
+SCHEDULE_SYNC_DAYS = int(os.getenv("SCHEDULE_SYNC_DAYS", "14"))
+SCHEDULE_SYNC_PAGE_SIZE = int(os.getenv("SCHEDULE_SYNC_PAGE_SIZE", "100"))
+
+
+def _tenants() -> list[str]:
+    """
+    Tenanci do synchronizacji: SCHEDULE_SYNC_TENANTS (lista po przecinku),
+    a bez niej wszyscy z tabeli Tenants – router czyta grafik z DDB dla
+    każdego tenanta, więc job nie może pomijać żadnego z nich.
+    Pusta tabela (wdrożenie jednego klubu) = tenant "default".
+    """
+    raw = os.getenv("SCHEDULE_SYNC_TENANTS", "")
+    tenants = [t.strip() for t in raw.split(",") if t.strip()]
+    if tenants:
+        return tenants
+    return TenantsRepo().list_ids() or ["default"]
+
+
+def sync_tenant(
+    tenant_id: str,
+    pg: PerfectGymClient,
+    repo: ClassScheduleRepo,
+    days: int = SCHEDULE_SYNC_DAYS,
+    now: datetime | None = None,
+) -> dict:
+    """
+    Pobiera z PG wszystkie zajęcia z najbliższych `days` dni (wszystkie strony
+    OData) i zapisuje je do tabeli grafiku. Wiersze, których nie było w tej
+    synchronizacji, są usuwane. Błąd PG przerywa sync tenanta, zanim
+    cokolwiek zostanie usunięte – w tabeli zostaje poprzedni grafik.
+    """
+    now = now or datetime.now(timezone.utc)
+    until = now + timedelta(days=days)
+    synced_at = int(time.time())
+
+    classes = list(
+        pg.iter_available_classes(
+            from_iso=now.replace(tzinfo=None),
+            to_iso=until.replace(tzinfo=None),
+            page_size=SCHEDULE_SYNC_PAGE_SIZE,
+        )
+    )
+    written = repo.put_classes(tenant_id, classes, synced_at)
+    deleted = repo.delete_stale(tenant_id, now.date().isoformat(), synced_at)
+    repo.put_sync_state(tenant_id, synced_at, until.isoformat(), written)
+    return {"tenant_id": tenant_id, "written": written, "deleted": deleted}
+
+
+def lambda_handler(event, context):
+    """
+    Okresowa synchronizacja grafiku zajęć PerfectGym -> DynamoDB (ClassSchedule).
+    Router czyta grafik z tabeli, więc PG znika ze ścieżki odpowiedzi na czacie.
+    """
+    pg = PerfectGymClient()
+    repo = ClassScheduleRepo()
+    tenants = (event or {}).get("tenants") or _tenants()
+
+    results = []
+    failed = 0
+    for tenant_id in tenants:
+        try:
+            result = sync_tenant(tenant_id, pg, repo)
+        except Exception as e:
+            failed += 1
+            logger.error({"schedule_sync": "tenant_failed", "tenant_id": tenant_id, "error": str(e)})
+            continue
+        logger.info({"schedule_sync": "tenant_synced", **result})
+        results.append(result)
+
+    return {"statusCode": 200 if not failed else 500, "synced": results, "failed": failed}
@@ -0,0 +1,144 @@
+import os
+import time
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from ..common.aws import ddb_table
+
+# Kursory i klucze wysyłek sprzątane przez TTL DynamoDB (domyślnie 7 dni).
+CAMPAIGN_RUN_TTL_SECONDS = int(os.getenv("CAMPAIGN_RUN_TTL_SECONDS", str(7 * 86400)))
+
+
+def _conditional_failed(e: ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+
+class CampaignRunsRepo:
+    """
+    Postęp wysyłki kampanii (fan-out w campaign_runner).
+
+    Item przebiegu: pk = pk kampanii, sk = "run#<run_id>",
+      cursor (indeks następnego odbiorcy), total, sent, skipped, status (running|done).
+    Klucz wysyłki: pk = pk kampanii, sk = "send#<run_id>#<telefon>" –
+      zapisywany warunkowo przed wrzuceniem wiadomości do kolejki, więc każdy
+      odbiorca dostaje wiadomość przebiegu najwyżej raz, także po wznowieniu.
+    """
+
+    def __init__(self, table_name: str | None = None, ttl_seconds: int = CAMPAIGN_RUN_TTL_SECONDS):
+        self.table = ddb_table(
+            table_name or os.environ.get("DDB_TABLE_CAMPAIGN_RUNS", "CampaignRuns")
+        )
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def run_key(campaign_pk: str, run_id: str) -> dict:
+        return {"pk": campaign_pk, "sk": f"run#{run_id}"}
+
+    @staticmethod
+    def send_key(campaign_pk: str, run_id: str, phone: str) -> dict:
+        return {"pk": campaign_pk, "sk": f"send#{run_id}#{phone}"}
+
+    def get_run(self, campaign_pk: str, run_id: str) -> dict | None:
+        return self.table.get_item(Key=self.run_key(campaign_pk, run_id), ConsistentRead=True).get("Item")
+
+    def pending_run_id(self, campaign_pk: str) -> str | None:
+        """
+        Najstarszy niedokończony przebieg kampanii (status running) albo None.
+        Przebieg jest kontynuowany do końca niezależnie od daty w run_id.
+        """
+        kwargs = {
+            "KeyConditionExpression": Key("pk").eq(campaign_pk) & Key("sk").begins_with("run#"),
+            "FilterExpression": Attr("status").eq("running"),
+            "ConsistentRead": True,
+        }
+        while True:
+            resp = self.table.query(**kwargs)
+            items = resp.get("Items", [])
+            if items:
+                return str(items[0]["sk"])[len("run#"):]
+            if not resp.get("LastEvaluatedKey"):
+                return None
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    def start_run(self, campaign_pk: str, run_id: str, total: int) -> dict:
+        """Tworzy przebieg z cursor=0; jeśli już istnieje, zwraca istniejący."""
+        now = int(time.time())
+        item = {
+            **self.run_key(campaign_pk, run_id),
+            "cursor": 0,
+            "total": int(total),
+            "sent": 0,
+            "skipped": 0,
+            "status": "running",
+            "started_at": now,
+            "updated_at": now,
+            "expires_at": now + self.ttl_seconds,
+        }
+        try:
+            self.table.put_item(Item=item, ConditionExpression="attribute_not_exists(pk)")
+            return item
+        except ClientError as e:
+            if not _conditional_failed(e):
+                raise
+        return self.get_run(campaign_pk, run_id) or item
+
+    def advance(
+        self,
+        campaign_pk: str,
+        run_id: str,
+        expected_cursor: int,
+        new_cursor: int,
+        sent: int,
+        skipped: int,
+        done: bool,
+    ) -> bool:
+        """
+        Przesuwa kursor o przetworzoną paczkę. Warunek cursor = expected_cursor
+        chroni przed dwoma workerami na tym samym przebiegu – przegrany dostaje False.
+        """
+        try:
+            self.table.update_item(
+                Key=self.run_key(campaign_pk, run_id),
+                UpdateExpression=(
+                    "SET #c = :new, #st = :status, updated_at = :now "
+                    "ADD sent :sent, skipped :skipped"
+                ),
+                ConditionExpression="#c = :expected",
+                ExpressionAttributeNames={"#c": "cursor", "#st": "status"},
+                ExpressionAttributeValues={
+                    ":new": int(new_cursor),
+                    ":expected": int(expected_cursor),
+                    ":status": "done" if done else "running",
+                    ":now": int(time.time()),
+                    ":sent": int(sent),
+                    ":skipped": int(skipped),
+                },
+            )
+            return True
+        except ClientError as e:
+            if _conditional_failed(e):
+                return False
+            raise
+
+    def claim_send(self, campaign_pk: str, run_id: str, phone: str) -> bool:
+        """True, jeśli ten odbiorca nie dostał jeszcze wiadomości w tym przebiegu."""
+        now = int(time.time())
+        try:
+            self.table.put_item(
+                Item={
+                    **self.send_key(campaign_pk, run_id, phone),
+                    "claimed_at": now,
+                    "expires_at": now + self.ttl_seconds,
+                },
+                ConditionExpression="attribute_not_exists(pk)",
+            )
+            return True
+        except ClientError as e:
+            if _conditional_failed(e):
+                return False
+            raise
+
+    def release_send(self, campaign_pk: str, run_id: str, phone: str) -> None:
+        """Zwalnia klucz, gdy wiadomość nie trafiła do kolejki – wznowienie spróbuje ponownie."""
+        self.table.delete_item(Key=self.send_key(campaign_pk, run_id, phone))
@@ -0,0 +1,130 @@
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from boto3.dynamodb.conditions import Key
+
+from ..common.aws import ddb_table
+
+# Wiersz znika (TTL DynamoDB) dobę po rozpoczęciu zajęć.
+CLASS_SCHEDULE_ROW_TTL_SECONDS = int(os.getenv("CLASS_SCHEDULE_ROW_TTL_SECONDS", "86400"))
+
+# Pola zajęć, które trzymamy w tabeli – tyle, ile potrzebuje router.
+CLASS_FIELDS = ["id", "startDate", "endDate", "clubId", "attendeesCount", "attendeesLimit"]
+
+
+def _start(c: dict) -> str:
+    return str(c.get("startDate") or c.get("startdate") or "")
+
+
+class ClassScheduleRepo:
+    """
+    Zdenormalizowany grafik zajęć z PerfectGym, zapisywany przez job schedule_sync.
+
+    Item zajęć: pk = tenant_id, sk = "<YYYY-MM-DD>#<startDate>#<id>",
+    club_id / date / attendees_* jako atrybuty, class = JSON zajęć
+    w formacie odpowiedzi PG (jak z get_available_classes).
+    Item stanu synchronizacji: pk = tenant_id, sk = "#sync" (sortuje się przed datami).
+    """
+
+    SYNC_SK = "#sync"
+
+    def __init__(self, table_name: str | None = None):
+        self.table = ddb_table(
+            table_name or os.environ.get("DDB_TABLE_CLASS_SCHEDULE", "ClassSchedule")
+        )
+
+    @staticmethod
+    def sort_key(c: dict) -> str:
+        start = _start(c)
+        return f"{start[:10]}#{start}#{c.get('id', c.get('Id', ''))}"
+
+    @staticmethod
+    def _expires_at(c: dict) -> int:
+        try:
+            start = datetime.fromisoformat(_start(c))
+        except ValueError:
+            return int(time.time()) + CLASS_SCHEDULE_ROW_TTL_SECONDS
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        return int(start.timestamp()) + CLASS_SCHEDULE_ROW_TTL_SECONDS
+
+    def to_item(self, tenant_id: str, c: dict, synced_at: int) -> dict:
+        data = {f: c[f] for f in CLASS_FIELDS if c.get(f) is not None}
+        class_type = c.get("classType") or {}
+        if class_type.get("name"):
+            data["classType"] = {"name": class_type["name"]}
+        item = {
+            "pk": tenant_id,
+            "sk": self.sort_key(c),
+            "date": _start(c)[:10],
+            "club_id": str(c.get("clubId", "")),
+            "class": json.dumps(data, ensure_ascii=False),
+            "synced_at": synced_at,
+            "expires_at": self._expires_at(c),
+        }
+        for attr, field in (("attendees_count", "attendeesCount"), ("attendees_limit", "attendeesLimit")):
+            if c.get(field) is not None:
+                item[attr] = int(c[field])
+        return item
+
+    def put_classes(self, tenant_id: str, classes, synced_at: int) -> int:
+        written = 0
+        with self.table.batch_writer(overwrite_by_pkeys=["pk", "sk"]) as batch:
+            for c in classes:
+                if not _start(c):
+                    continue
+                batch.put_item(Item=self.to_item(tenant_id, c, synced_at))
+                written += 1
+        return written
+
+    def _query(self, tenant_id: str, date_from: str, date_to: str | None):
+        # "~" sortuje się za "#", więc <date_to>~ obejmuje cały dzień date_to
+        cond = Key("pk").eq(tenant_id) & Key("sk").between(date_from, f"{date_to or '9999-12-31'}~")
+        kwargs = {"KeyConditionExpression": cond}
+        while True:
+            resp = self.table.query(**kwargs)
+            yield from resp.get("Items", []) or []
+            if "LastEvaluatedKey" not in resp:
+                break
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    def query_classes(
+        self,
+        tenant_id: str,
+        date_from: str,
+        date_to: str | None = None,
+        club_id=None,
+    ) -> list[dict]:
+        """Zajęcia tenanta z zakresu dat (włącznie), posortowane po starcie."""
+        club = str(club_id) if club_id not in (None, "") else None
+        return [
+            json.loads(item["class"])
+            for item in self._query(tenant_id, date_from, date_to)
+            if club is None or item.get("club_id") == club
+        ]
+
+    def delete_stale(self, tenant_id: str, date_from: str, synced_at: int) -> int:
+        """Usuwa zajęcia z zakresu, których nie było w ostatniej synchronizacji (odwołane, usunięte)."""
+        deleted = 0
+        with self.table.batch_writer() as batch:
+            for item in self._query(tenant_id, date_from, None):
+                if int(item.get("synced_at", 0)) < synced_at:
+                    batch.delete_item(Key={"pk": item["pk"], "sk": item["sk"]})
+                    deleted += 1
+        return deleted
+
+    def get_sync_state(self, tenant_id: str) -> dict | None:
+        return self.table.get_item(Key={"pk": tenant_id, "sk": self.SYNC_SK}).get("Item")
+
+    def put_sync_state(self, tenant_id: str, synced_at: int, until: str, count: int) -> None:
+        self.table.put_item(
+            Item={
+                "pk": tenant_id,
+                "sk": self.SYNC_SK,
+                "synced_at": synced_at,
+                "until": until,
+                "count": count,
+            }
+        )
@@ -3,7 +3,7 @@ import os
 import time
 from typing import Optional, Dict
 
-from ..common.aws import ddb_resource  # uwaga: ścieżka względem storage
+from ..common.aws import ddb_table  # uwaga: ścieżka względem storage
 # jeśli common.aws jest w src/common/aws.py, to:
 # from ..common.aws import ddb_resource
 
@@ -24,7 +24,7 @@ class ConsentsRepo:
 
     def __init__(self) -> None:
         table_name = os.getenv("DDB_TABLE_CONSENTS", "Consents")
-        self.table = ddb_resource().Table(table_name)
+        self.table = ddb_table(table_name)
 
     @staticmethod
     def _pk(tenant_id: str, phone: str) -> str:
@@ -1,9 +1,15 @@
 import os, time
-from ..common.aws import ddb_resource
+
+from botocore.exceptions import ClientError
+
+from ..common.aws import ddb_table
+from ..common.logging import logger
+
+VERIFICATION_CODE_TTL_SECONDS = int(os.getenv("VERIFICATION_CODE_TTL_SECONDS", "900"))
 
 class ConversationsRepo:
     def __init__(self):
-        self.table = ddb_resource().Table(
+        self.table = ddb_table(
             os.environ.get("DDB_TABLE_CONVERSATIONS", "Conversations")
         )
 
@@ -53,9 +59,14 @@ class ConversationsRepo:
         pg_challenge_type: str | None = None,
         pg_challenge_attempts: int | None = None,
         assigned_agent: str | None = None,
+        expected_version: int | None = None,
     ):
         """
         Upsert rozmowy – tylko pola, które nie są None, są aktualizowane.
+
+        Każdy zapis podbija licznik `version`. Jeśli podano expected_version,
+        zapis jest warunkowy (optimistic locking) – przy niezgodności wersji
+        boto3 rzuca ConditionalCheckFailedException.
         """
         key = self.conversation_pk(tenant_id, channel, channel_user_id)
 
@@ -93,32 +104,195 @@ class ConversationsRepo:
         if not update_expr_parts:
             return
 
+        update_expr_parts.append("version = if_not_exists(version, :zero) + :one")
+        expr_vals[":zero"] = 0
+        expr_vals[":one"] = 1
+
         update_expr = "SET " + ", ".join(update_expr_parts)
 
-        self.table.update_item(
-            Key=key,
-            UpdateExpression=update_expr,
-            ExpressionAttributeValues=expr_vals,
-        )
+        kwargs = {
+            "Key": key,
+            "UpdateExpression": update_expr,
+            "ExpressionAttributeValues": expr_vals,
+        }
+        if expected_version is not None:
+            if expected_version:
+                kwargs["ConditionExpression"] = "version = :expected_version"
+                expr_vals[":expected_version"] = expected_version
+            else:
+                kwargs["ConditionExpression"] = "attribute_not_exists(version)"
+
+        self.table.update_item(**kwargs)
+
+    def verification_code_key(self, tenant_id: str, verification_code: str) -> dict:
+        return {
+            "pk": f"tenant#{tenant_id}",
+            "sk": f"vcode#{verification_code.upper()}",
+        }
+
+    def put_verification_code(
+        self,
+        tenant_id: str,
+        verification_code: str,
+        channel: str,
+        channel_user_id: str,
+        ttl_seconds: int = VERIFICATION_CODE_TTL_SECONDS,
+    ) -> dict:
+        """
+        Zapisuje krótkotrwały item kod -> rozmowa (flow WWW -> WhatsApp).
+        Wygasłe kody usuwa DynamoDB TTL (atrybut expires_at).
+        """
+        item = {
+            **self.verification_code_key(tenant_id, verification_code),
+            "tenant_id": tenant_id,
+            "verification_code": verification_code.upper(),
+            "channel": channel,
+            "channel_user_id": channel_user_id,
+            "expires_at": int(time.time()) + ttl_seconds,
+        }
+        self.table.put_item(Item=item)
+        return item
 
     def find_by_verification_code(self, tenant_id: str, verification_code: str) -> dict | None:
-        # MVP: scan – docelowo GSI po (tenant_id, verification_code)
-        resp = self.table.scan(
-            FilterExpression="tenant_id = :t AND verification_code = :v",
-            ExpressionAttributeValues={
-                ":t": tenant_id,
-                ":v": verification_code,
-            },
-        )
-        items = resp.get("Items") or []
-        return items[0] if items else None
-        
-    def get(self, pk: str):
-        return self.table.get_item(Key={"pk": pk}).get("Item")
+        """
+        Zwraca {channel, channel_user_id, ...} rozmowy, dla której wygenerowano kod.
+        Jeden get_item niezależnie od rozmiaru tabeli.
+        """
+        item = self.table.get_item(
+            Key=self.verification_code_key(tenant_id, verification_code)
+        ).get("Item")
+        if not item:
+            return None
+        # TTL w DDB usuwa itemy z opóźnieniem – sprawdzamy ważność sami
+        if int(item.get("expires_at") or 0) < int(time.time()):
+            return None
+        return item
 
-    def put(self, item: dict):
+    def delete_verification_code(self, tenant_id: str, verification_code: str) -> None:
+        self.table.delete_item(Key=self.verification_code_key(tenant_id, verification_code))
+
+    def pending_key(self, tenant_id: str, phone: str) -> dict:
+        """Klucz oczekującej rezerwacji (czeka na TAK/NIE) dla numeru telefonu."""
+        return {
+            "pk": f"tenant#{tenant_id}",
+            "sk": f"pending#{phone}",
+        }
+
+    def get_pending(self, tenant_id: str, phone: str) -> dict | None:
+        return self.table.get_item(Key=self.pending_key(tenant_id, phone)).get("Item")
+
+    def put_pending(self, tenant_id: str, phone: str, **attrs) -> dict:
+        item = {**self.pending_key(tenant_id, phone), "tenant_id": tenant_id, **attrs}
         self.table.put_item(Item=item)
+        return item
+
+    def delete_pending(self, tenant_id: str, phone: str) -> None:
+        self.table.delete_item(Key=self.pending_key(tenant_id, phone))
+
+
+class ConversationSnapshot:
+    """
+    Unit-of-work dla jednej wiadomości: rozmowa jest czytana z DDB raz,
+    wszystkie gałęzie routingu modyfikują snapshot w pamięci, a na końcu
+    flush() robi jeden warunkowy update_item.
+
+    Semantyka set() jest taka sama jak upsert_conversation – wartości None
+    oznaczają "bez zmian", więc kolejne set() dają ten sam wynik co kolejne
+    upserty na tym samym kluczu.
+    """
+
+    # ile razy ponawiamy zapis po konflikcie wersji (ponowny odczyt + scalenie)
+    MAX_FLUSH_ATTEMPTS = 3
+
+    def __init__(self, repo, tenant_id: str, channel: str, channel_user_id: str, item: dict | None):
+        self.repo = repo
+        self.tenant_id = tenant_id
+        self.channel = channel
+        self.channel_user_id = channel_user_id
+        self.item: dict = dict(item or {})
+        # stan z odczytu – pozwala odróżnić pola zmienione równolegle
+        self._base: dict = dict(item or {})
+        self._changes: dict = {}
 
-    def delete(self, pk: str):
-        self.table.delete_item(Key={"pk": pk})
+    @classmethod
+    def load(cls, repo, tenant_id: str, channel: str, channel_user_id: str) -> "ConversationSnapshot":
+        item = repo.get_conversation(tenant_id, channel, channel_user_id)
+        return cls(repo, tenant_id, channel, channel_user_id, item)
 
+    def get(self, field: str, default=None):
+        return self.item.get(field, default)
+
+    def set(self, **fields) -> None:
+        for name, value in fields.items():
+            if value is None:
+                continue
+            self.item[name] = value
+            self._changes[name] = value
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._changes)
+
+    def _merge(self, fresh: dict) -> None:
+        """
+        Scala nasze zmiany z aktualnym stanem rozmowy po konflikcie wersji.
+        Pole zmienione równolegle (inna wartość niż przy odczycie) zostaje
+        z wartością równoległego zapisu – nie nadpisujemy go.
+        """
+        for name in list(self._changes):
+            if fresh.get(name) != self._base.get(name) and fresh.get(name) != self._changes[name]:
+                logger.warning(
+                    {
+                        "conversation": "write_conflict_field",
+                        "tenant_id": self.tenant_id,
+                        "channel": self.channel,
+                        "field": name,
+                    }
+                )
+                del self._changes[name]
+        self._base = dict(fresh)
+        self.item = {**fresh, **self._changes}
+
+    def flush(self) -> None:
+        """
+        Zapisuje zebrane zmiany jednym warunkowym update_item.
+
+        Przy konflikcie wersji (równoległa wiadomość w tej samej rozmowie)
+        czytamy rozmowę ponownie, scalamy zmiany (pola zmienione równolegle
+        wygrywają) i ponawiamy zapis warunkowy. Nigdy nie zapisujemy bez
+        warunku – po MAX_FLUSH_ATTEMPTS konfliktach wyjątek idzie wyżej.
+        """
+        for attempt in range(1, self.MAX_FLUSH_ATTEMPTS + 1):
+            if not self._changes:
+                return
+            expected_version = int(self.item.get("version") or 0)
+            try:
+                self.repo.upsert_conversation(
+                    self.tenant_id,
+                    self.channel,
+                    self.channel_user_id,
+                    expected_version=expected_version,
+                    **self._changes,
+                )
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+                logger.warning(
+                    {
+                        "conversation": "write_conflict",
+                        "tenant_id": self.tenant_id,
+                        "channel": self.channel,
+                        "expected_version": expected_version,
+                        "attempt": attempt,
+                    }
+                )
+                if attempt == self.MAX_FLUSH_ATTEMPTS:
+                    raise
+                fresh = self.repo.get_conversation(self.tenant_id, self.channel, self.channel_user_id)
+                self._merge(fresh or {})
+                continue
+
+            self.item["version"] = expected_version + 1
+            self._base = dict(self.item)
+            self._changes = {}
+            return
@@ -1,9 +1,9 @@
 import os, time
-from ..common.aws import ddb_resource
+from ..common.aws import ddb_table
 
 class LeadsRepo:
     def __init__(self):
-        self.table = ddb_resource().Table(
+        self.table = ddb_table(
             os.environ.get("DDB_TABLE_LEADS", "Leads")
         )
 
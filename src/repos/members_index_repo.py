@@ -1,23 +1,50 @@
 import os, time
-from ..common.aws import ddb_resource
+
+from boto3.dynamodb.conditions import Key
+
+from ..common.aws import ddb_table
+from ..common.utils import normalize_phone
+
+# GSI: HASH tenant_id, RANGE phone (E.164)
+PHONE_INDEX_NAME = os.environ.get("DDB_INDEX_MEMBERS_PHONE", "tenant_phone_index")
+
 
 class MembersIndexRepo:
     def __init__(self):
-        self.table = ddb_resource().Table(
+        self.table = ddb_table(
             os.environ.get("DDB_TABLE_MEMBERS_INDEX", "MembersIndex")
         )
 
+    def _pk(self, tenant_id: str, member_id: str) -> str:
+        return f"{tenant_id}#{member_id}"
+
+    def put_member(self, tenant_id: str, member_id: str, phone: str, **attrs) -> dict:
+        """
+        Zapisuje członka w indeksie. Telefon jest normalizowany do E.164,
+        żeby find_by_phone trafiało w GSI niezależnie od formatu wejściowego.
+        """
+        item = {
+            **attrs,
+            "pk": self._pk(tenant_id, member_id),
+            "id": member_id,
+            "tenant_id": tenant_id,
+            "phone": normalize_phone(phone),
+            "updated_at": int(time.time()),
+        }
+        self.table.put_item(Item=item)
+        return item
+
     def find_by_phone(self, tenant_id: str, phone: str) -> dict | None:
         """
-        Wersja MVP – scan po tenant_id + phone.
-        TODO Docelowo: query po GSI (tenant_id, phone).
+        Query po GSI (tenant_id, phone) – jeden odczyt niezależnie od rozmiaru tabeli.
         """
-        resp = self.table.scan(
-            FilterExpression="tenant_id = :t AND phone = :p",
-            ExpressionAttributeValues={
-                ":t": tenant_id,
-                ":p": phone,
-            },
+        normalized = normalize_phone(phone)
+        if not normalized:
+            return None
+        resp = self.table.query(
+            IndexName=PHONE_INDEX_NAME,
+            KeyConditionExpression=Key("tenant_id").eq(tenant_id) & Key("phone").eq(normalized),
+            Limit=1,
         )
         items = resp.get("Items") or []
         return items[0] if items else None
@@ -25,9 +52,6 @@ class MembersIndexRepo:
     def get_member(self, tenant_id: str, phone: str) -> dict | None:
         """
         Wrapper zgodny z tym, co woła RoutingService.
+        Przyjmuje też numery w formacie "whatsapp:+48...".
         """
-        # Normalizujemy phone, żeby był spójny z tym co zapisujesz w indeksie
-        normalized = phone
-        if normalized.startswith("whatsapp:"):
-            normalized = normalized.split(":", 1)[1]
-        return self.find_by_phone(tenant_id, normalized)
+        return self.find_by_phone(tenant_id, phone)
@@ -1,9 +1,9 @@
 import os, time
-from ..common.aws import ddb_resource
+from ..common.aws import ddb_table
 
 class MessagesRepo:
     def __init__(self):
-        self.table = ddb_resource().Table(os.environ.get("DDB_TABLE_MESSAGES", "Messages"))
+        self.table = ddb_table(os.environ.get("DDB_TABLE_MESSAGES", "Messages"))
 
     def put(self, item: dict):
         self.table.put_item(Item=item)
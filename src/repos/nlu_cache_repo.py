@@ -0,0 +1,39 @@
+import json
+import os
+import time
+
+from ..common.aws import ddb_table
+
+# Wpisy współdzielonego cache klasyfikacji wygasają przez TTL DynamoDB (expires_at).
+NLU_CACHE_DDB_TTL_SECONDS = int(os.getenv("NLU_CACHE_DDB_TTL_SECONDS", "86400"))
+
+
+class NluCacheRepo:
+    """
+    Współdzielony (między kontenerami) cache wyników klasyfikacji intencji.
+
+    Item: pk = klucz cache, result = JSON wyniku, expires_at = epoch (TTL).
+    TTL DynamoDB usuwa wpisy z opóźnieniem, więc expires_at sprawdzamy też przy odczycie.
+    """
+
+    def __init__(self, table_name: str | None = None):
+        self.table = ddb_table(
+            table_name or os.environ.get("DDB_TABLE_NLU_CACHE", "NluCache")
+        )
+
+    def get(self, key: str) -> dict | None:
+        item = self.table.get_item(Key={"pk": key}).get("Item")
+        if not item:
+            return None
+        if int(item.get("expires_at", 0)) <= int(time.time()):
+            return None
+        return json.loads(item["result"])
+
+    def put(self, key: str, result: dict, ttl_seconds: int = NLU_CACHE_DDB_TTL_SECONDS) -> None:
+        self.table.put_item(
+            Item={
+                "pk": key,
+                "result": json.dumps(result, ensure_ascii=False),
+                "expires_at": int(time.time()) + ttl_seconds,
+            }
+        )
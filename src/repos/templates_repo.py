@@ -1,13 +1,71 @@
 import os
-from ..common.aws import ddb_resource
+import time
+from ..common.aws import ddb_table
+
+# Limit BatchGetItem w DynamoDB
+BATCH_GET_MAX_KEYS = 100
+
 
 class TemplatesRepo:
     def __init__(self):
-        self.table = ddb_resource().Table(os.environ.get("DDB_TABLE_TEMPLATES", "Templates"))
+        self.table = ddb_table(os.environ.get("DDB_TABLE_TEMPLATES", "Templates"))
 
     def pk(self, tenant_id: str, name: str, language_code: str) -> str:
         return f"{tenant_id}#{name}#{language_code}"
 
     def get_template(self, tenant_id: str, name: str, language_code: str) -> dict | None:
         pk = self.pk(tenant_id, name, language_code)
-        return self.table.get_item(Key={"pk": pk}).get("Item")
\ No newline at end of file
+        return self.table.get_item(Key={"pk": pk}).get("Item")
+
+    def batch_get_templates(
+        self,
+        tenant_id: str,
+        names: list[str] | tuple[str, ...],
+        languages: list[str] | tuple[str, ...],
+        max_retries: int = 3,
+    ) -> dict[tuple[str, str], dict | None]:
+        """
+        Ładuje wszystkie szablony tenanta dla podanych nazw i języków
+        przez BatchGetItem (po 100 kluczy na wywołanie).
+
+        Zwraca {(name, language_code): item | None}. None oznacza, że szablonu
+        na pewno nie ma; klucze, których DDB nie przetworzył mimo retry
+        (UnprocessedKeys), są pomijane.
+        """
+        wanted = {
+            self.pk(tenant_id, name, lang): (name, lang)
+            for lang in languages
+            for name in names
+            if lang
+        }
+        pks = list(wanted)
+        found: dict[tuple[str, str], dict | None] = {}
+
+        for i in range(0, len(pks), BATCH_GET_MAX_KEYS):
+            request = {
+                self.table.name: {"Keys": [{"pk": pk} for pk in pks[i : i + BATCH_GET_MAX_KEYS]]}
+            }
+            attempt = 0
+            while request:
+                resp = self.table.meta.client.batch_get_item(RequestItems=request)
+                for item in (resp.get("Responses") or {}).get(self.table.name, []):
+                    key = wanted.get(item.get("pk"))
+                    if key:
+                        found[key] = item
+
+                request = resp.get("UnprocessedKeys") or {}
+                if request:
+                    attempt += 1
+                    if attempt > max_retries:
+                        break
+                    time.sleep(0.05 * 2 ** attempt)
+
+            unprocessed = {
+                k["pk"] for k in (request.get(self.table.name) or {}).get("Keys", [])
+            }
+            for pk in pks[i : i + BATCH_GET_MAX_KEYS]:
+                key = wanted[pk]
+                if pk not in unprocessed and key not in found:
+                    found[key] = None
+
+        return found
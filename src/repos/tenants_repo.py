@@ -1,16 +1,123 @@
 import os
-from ..common.aws import ddb_resource
+import time
+
+from ..common.aws import ddb_table
+from ..common.cache import TTLCache, MISSING
+from ..common.logging import logger
+from ..common.ddb_scan import parallel_scan
+
+# Konfiguracja tenantów zmienia się rzadko (kilka razy w miesiącu), a czytana
+# jest przy każdej wiadomości – trzymamy ją w cache współdzielonym przez
+# wszystkie instancje TenantsRepo w procesie.
+TENANTS_CACHE = TTLCache(
+    maxsize=int(os.getenv("TENANTS_CACHE_MAX_ITEMS", "512")),
+    ttl_seconds=int(os.getenv("TENANTS_CACHE_TTL_SECONDS", "300")),
+)
+TENANTS_NEGATIVE_TTL_SECONDS = int(os.getenv("TENANTS_CACHE_NEGATIVE_TTL_SECONDS", "60"))
+# Co tyle sekund wpis z cache jest rewalidowany lekkim odczytem samego config_version
+# (set_language i inne zmiany konfiguracji go podbijają). Inna wersja = pełny odczyt
+# i TENANT_CHANGE_LISTENERS, więc zmianę z innego kontenera widzimy po tym czasie,
+# a nie po TENANTS_CACHE_TTL_SECONDS. Zmiany bez podbicia wersji (ręczna edycja
+# tabeli) są widoczne dopiero po TTL.
+TENANTS_REVALIDATE_SECONDS = float(os.getenv("TENANTS_CACHE_REVALIDATE_SECONDS", "30"))
+
+# Funkcje wołane po zmianie/unieważnieniu konfiguracji tenanta (tenant_id albo
+# None = wszyscy) – np. TemplateService czyści wtedy wyliczone łańcuchy języków.
+TENANT_CHANGE_LISTENERS: list = []
+
+
+def _notify_change(tenant_id: str | None) -> None:
+    for listener in TENANT_CHANGE_LISTENERS:
+        listener(tenant_id)
+
 
 class TenantsRepo:
-    def __init__(self):
-        self.table = ddb_resource().Table(os.environ.get("DDB_TABLE_TENANTS", "Tenants"))
+    def __init__(
+        self,
+        cache: TTLCache | None = None,
+        revalidate_seconds: float = TENANTS_REVALIDATE_SECONDS,
+        now_fn=None,
+    ):
+        self.table = ddb_table(os.environ.get("DDB_TABLE_TENANTS", "Tenants"))
+        self.cache = cache if cache is not None else TENANTS_CACHE
+        self.revalidate_seconds = revalidate_seconds
+        self._now_fn = now_fn or time.monotonic
+
+    def _remember(self, tenant_id: str, item: dict | None) -> None:
+        # wpis w cache: [item, czas ostatniego sprawdzenia config_version]
+        if item:
+            self.cache.set(tenant_id, [item, self._now_fn()])
+        else:
+            self.cache.set(tenant_id, [None, self._now_fn()], ttl_seconds=TENANTS_NEGATIVE_TTL_SECONDS)
+
+    def _load(self, tenant_id: str) -> dict | None:
+        item = self.table.get_item(Key={"tenant_id": tenant_id}).get("Item")
+        self._remember(tenant_id, item)
+        return item
+
+    def _revalidate(self, tenant_id: str, entry: list) -> dict | None:
+        """Porównuje config_version z cache z wersją w DDB (odczyt tylko tego atrybutu)."""
+        item = entry[0]
+        try:
+            current = self.table.get_item(
+                Key={"tenant_id": tenant_id},
+                ProjectionExpression="tenant_id, config_version",
+            ).get("Item")
+        except Exception as e:
+            # DDB niedostępne – zostajemy przy wersji z cache do następnej rewalidacji
+            logger.warning({"tenants": "revalidate_failed", "tenant_id": tenant_id, "err": str(e)})
+            entry[1] = self._now_fn()
+            return item
+
+        if current is not None and current.get("config_version") == item.get("config_version"):
+            # bez zmian – przesuwamy tylko czas sprawdzenia (TTL wpisu biegnie dalej)
+            entry[1] = self._now_fn()
+            return item
+
+        fresh = self._load(tenant_id)
+        _notify_change(tenant_id)
+        return fresh
 
     def get(self, tenant_id: str) -> dict | None:
-        return self.table.get_item(Key={"tenant_id": tenant_id}).get("Item")
+        cached = self.cache.get(tenant_id)
+        if cached is not MISSING:
+            item, checked_at = cached
+            if item is None or self._now_fn() - checked_at < self.revalidate_seconds:
+                return item
+            return self._revalidate(tenant_id, cached)
+
+        return self._load(tenant_id)
 
     def set_language(self, tenant_id: str, language_code: str):
-        self.table.update_item(
+        """
+        Zmienia język tenanta i podbija config_version.
+        Nowa wersja trafia od razu do lokalnego cache (write-through),
+        a wpisy zależne od konfiguracji (TENANT_CHANGE_LISTENERS) są
+        unieważniane; pozostałe kontenery zobaczą ją przy najbliższej rewalidacji
+        config_version (TENANTS_CACHE_REVALIDATE_SECONDS).
+        """
+        resp = self.table.update_item(
             Key={"tenant_id": tenant_id},
-            UpdateExpression="SET language_code = :lang",
-            ExpressionAttributeValues={":lang": language_code},
+            UpdateExpression="SET language_code = :lang ADD config_version :one",
+            ExpressionAttributeValues={":lang": language_code, ":one": 1},
+            ReturnValues="ALL_NEW",
         )
+        item = resp.get("Attributes")
+        if item:
+            self._remember(tenant_id, item)
+            _notify_change(tenant_id)
+        else:
+            self.invalidate(tenant_id)
+
+    def list_ids(self) -> list[str]:
+        """Identyfikatory wszystkich tenantów (pełny scan, tylko klucz) – dla jobów batchowych."""
+        items = parallel_scan(self.table, segments=1, max_workers=1, projection=["tenant_id"])
+        return sorted(str(i["tenant_id"]) for i in items if i.get("tenant_id"))
+
+    def invalidate(self, tenant_id: str | None = None) -> None:
+        """Hook do unieważnienia cache – jednego tenanta albo wszystkich."""
+        if tenant_id is None:
+            self.cache.clear()
+        else:
+            self.cache.invalidate(tenant_id)
+        _notify_change(tenant_id)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark: FAQ jako JSON per język vs bundle KB (mmap).
+
+Generuje syntetyczne FAQ (--topics tematów × --langs języków), a potem w osobnych
+procesach mierzy dla obu formatów:
+  - czas załadowania (JSON: json.loads + normalizacja kluczy jak w KBService;
+    bundle: mmap pliku z dysku),
+  - czas --lookups odczytów losowych tematów (pierwsze odczyty bundla
+    obejmują doczytanie stron z page cache),
+  - przyrost RSS procesu i szczyt alokacji Pythona (tracemalloc).
+
+Użycie:
+  python -m src.scripts.bench_kb_bundle --topics 2000 --langs 5
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from src.common.kb_bundle import KbBundle, pack_bundle
+
+LANGS = ["pl", "en", "de", "uk", "es", "fr", "it", "cs"]
+
+
+def _rss_kb() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def make_faqs(topics: int, langs: int, answer_len: int) -> dict[str, dict[str, str]]:
+    rnd = random.Random(42)
+    words = ["klub", "karnet", "basen", "sauna", "trening", "recepcja", "zajęcia", "godziny", "opłata"]
+    faqs = {}
+    for lang in LANGS[:langs]:
+        faqs[lang] = {}
+        for i in range(topics):
+            text = " ".join(rnd.choice(words) for _ in range(answer_len // 7))
+            faqs[lang][f"Topic_{i}"] = text[:answer_len]
+    return faqs
+
+
+def _run_json(paths: dict[str, str], queries, out):
+    rss0 = _rss_kb()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    loaded = {}
+    for lang, path in paths.items():
+        with open(path, "rb") as f:
+            data = json.loads(f.read().decode("utf-8"))
+        loaded[lang] = {(k or "").strip().lower(): v for k, v in data.items()}
+    t_load = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()  # tracemalloc spowalnia sam odczyt
+    t0 = time.perf_counter()
+    for lang, topic in queries:
+        loaded[lang].get(topic)
+    t_lookup = time.perf_counter() - t0
+    out.put({"format": "json", "load_ms": t_load * 1000, "lookup_ms": t_lookup * 1000,
+             "rss_delta_kb": _rss_kb() - rss0, "py_peak_kb": peak // 1024})
+
+
+def _run_bundle(path: str, queries, out):
+    rss0 = _rss_kb()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    bundle = KbBundle.open(path)
+    t_load = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()  # tracemalloc spowalnia sam odczyt
+    t0 = time.perf_counter()
+    for lang, topic in queries:
+        bundle.get(lang, topic)
+    t_lookup = time.perf_counter() - t0
+    out.put({"format": "bundle", "load_ms": t_load * 1000, "lookup_ms": t_lookup * 1000,
+             "rss_delta_kb": _rss_kb() - rss0, "py_peak_kb": peak // 1024})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--langs", type=int, default=5)
+    parser.add_argument("--answer-len", type=int, default=300)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    faqs = make_faqs(args.topics, min(args.langs, len(LANGS)), args.answer_len)
+    rnd = random.Random(7)
+    queries = [(rnd.choice(list(faqs)), f"topic_{rnd.randrange(args.topics)}") for _ in range(args.lookups)]
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        json_paths = {}
+        json_bytes = 0
+        for lang, faq in faqs.items():
+            path = os.path.join(tmp, f"faq_{lang}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(faq, f, ensure_ascii=False)
+            json_paths[lang] = path
+            json_bytes += os.path.getsize(path)
+        bundle_path = os.path.join(tmp, "kb_bundle.bin")
+        with open(bundle_path, "wb") as f:
+            f.write(pack_bundle(faqs))
+
+        results = []
+        for target, target_args in ((_run_json, (json_paths,)), (_run_bundle, (bundle_path,))):
+            out = ctx.Queue()
+            proc = ctx.Process(target=target, args=(*target_args, queries, out))
+            proc.start()
+            results.append(out.get())
+            proc.join()
+
+        print(f"FAQ: {args.topics} topics x {len(faqs)} langs; JSON {json_bytes} B, "
+              f"bundle {os.path.getsize(bundle_path)} B; {args.lookups} lookups")
+        print(f"{'format':<8} {'load ms':>10} {'lookup ms':>10} {'RSS +KB':>10} {'py peak KB':>11}")
+        for r in results:
+            print(f"{r['format']:<8} {r['load_ms']:>10.2f} {r['lookup_ms']:>10.2f} "
+                  f"{r['rss_delta_kb']:>10} {r['py_peak_kb']:>11}")
+
+
+if __name__ == "__main__":
+    main()
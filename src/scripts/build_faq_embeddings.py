@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Buduje offline indeks embeddingów FAQ dla KBService.search.
+
+Czyta <tenant>/faq_<lang>.json (z S3 albo lokalnego pliku), liczy embeddingi
+wszystkich wariantów pytań i zapisuje obok w buckecie:
+  <tenant>/faq_<lang>.emb.npy   – macierz float32 (wiersz = wariant pytania, L2 = 1),
+  <tenant>/faq_<lang>.emb.json  – {"model", "dim", "topics": [temat wiersza i], "count"}.
+
+Użycie:
+  python -m src.scripts.build_faq_embeddings --bucket local-kb --tenant default --lang pl
+  python -m src.scripts.build_faq_embeddings --bucket local-kb --tenant default --lang pl \
+      --faq-file scripts/faq_pl.json
+"""
+import argparse
+import io
+import json
+from typing import Callable
+
+import numpy as np
+
+from src.adapters.openai_client import OpenAIClient
+from src.common.aws import s3_client
+
+EMBED_BATCH_SIZE = 100
+
+
+def faq_variants(faq: dict) -> list[tuple[str, str]]:
+    """
+    Zwraca [(topic, tekst)] do zembeddowania: warianty pytań z wpisu
+    albo – gdy ich brak – sam temat ("pool_hours" -> "pool hours").
+    """
+    rows: list[tuple[str, str]] = []
+    for topic, entry in faq.items():
+        topic_key = (topic or "").strip().lower()
+        if not topic_key:
+            continue
+        questions = entry.get("questions") if isinstance(entry, dict) else None
+        texts = [q for q in questions or [] if (q or "").strip()] or [topic_key.replace("_", " ")]
+        rows.extend((topic_key, t) for t in texts)
+    return rows
+
+
+def build_index(
+    faq: dict,
+    embed_fn: Callable[[list[str]], list[list[float]] | None],
+    model: str,
+) -> tuple["np.ndarray", dict]:
+    """Liczy macierz embeddingów i metadane dla słownika FAQ."""
+    rows = faq_variants(faq)
+    vectors: list[list[float]] = []
+    for i in range(0, len(rows), EMBED_BATCH_SIZE):
+        chunk = [text for _, text in rows[i : i + EMBED_BATCH_SIZE]]
+        embedded = embed_fn(chunk)
+        if not embedded or len(embedded) != len(chunk):
+            raise RuntimeError("Embedding failed – check OPENAI_API_KEY / EMBEDDING_MODEL")
+        vectors.extend(embedded)
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+
+    meta = {
+        "model": model,
+        "dim": int(matrix.shape[1]) if matrix.size else 0,
+        "count": len(rows),
+        "topics": [topic for topic, _ in rows],
+    }
+    return matrix, meta
+
+
+def upload_index(bucket: str, tenant_id: str, lang: str, matrix, meta: dict) -> None:
+    buf = io.BytesIO()
+    np.save(buf, matrix, allow_pickle=False)
+    base = f"{tenant_id}/faq_{lang}.emb"
+    s3 = s3_client()
+    s3.put_object(Bucket=bucket, Key=f"{base}.npy", Body=buf.getvalue())
+    s3.put_object(
+        Bucket=bucket,
+        Key=f"{base}.json",
+        Body=json.dumps(meta, ensure_ascii=False).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bucket", required=True)
+    parser.add_argument("--tenant", required=True)
+    parser.add_argument("--lang", required=True)
+    parser.add_argument("--faq-file", help="lokalny plik FAQ zamiast <tenant>/faq_<lang>.json z S3")
+    parser.add_argument("--model", help="model embeddingów (domyślnie EMBEDDING_MODEL)")
+    args = parser.parse_args()
+
+    if args.faq_file:
+        with open(args.faq_file, encoding="utf-8") as f:
+            faq = json.load(f)
+    else:
+        resp = s3_client().get_object(Bucket=args.bucket, Key=f"{args.tenant}/faq_{args.lang}.json")
+        faq = json.loads(resp["Body"].read().decode("utf-8"))
+
+    client = OpenAIClient()
+    model = args.model or client.embedding_model
+    matrix, meta = build_index(faq, lambda texts: client.embed(texts, model=model), model)
+    upload_index(args.bucket, args.tenant, args.lang, matrix, meta)
+    print(f"[build_faq_embeddings] {args.tenant}/{args.lang}: {meta['count']} rows, dim={meta['dim']}")
+
+
+if __name__ == "__main__":
+    main()
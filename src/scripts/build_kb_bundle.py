@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Buduje bundle KB tenanta (wszystkie języki FAQ w jednym pliku binarnym).
+
+Zbiera <tenant>/faq_<lang>.json z S3 (albo lokalne pliki faq_<lang>.json
+z katalogu), pakuje je formatem src.common.kb_bundle i wrzuca jako
+<tenant>/kb_bundle.bin do bucketa KB.
+
+Użycie:
+  python -m src.scripts.build_kb_bundle --bucket local-kb --tenant default
+  python -m src.scripts.build_kb_bundle --bucket local-kb --tenant default --faq-dir scripts/
+  python -m src.scripts.build_kb_bundle --tenant default --faq-dir scripts/ --out /tmp/kb_bundle.bin
+"""
+import argparse
+import glob
+import json
+import os
+import re
+
+from src.common.aws import s3_client
+from src.common.kb_bundle import pack_bundle
+
+FAQ_FILE_RE = re.compile(r"faq_([A-Za-z]{2,3}(?:-[A-Za-z0-9]+)?)\.json$")
+
+
+def load_faqs_from_dir(path: str) -> dict[str, dict]:
+    faqs: dict[str, dict] = {}
+    for file_path in sorted(glob.glob(os.path.join(path, "faq_*.json"))):
+        m = FAQ_FILE_RE.search(os.path.basename(file_path))
+        if not m:
+            continue
+        with open(file_path, encoding="utf-8") as f:
+            faqs[m.group(1).lower()] = json.load(f)
+    return faqs
+
+
+def load_faqs_from_s3(bucket: str, tenant_id: str) -> dict[str, dict]:
+    s3 = s3_client()
+    faqs: dict[str, dict] = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{tenant_id}/faq_"):
+        for obj in page.get("Contents") or []:
+            m = FAQ_FILE_RE.search(obj["Key"])
+            if not m:  # pomijamy m.in. indeksy embeddingów (faq_<lang>.emb.*)
+                continue
+            body = s3.get_object(Bucket=bucket, Key=obj["Key"])["Body"].read()
+            faqs[m.group(1).lower()] = json.loads(body.decode("utf-8"))
+    return faqs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenant", required=True)
+    parser.add_argument("--bucket", help="bucket KB (źródło FAQ i/lub cel bundla)")
+    parser.add_argument("--faq-dir", help="lokalny katalog z faq_<lang>.json zamiast S3")
+    parser.add_argument("--out", help="zapisz bundle do pliku zamiast do S3")
+    args = parser.parse_args()
+
+    if not args.faq_dir and not args.bucket:
+        parser.error("podaj --faq-dir albo --bucket")
+    if not args.out and not args.bucket:
+        parser.error("podaj --out albo --bucket")
+
+    faqs = load_faqs_from_dir(args.faq_dir) if args.faq_dir else load_faqs_from_s3(args.bucket, args.tenant)
+    bundle = pack_bundle(faqs)
+
+    if args.out:
+        with open(args.out, "wb") as f:
+            f.write(bundle)
+        target = args.out
+    else:
+        target = f"s3://{args.bucket}/{args.tenant}/kb_bundle.bin"
+        s3_client().put_object(Bucket=args.bucket, Key=f"{args.tenant}/kb_bundle.bin", Body=bundle)
+
+    topics = sum(len(v or {}) for v in faqs.values())
+    print(f"[build_kb_bundle] {args.tenant}: {len(faqs)} lang(s), {topics} topic(s), {len(bundle)} B -> {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Test obciążeniowy SpamService dla jednego tenanta (burza odpowiedzi na kampanię).
+
+Wysyła --rate wiadomości/min z --phones różnych numerów przez --duration sekund
+(--workers wątków, jak równoległe kontenery webhooka) i raportuje:
+  - osiągniętą przepustowość i opóźnienia is_blocked (p50/p99),
+  - decyzje (allowed / blocked) i błędy DDB (throttling => fail-open),
+  - zapisy na sekundę na najgorętszy klucz licznika tenanta – przy jednym
+    "__TOTAL__" to cały ruch tenanta, przy N shardach ok. 1/N
+    (limit DynamoDB: ~1000 WCU/s na pozycję).
+
+Użycie:
+  python -m src.scripts.load_test_spam --moto --rate 3000 --duration 20 --shards 8
+  python -m src.scripts.load_test_spam --endpoint-url http://localhost:4566 --rate 30000 --shards 1
+"""
+import argparse
+import collections
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+TABLE = "IntentsStats"
+
+
+def _ensure_table() -> None:
+    import boto3
+
+    ddb = boto3.client("dynamodb", region_name=os.environ["AWS_REGION"])
+    try:
+        ddb.describe_table(TableName=TABLE)
+    except ddb.exceptions.ResourceNotFoundException:
+        ddb.create_table(
+            TableName=TABLE,
+            KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}, {"AttributeName": "sk", "KeyType": "RANGE"}],
+            AttributeDefinitions=[
+                {"AttributeName": "pk", "AttributeType": "S"},
+                {"AttributeName": "sk", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+
+def run(args) -> dict:
+    from src.common.cache import TTLCache
+    from src.services import spam_service
+    from src.services.spam_service import SpamService
+
+    _ensure_table()
+
+    class NoTenants:
+        def get(self, tenant_id):
+            return None
+
+    svc = SpamService(
+        max_per_bucket=10**6,  # testujemy licznik tenanta, nie limity numerów
+        tenant_max_per_bucket=args.tenant_limit,
+        local_state=TTLCache(maxsize=100_000),
+        tenants=NoTenants(),
+        mode="ddb",
+        tenant_shards=args.shards,
+    )
+
+    # zliczamy zapisy per klucz licznika tenanta (gorące pozycje)
+    writes = collections.Counter()
+    writes_lock = threading.Lock()
+    original_items = svc._transact_items
+
+    def counting_items(tenant_id, phone, now_ts, shard):
+        items = original_items(tenant_id, phone, now_ts, shard)
+        with writes_lock:
+            writes[items[2]["Update"]["Key"]["sk"]] += 1
+        return items
+
+    svc._transact_items = counting_items
+
+    errors = collections.Counter()
+    original_error = spam_service.logger.error
+
+    def counting_error(msg, *a, **kw):
+        errors[(msg or {}).get("spam", "other") if isinstance(msg, dict) else "other"] += 1
+
+    spam_service.logger.error = counting_error
+
+    interval = 60.0 / args.rate
+    total = int(args.rate * args.duration / 60)
+    latencies: list[float] = []
+    decisions = collections.Counter()
+    start = time.perf_counter()
+
+    def send(i: int) -> None:
+        due = start + i * interval
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        t0 = time.perf_counter()
+        blocked = svc.is_blocked("load-tenant", f"whatsapp:+48{i % args.phones:09d}")
+        latencies.append(time.perf_counter() - t0)
+        decisions["blocked" if blocked else "allowed"] += 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(send, range(total)))
+    finally:
+        spam_service.logger.error = original_error
+
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    hottest = max(writes.values()) if writes else 0
+    return {
+        "messages": total,
+        "elapsed_s": elapsed,
+        "achieved_per_min": total / elapsed * 60,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "decisions": dict(decisions),
+        "errors": dict(errors),
+        "tenant_keys": len(writes),
+        "hottest_key_writes_per_s": hottest / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=int, default=30_000, help="wiadomości na minutę")
+    parser.add_argument("--duration", type=int, default=20, help="sekundy")
+    parser.add_argument("--phones", type=int, default=5_000)
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--tenant-limit", type=int, default=10**7)
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--endpoint-url", help="np. LocalStack; bez tego – AWS z bieżącymi credentialami")
+    parser.add_argument("--moto", action="store_true", help="DynamoDB w pamięci (moto)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_REGION", "eu-central-1")
+    os.environ.setdefault("DDB_TABLE_INTENTS_STATS", TABLE)
+    if args.endpoint_url:
+        os.environ["LOCALSTACK_ENDPOINT"] = args.endpoint_url
+
+    if args.moto:
+        from moto import mock_aws
+
+        # moto nie jest bezpieczne wątkowo dla transakcji – jeden "kontener"
+        args.workers = 1
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+        with mock_aws():
+            result = run(args)
+    else:
+        result = run(args)
+
+    print(f"[load_test_spam] shards={args.shards} target={args.rate}/min")
+    for k, v in result.items():
+        print(f"  {k:<26} {v:.2f}" if isinstance(v, float) else f"  {k:<26} {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,19 +18,32 @@ def ensure_queue(name):
         print(f"[init] queue created: {name} -> {resp['QueueUrl']}")
         return resp["QueueUrl"]
 
-def ensure_table(name, attrs, keys):
+def ensure_table(name, attrs, keys, gsis=None):
     try:
         ddb.describe_table(TableName=name)
         print(f"[init] table exists: {name}")
     except ddb.exceptions.ResourceNotFoundException:
+        extra = {"GlobalSecondaryIndexes": gsis} if gsis else {}
         ddb.create_table(
             TableName=name,
             BillingMode="PAY_PER_REQUEST",
             AttributeDefinitions=attrs,
             KeySchema=keys,
+            **extra,
         )
         print(f"[init] table created: {name}")
 
+def ensure_ttl(name, attribute):
+    desc = ddb.describe_time_to_live(TableName=name).get("TimeToLiveDescription", {})
+    if desc.get("TimeToLiveStatus") in ("ENABLED", "ENABLING"):
+        print(f"[init] ttl exists: {name}.{attribute}")
+        return
+    ddb.update_time_to_live(
+        TableName=name,
+        TimeToLiveSpecification={"Enabled": True, "AttributeName": attribute},
+    )
+    print(f"[init] ttl enabled: {name}.{attribute}")
+
 if __name__ == "__main__":
     inbound = ensure_queue("inbound-events")
     outbound = ensure_queue("outbound-messages")
@@ -40,22 +53,62 @@ if __name__ == "__main__":
         [{"AttributeName":"pk","KeyType":"HASH"},{"AttributeName":"sk","KeyType":"RANGE"}]
     )
     ensure_table("Conversations",
-        [{"AttributeName":"pk","AttributeType":"S"}],
-        [{"AttributeName":"pk","KeyType":"HASH"}]
+        [{"AttributeName":"pk","AttributeType":"S"},{"AttributeName":"sk","AttributeType":"S"}],
+        [{"AttributeName":"pk","KeyType":"HASH"},{"AttributeName":"sk","KeyType":"RANGE"}]
     )
+    # kody weryfikacyjne WWW -> WhatsApp wygasają przez TTL
+    ensure_ttl("Conversations", "expires_at")
     ensure_table("Campaigns",
         [{"AttributeName":"pk","AttributeType":"S"}],
         [{"AttributeName":"pk","KeyType":"HASH"}]
     )
+    # postęp wysyłki kampanii (kursory + klucze wysyłek)
+    ensure_table("CampaignRuns",
+        [{"AttributeName":"pk","AttributeType":"S"},{"AttributeName":"sk","AttributeType":"S"}],
+        [{"AttributeName":"pk","KeyType":"HASH"},{"AttributeName":"sk","KeyType":"RANGE"}]
+    )
+    ensure_ttl("CampaignRuns", "expires_at")
     ensure_table("IntentsStats",
         [{"AttributeName":"pk","AttributeType":"S"},{"AttributeName":"sk","AttributeType":"S"}],
         [{"AttributeName":"pk","KeyType":"HASH"},{"AttributeName":"sk","KeyType":"RANGE"}]
     )
+    ensure_ttl("IntentsStats", "expires_at")
     ensure_table(
         "Consents",
         [{"AttributeName": "pk", "AttributeType": "S"}],
         [{"AttributeName": "pk", "KeyType": "HASH"}],
     )
+    # współdzielony cache klasyfikacji NLU
+    ensure_table("NluCache",
+        [{"AttributeName":"pk","AttributeType":"S"}],
+        [{"AttributeName":"pk","KeyType":"HASH"}]
+    )
+    ensure_ttl("NluCache", "expires_at")
+    # grafik zajęć PG (job schedule_sync)
+    ensure_table("ClassSchedule",
+        [{"AttributeName":"pk","AttributeType":"S"},{"AttributeName":"sk","AttributeType":"S"}],
+        [{"AttributeName":"pk","KeyType":"HASH"},{"AttributeName":"sk","KeyType":"RANGE"}]
+    )
+    ensure_ttl("ClassSchedule", "expires_at")
+    ensure_table(
+        "MembersIndex",
+        [
+            {"AttributeName": "pk", "AttributeType": "S"},
+            {"AttributeName": "tenant_id", "AttributeType": "S"},
+            {"AttributeName": "phone", "AttributeType": "S"},
+        ],
+        [{"AttributeName": "pk", "KeyType": "HASH"}],
+        gsis=[
+            {
+                "IndexName": "tenant_phone_index",
+                "KeySchema": [
+                    {"AttributeName": "tenant_id", "KeyType": "HASH"},
+                    {"AttributeName": "phone", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            }
+        ],
+    )
 
 
     print("\n[init] export these env vars in your shell:")
@@ -13,10 +13,16 @@ while True:
         if not msgs:
             continue
         print(f"[worker_message_router] got {len(msgs)} msg(s)")
-        event = {"Records": [{"body": m["Body"]} for m in msgs]}
-        lambda_handler(event, None)
+        event = {"Records": [{"messageId": m["MessageId"], "body": m["Body"]} for m in msgs]}
+        result = lambda_handler(event, None) or {}
+        # jak ReportBatchItemFailures: usuwamy tylko udane, nieudane wrócą po visibility timeout
+        failed = {f["itemIdentifier"] for f in result.get("batchItemFailures") or []}
         for m in msgs:
+            if m["MessageId"] in failed:
+                continue
             sqs.delete_message(QueueUrl=IN_Q, ReceiptHandle=m["ReceiptHandle"])
+        if failed:
+            print(f"[worker_message_router] {len(failed)} msg(s) failed, left for retry")
         print(f"[worker_message_router] processed {len(msgs)} msg(s) -> outbound")
     except botocore.exceptions.EndpointConnectionError as e:
         print(f"[worker_message_router] endpoint error: {e}; retry in 2s")
@@ -19,10 +19,16 @@ while True:
                 json.loads(m["Body"])
             except Exception:
                 print(f"[worker_outbound_sender] bad JSON: {m['Body']}")
-        event = {"Records": [{"body": m["Body"]} for m in msgs]}
-        lambda_handler(event, None)
+        event = {"Records": [{"messageId": m["MessageId"], "body": m["Body"]} for m in msgs]}
+        result = lambda_handler(event, None) or {}
+        # jak ReportBatchItemFailures: usuwamy tylko udane, nieudane wrócą po visibility timeout
+        failed = {f["itemIdentifier"] for f in result.get("batchItemFailures") or []}
         for m in msgs:
+            if m["MessageId"] in failed:
+                continue
             sqs.delete_message(QueueUrl=OUT_Q, ReceiptHandle=m["ReceiptHandle"])
+        if failed:
+            print(f"[worker_outbound_sender] {len(failed)} msg(s) failed, left for retry")
         print(f"[worker_outbound_sender] sent {len(msgs)} msg(s)")
     except botocore.exceptions.EndpointConnectionError as e:
         print(f"[worker_outbound_sender] endpoint error: {e}; retry in 2s")
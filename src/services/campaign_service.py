@@ -22,8 +22,8 @@ class CampaignService:
         conversations_repo: Optional[ConversationsRepo] = None,
     ) -> None:
         self._now_fn = now_fn or datetime.utcnow
-        self.tpl = template_service or TemplateService()
         self.tenants = tenants_repo or TenantsRepo()
+        self.tpl = template_service or TemplateService(tenants=self.tenants)
         self.conversations = conversations_repo or ConversationsRepo()
         # cache na listy słów, gdybyś kiedyś chciał używać templatek do słówek TAK/NIE w kampaniach
         self._words_cache: dict[tuple[str, str, str], set[str]] = {}
@@ -0,0 +1,186 @@
+"""
+Szybka, regułowa klasyfikacja intencji przed wywołaniem LLM.
+
+Reguły (słowa kluczowe + regexy) są per tenant i język: z pliku
+<tenant_id>/intent_rules_<lang>.json w buckecie KB albo domyślne
+z domain.intent_rules. Kompilujemy je raz i trzymamy w cache procesu.
+
+Reguły trafiają tylko w krótkie, jednoznaczne wiadomości – jeśli pasuje
+więcej niż jedna intencja, tekst jest długi albo zawiera czasownik
+rezerwacji/odwołania lub przeczenie (INTENT_RULES_FALLTHROUGH), oddajemy
+decyzję do LLM.
+"""
+
+import json
+import os
+import re
+from typing import Optional
+
+from botocore.exceptions import ClientError
+
+from ..common.aws import s3_client
+from ..common.cache import TTLCache, MISSING
+from ..common.config import settings
+from ..common.logging import logger
+from ..common.utils import normalize_text
+from ..domain.intent_rules import DEFAULT_INTENT_RULES, INTENT_RULES_FALLTHROUGH
+from .metrics_service import MetricsService
+
+# (tenant_id, lang) -> lista skompilowanych reguł
+INTENT_RULES_CACHE = TTLCache(
+    maxsize=int(os.getenv("INTENT_RULES_CACHE_MAX_ITEMS", "256")),
+    ttl_seconds=int(os.getenv("INTENT_RULES_CACHE_TTL_SECONDS", "300")),
+)
+INTENT_RULES_MAX_WORDS = int(os.getenv("INTENT_RULES_MAX_WORDS", "8"))
+INTENT_RULES_DEFAULT_CONFIDENCE = 0.95
+
+
+class CompiledRule:
+    def __init__(self, intent: str, slots: dict, regex: "re.Pattern", confidence: float) -> None:
+        self.intent = intent
+        self.slots = slots
+        self.regex = regex
+        self.confidence = confidence
+
+
+def _word_pattern(word: str) -> str | None:
+    """
+    Całe słowo/fraza po normalizacji; "*" na końcu dopuszcza dowolną końcówkę
+    ("odwoł*" -> odwołaj, odwołać).
+    """
+    stem = word.endswith("*")
+    normalized = normalize_text(word.rstrip("*") if stem else word)
+    if not normalized:
+        return None
+    return r"(?<!\w)" + re.escape(normalized) + (r"\w*" if stem else r"(?!\w)")
+
+
+def _compile_fallthrough(words: list[str]) -> "re.Pattern | None":
+    parts = [p for p in (_word_pattern(w) for w in words) if p]
+    return re.compile("|".join(parts)) if parts else None
+
+
+# język -> regex słów, przy których reguły oddają decyzję do LLM
+FALLTHROUGH_REGEXES = {lang: _compile_fallthrough(words) for lang, words in INTENT_RULES_FALLTHROUGH.items()}
+
+
+def compile_rules(rules: list[dict]) -> list[CompiledRule]:
+    """
+    Kompiluje reguły do jednego regexa per reguła.
+    Frazy i słowa kluczowe są normalizowane tak jak tekst wiadomości; frazy
+    muszą pokryć całą wiadomość, słowa kluczowe – całe słowa w jej środku.
+    Niepoprawne reguły są pomijane z logiem.
+    """
+    compiled: list[CompiledRule] = []
+    for rule in rules or []:
+        intent = (rule or {}).get("intent")
+        if not intent:
+            continue
+        parts = [
+            "^" + re.escape(normalize_text(phrase)) + "$"
+            for phrase in rule.get("phrases") or []
+            if normalize_text(phrase)
+        ]
+        parts += [p for p in (_word_pattern(kw) for kw in rule.get("keywords") or []) if p]
+        parts += list(rule.get("patterns") or [])
+        if not parts:
+            continue
+        try:
+            regex = re.compile("|".join(f"(?:{p})" for p in parts))
+        except re.error as e:
+            logger.warning({"intent_rules": "bad_pattern", "intent": intent, "err": str(e)})
+            continue
+        compiled.append(
+            CompiledRule(
+                intent=intent,
+                slots=dict(rule.get("slots") or {}),
+                regex=regex,
+                confidence=float(rule.get("confidence", INTENT_RULES_DEFAULT_CONFIDENCE)),
+            )
+        )
+    return compiled
+
+
+class IntentRulesService:
+    """
+    Pre-klasyfikator dla NLUService: classify() zwraca wynik w formacie NLU
+    albo None, gdy decyzję trzeba oddać do LLM.
+    """
+
+    def __init__(
+        self,
+        bucket: str | None = None,
+        cache: TTLCache | None = None,
+        metrics: MetricsService | None = None,
+        max_words: int = INTENT_RULES_MAX_WORDS,
+    ) -> None:
+        self.bucket = settings.kb_bucket if bucket is None else bucket
+        self.cache = cache if cache is not None else INTENT_RULES_CACHE
+        self.metrics = metrics or MetricsService()
+        self.max_words = max_words
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _lang(language_code: str | None) -> str:
+        lang = (language_code or "en").lower()
+        return lang.split("-", 1)[0]
+
+    def _load_rules(self, tenant_id: str, lang: str) -> Optional[list[dict]]:
+        """Reguły tenanta z S3; None, jeśli tenant ich nie ma."""
+        if not self.bucket:
+            return None
+        key = f"{tenant_id}/intent_rules_{lang}.json"
+        try:
+            resp = s3_client().get_object(Bucket=self.bucket, Key=key)
+            data = json.loads(resp["Body"].read().decode("utf-8"))
+            return data if isinstance(data, list) else None
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchKey":
+                logger.warning(
+                    {"intent_rules": "s3_get_failed", "tenant_id": tenant_id, "key": key, "err": str(e)}
+                )
+            return None
+        except ValueError as e:
+            logger.warning({"intent_rules": "bad_json", "tenant_id": tenant_id, "key": key, "err": str(e)})
+            return None
+
+    def rules_for(self, tenant_id: str, language_code: str | None) -> list[CompiledRule]:
+        lang = self._lang(language_code)
+        cache_key = (tenant_id, lang)
+        cached = self.cache.get(cache_key)
+        if cached is not MISSING:
+            return cached
+
+        raw = self._load_rules(tenant_id, lang)
+        if raw is None:
+            raw = DEFAULT_INTENT_RULES.get(lang, [])
+        compiled = compile_rules(raw)
+        self.cache.set(cache_key, compiled)
+        return compiled
+
+    def classify(self, text: str, lang: str | None, tenant_id: str = "default") -> Optional[dict]:
+        normalized = normalize_text(text)
+        if not normalized or len(normalized.split()) > self.max_words:
+            self.misses += 1
+            return None
+        # "odwołaj moje zajęcia", "nie chcę konsultanta" – sens zależy od szczegółów
+        fallthrough = FALLTHROUGH_REGEXES.get(self._lang(lang))
+        if fallthrough is not None and fallthrough.search(normalized):
+            self.misses += 1
+            return None
+
+        matches = [r for r in self.rules_for(tenant_id, lang) if r.regex.search(normalized)]
+        # różne intencje/tematy naraz – niejednoznaczne, niech zdecyduje LLM
+        distinct = {(r.intent, tuple(sorted(r.slots.items()))) for r in matches}
+        if len(distinct) != 1:
+            self.misses += 1
+            return None
+
+        rule = matches[0]
+        self.hits += 1
+        self.metrics.incr("nlu_rules", result="hit", intent=rule.intent, tenant_id=tenant_id)
+        return {"intent": rule.intent, "confidence": rule.confidence, "slots": dict(rule.slots)}
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
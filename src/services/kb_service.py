@@ -4,42 +4,258 @@ Serwis wiedzy/FAQ.
 Odpowiada za pobieranie odpowiedzi FAQ dla danego tenanta:
 - w pierwszej kolejności próbuje odczytać dane z S3 (jeśli skonfigurowano bucket),
 - jeśli nie ma pliku lub nie ma konfiguracji, korzysta z domyślnego DEFAULT_FAQ.
+
+Wpis FAQ to albo sama odpowiedź ({"parking": "..."}), albo obiekt z wariantami
+pytań ({"parking": {"answer": "...", "questions": ["gdzie zaparkować?", ...]}}).
+
+Opcjonalnie obok faq_<lang>.json leży indeks embeddingów (faq_<lang>.emb.npy
++ faq_<lang>.emb.json, budowany offline przez scripts/build_faq_embeddings.py).
+Wtedy search() dopasowuje dowolny tekst do tematów FAQ po podobieństwie
+cosinusowym, a FaqRetrievalStage pozwala NLUService pominąć LLM dla pytań z FAQ.
 """
 
+import io
 import json
-from typing import Dict, Optional
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, Optional
 
 from botocore.exceptions import ClientError
 
+from ..adapters.openai_client import OpenAIClient
+from ..common.cache import TTLCache, MISSING
+from ..common.kb_bundle import KbBundle
 from ..common.logging import logger
+from ..common.utils import normalize_text
 from ..domain.templates import DEFAULT_FAQ
 from ..common.aws import s3_client
 from ..common.config import settings
 
+try:  # NumPy jest opcjonalny – bez niego działa tylko dopasowanie po temacie
+    import numpy as np
+except ImportError:  # pragma: no cover - zależy od środowiska
+    np = None
+
+# (tenant_id, lang) -> {"data": {topic: answer} | None, "etag": str | None, "fresh_until": float}
+# Wpis po upływie KB_CACHE_TTL_SECONDS jest rewalidowany warunkowym GET (If-None-Match),
+# więc niezmieniony plik kosztuje 304 bez transferu treści. Wpisy trzymamy dłużej
+# (KB_CACHE_RETENTION_SECONDS), żeby mieć ETag do rewalidacji; limit liczby wpisów
+# (LRU) obejmuje wszystkich tenantów i języki.
+FAQ_CACHE = TTLCache(
+    maxsize=int(os.getenv("KB_CACHE_MAX_ITEMS", "256")),
+    ttl_seconds=int(os.getenv("KB_CACHE_RETENTION_SECONDS", "86400")),
+)
+KB_CACHE_TTL_SECONDS = int(os.getenv("KB_CACHE_TTL_SECONDS", "300"))
+KB_CACHE_NEGATIVE_TTL_SECONDS = int(os.getenv("KB_CACHE_NEGATIVE_TTL_SECONDS", "60"))
+
+# Bundle KB (scripts/build_kb_bundle.py): <tenant_id>/kb_bundle.bin, kopia w KB_BUNDLE_DIR.
+# W FAQ_CACHE trzymany pod kluczem (tenant_id, "*") – obejmuje wszystkie języki.
+KB_BUNDLE_NAME = "kb_bundle.bin"
+KB_BUNDLE_DIR = os.getenv("KB_BUNDLE_DIR", "/tmp/kb")
+KB_BUNDLES_ENABLED = os.getenv("KB_BUNDLES_ENABLED", "true").lower() == "true"
+BUNDLE_LANG = "*"
+
+# (tenant_id, lang) -> FaqIndex albo None (brak indeksu, krótszy TTL negatywny);
+# błędy ładowania (S3, uszkodzony plik) nie są cache'owane – kolejne wywołanie próbuje ponownie
+FAQ_INDEX_CACHE = TTLCache(
+    maxsize=int(os.getenv("KB_INDEX_CACHE_MAX_ITEMS", "64")),
+    ttl_seconds=int(os.getenv("KB_INDEX_CACHE_TTL_SECONDS", "900")),
+)
+# (model embeddingów, znormalizowany tekst) -> wektor; powtarzające się pytania
+# ("czy jest parking?") nie płacą za embedding przy każdej wiadomości
+FAQ_EMBEDDING_CACHE = TTLCache(
+    maxsize=int(os.getenv("KB_EMBEDDING_CACHE_MAX_ITEMS", "2048")),
+    ttl_seconds=int(os.getenv("KB_EMBEDDING_CACHE_TTL_SECONDS", "3600")),
+)
+KB_SEMANTIC_THRESHOLD = float(os.getenv("KB_SEMANTIC_THRESHOLD", "0.82"))
+KB_SEMANTIC_TOP_K = int(os.getenv("KB_SEMANTIC_TOP_K", "3"))
+
+
+def faq_answer(entry) -> Optional[str]:
+    """Odpowiedź z wpisu FAQ niezależnie od formatu (string albo obiekt z "answer")."""
+    if isinstance(entry, dict):
+        return entry.get("answer")
+    return entry
+
+
+class FaqIndex:
+    """
+    Macierz embeddingów FAQ w pamięci: jeden wiersz (znormalizowany L2) na wariant
+    pytania, topics[i] to temat wiersza i. Wyszukiwanie to jedno mnożenie macierzy.
+    """
+
+    def __init__(self, matrix, topics: list[str], model: str) -> None:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = (matrix / norms).astype(np.float32, copy=False)
+        self.topics = topics
+        self.model = model
+
+    def search(self, query: list[float], top_k: int, threshold: float) -> list[tuple[str, float]]:
+        """Top-k tematów (po najlepszym wariancie) z podobieństwem >= threshold."""
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm == 0 or q.shape[0] != self.matrix.shape[1]:
+            return []
+        scores = self.matrix @ (q / norm)
+
+        best: dict[str, float] = {}
+        for i in np.argsort(scores)[::-1]:
+            score = float(scores[i])
+            if score < threshold or len(best) >= top_k:
+                break
+            best.setdefault(self.topics[i], score)
+        return list(best.items())
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    """
+    Zapis przez plik tymczasowy o unikalnej nazwie w tym samym katalogu + os.replace:
+    równoległe wątki/procesy nie nadpisują sobie pliku tymczasowego, a czytelnik
+    widzi albo starą, albo nową wersję.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
 
 class KBService:
     """
     Prosty serwis FAQ z opcjonalnym wsparciem S3.
 
-    Przechowuje cache w pamięci (per proces Lambdy) dla zminimalizowania liczby odczytów z S3.
+    FAQ trzyma w cache procesu (FAQ_CACHE) z TTL, rewalidacją po ETagu
+    i osobnym, krótszym TTL dla brakujących plików.
     """
 
-    def __init__(self) -> None:
-        """Inicjalizuje serwis, zapisując konfigurację bucketa i pusty cache w pamięci."""
+    def __init__(
+        self,
+        embedder: OpenAIClient | None = None,
+        cache: TTLCache | None = None,
+        ttl_seconds: int = KB_CACHE_TTL_SECONDS,
+        negative_ttl_seconds: int = KB_CACHE_NEGATIVE_TTL_SECONDS,
+        now_fn: Optional[Callable[[], float]] = None,
+        bundle_dir: str = KB_BUNDLE_DIR,
+        use_bundles: bool = KB_BUNDLES_ENABLED,
+    ) -> None:
+        """Inicjalizuje serwis: konfiguracja bucketa + cache współdzielone w procesie."""
         self.bucket: str = settings.kb_bucket
-        # cache: { "tenant/lang": {topic: answer} }
-        self._cache: Dict[str, Dict[str, str]] = {}       
-    
-    def _faq_key(self, tenant_id: str, language_code: str | None) -> str:
-        # np. "tenantA/faq_pl.json" albo "tenantA/faq_en.json"
+        self.cache = cache if cache is not None else FAQ_CACHE
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._now_fn = now_fn or time.monotonic
+        self._embedder = embedder
+        self.index_cache = FAQ_INDEX_CACHE
+        self.embedding_cache = FAQ_EMBEDDING_CACHE
+        self.bundle_dir = bundle_dir
+        self.use_bundles = use_bundles
+
+    @property
+    def embedder(self) -> OpenAIClient:
+        if self._embedder is None:
+            self._embedder = OpenAIClient()
+        return self._embedder
+
+    def _lang(self, language_code: str | None) -> str:
+        if language_code == BUNDLE_LANG:
+            return BUNDLE_LANG
         lang = language_code or "en"
         if "-" in lang:
             lang = lang.split("-", 1)[0]
-        return f"{tenant_id}/faq_{lang}.json"
+        return lang
+
+    def _cache_key(self, tenant_id: str, language_code: str | None) -> tuple[str, str]:
+        """Jeden klucz dla FAQ i indeksu – ten sam język co w nazwie pliku w S3."""
+        return (tenant_id, self._lang(language_code))
+
+    def _faq_key(self, tenant_id: str, language_code: str | None) -> str:
+        # np. "tenantA/faq_pl.json" albo "tenantA/faq_en.json"
+        return f"{tenant_id}/faq_{self._lang(language_code)}.json"
+
+    def _index_keys(self, tenant_id: str, language_code: str | None) -> tuple[str, str]:
+        # np. "tenantA/faq_pl.emb.npy" + "tenantA/faq_pl.emb.json"
+        base = f"{tenant_id}/faq_{self._lang(language_code)}.emb"
+        return f"{base}.npy", f"{base}.json"
+
+    def _remember(self, cache_key, data, etag: str | None) -> None:
+        ttl = self.ttl_seconds if data is not None else self.negative_ttl_seconds
+        entry = {"data": data, "etag": etag, "fresh_until": self._now_fn() + ttl}
+        # brak pliku nie ma ETagu – wpis negatywny po prostu wygasa
+        self.cache.set(cache_key, entry, ttl_seconds=None if data is not None else ttl)
+
+    def _cached_s3_object(
+        self,
+        cache_key,
+        key: str,
+        tenant_id: str,
+        parse: Callable[[bytes, Optional[str]], Any],
+        local_copy: Optional[Callable[[], Optional[tuple[Any, str]]]] = None,
+    ):
+        """
+        Wspólna ścieżka cache dla obiektów z S3 (FAQ JSON, bundle).
+
+        Świeży wpis zwracamy od razu; nieświeży rewalidujemy warunkowym GET
+        z zapisanym ETagiem (304 = bez transferu treści). local_copy pozwala
+        podać kopię z dysku (data, etag), gdy wpisu nie ma już w pamięci.
+        """
+        entry = self.cache.get(cache_key)
+        if entry is not MISSING and self._now_fn() < entry["fresh_until"]:
+            return entry["data"]
+        if entry is MISSING and local_copy is not None:
+            local = local_copy()
+            if local is not None:
+                entry = {"data": local[0], "etag": local[1], "fresh_until": 0}
+
+        etag = entry["etag"] if entry is not MISSING else None
+        params = {"Bucket": self.bucket, "Key": key}
+        if etag:
+            params["IfNoneMatch"] = etag
+
+        try:
+            resp = s3_client().get_object(**params)
+        except ClientError as e:
+            code = str(e.response.get("Error", {}).get("Code"))
+            if code in ("304", "NotModified"):
+                # plik się nie zmienił – przedłużamy ważność bez pobierania treści
+                self._remember(cache_key, entry["data"], etag)
+                return entry["data"]
+            if code not in ("NoSuchKey", "404"):
+                logger.warning(
+                    {"kb_error": "s3_get_failed", "tenant_id": tenant_id, "key": key, "err": str(e)}
+                )
+                if entry is not MISSING and entry["data"] is not None:
+                    # chwilowy błąd S3 – serwujemy ostatnią znaną wersję
+                    self.cache.set(
+                        cache_key,
+                        {**entry, "fresh_until": self._now_fn() + self.negative_ttl_seconds},
+                    )
+                    return entry["data"]
+            self._remember(cache_key, None, None)
+            self._close_replaced(entry, None)
+            return None
+
+        new_etag = resp.get("ETag")
+        data = parse(resp["Body"].read(), new_etag)
+        self._remember(cache_key, data, new_etag if data is not None else None)
+        self._close_replaced(entry, data)
+        return data
+
+    @staticmethod
+    def _close_replaced(entry, data) -> None:
+        """Zamyka poprzednią wersję z cache (mmap bundla), gdy została zastąpiona."""
+        old = entry["data"] if entry is not MISSING else None
+        if old is not None and old is not data and isinstance(old, KbBundle):
+            old.close()
 
-    def _cache_key(self, tenant_id: str, language_code: str | None) -> str:
-        return f"{tenant_id}/{language_code or 'default'}"
-        
     def _load_tenant_faq(self, tenant_id: str, language_code: str | None) -> Optional[Dict[str, str]]:
         """
         Ładuje FAQ dla podanego tenanta z S3 (jeśli skonfigurowano bucket).
@@ -51,36 +267,157 @@ class KBService:
         if not self.bucket:
             return None
 
-        cache_key = f"{tenant_id}#{language_code or 'en'}"
-        if cache_key in self._cache:
-            return self._cache[cache_key]
-
         key = self._faq_key(tenant_id, language_code)
 
-        try:
-            resp = s3_client().get_object(Bucket=self.bucket, Key=key)
-            body = resp["Body"].read().decode("utf-8")
-            data = json.loads(body) or {}
+        def parse(raw: bytes, etag: Optional[str]) -> Dict[str, str]:
+            try:
+                data = json.loads(raw.decode("utf-8")) or {}
+            except ValueError as e:
+                logger.warning({"kb_error": "bad_json", "tenant_id": tenant_id, "key": key, "err": str(e)})
+                data = {}
             if not isinstance(data, dict):
                 data = {}
-            # normalizujemy klucze
-            normalized = { (k or "").strip().lower(): v for k, v in data.items() }
-            self._cache[cache_key] = normalized
-            return normalized
+            # normalizujemy klucze; warianty pytań są potrzebne tylko builderowi indeksu
+            return {(k or "").strip().lower(): faq_answer(v) for k, v in data.items()}
+
+        return self._cached_s3_object(self._cache_key(tenant_id, language_code), key, tenant_id, parse)
+
+    def _bundle_paths(self, tenant_id: str) -> tuple[str, str]:
+        base = os.path.join(self.bundle_dir, tenant_id.replace("/", "_"))
+        return f"{base}.bin", f"{base}.etag"
+
+    def _load_bundle(self, tenant_id: str) -> Optional[KbBundle]:
+        """
+        Bundle KB tenanta (wszystkie języki) zmapowany do pamięci z /tmp.
+
+        Ciepły kontener nie pobiera go ponownie: po TTL rewalidujemy ETag,
+        a gdy wpis wypadnie z pamięci, korzystamy z pliku w /tmp + zapisanego ETagu.
+        """
+        if not self.bucket or not self.use_bundles:
+            return None
+
+        bin_path, etag_path = self._bundle_paths(tenant_id)
+
+        def local_copy() -> Optional[tuple[KbBundle, str]]:
+            try:
+                with open(etag_path, encoding="utf-8") as f:
+                    etag = f.read().strip()
+                return KbBundle.open(bin_path), etag
+            except (OSError, ValueError):
+                return None
+
+        def parse(raw: bytes, etag: Optional[str]) -> Optional[KbBundle]:
+            try:
+                KbBundle(raw)  # walidacja nagłówka przed zapisem na dysk
+                os.makedirs(self.bundle_dir, exist_ok=True)
+                _atomic_write(bin_path, raw)
+                _atomic_write(etag_path, (etag or "").encode("utf-8"))
+                return KbBundle.open(bin_path)
+            except (OSError, ValueError) as e:
+                logger.warning({"kb_error": "bundle_load_failed", "tenant_id": tenant_id, "err": str(e)})
+                return None
+
+        return self._cached_s3_object(
+            self._cache_key(tenant_id, BUNDLE_LANG),
+            f"{tenant_id}/{KB_BUNDLE_NAME}",
+            tenant_id,
+            parse,
+            local_copy=local_copy,
+        )
+
+    def _load_index(self, tenant_id: str, language_code: str | None) -> Optional[FaqIndex]:
+        """Ładuje (raz na TTL) indeks embeddingów tenanta; None, jeśli go nie ma."""
+        if np is None or not self.bucket:
+            return None
+
+        cache_key = self._cache_key(tenant_id, language_code)
+        cached = self.index_cache.get(cache_key)
+        if cached is not MISSING:
+            return cached
+
+        npy_key, meta_key = self._index_keys(tenant_id, language_code)
+        try:
+            s3 = s3_client()
+            meta = json.loads(s3.get_object(Bucket=self.bucket, Key=meta_key)["Body"].read())
+            raw = s3.get_object(Bucket=self.bucket, Key=npy_key)["Body"].read()
+            matrix = np.load(io.BytesIO(raw), allow_pickle=False)
         except ClientError as e:
-            if e.response["Error"]["Code"] != "NoSuchKey":
+            if e.response["Error"]["Code"] == "NoSuchKey":
+                # tenant nie ma indeksu – pamiętamy to krócej, żeby nowy indeks szybko zadziałał
+                self.index_cache.set(cache_key, None, ttl_seconds=self.negative_ttl_seconds)
+            else:
                 logger.warning(
-                    {"kb_error": "s3_get_failed", "tenant_id": tenant_id, "key": key, "err": str(e)}
+                    {"kb_error": "s3_get_failed", "tenant_id": tenant_id, "key": meta_key, "err": str(e)}
                 )
-            self._cache[cache_key] = None
             return None
+        except ValueError as e:
+            logger.warning({"kb_error": "index_load_failed", "tenant_id": tenant_id, "err": str(e)})
+            return None
+
+        topics = [str(t).strip().lower() for t in meta.get("topics") or []]
+        if matrix.ndim != 2 or matrix.shape[0] != len(topics):
+            logger.warning({"kb_error": "index_shape_mismatch", "tenant_id": tenant_id, "key": npy_key})
+            return None
+
+        index = FaqIndex(matrix, topics, meta.get("model") or self.embedder.embedding_model)
+        self.index_cache.set(cache_key, index)
+        return index
+
+    def _embed(self, text: str, model: str) -> Optional[list[float]]:
+        """Embedding tekstu z cache procesu; None, jeśli nie udało się go policzyć."""
+        cache_key = (model, normalize_text(text))
+        cached = self.embedding_cache.get(cache_key)
+        if cached is not MISSING:
+            return cached
+        vectors = self.embedder.embed([text], model=model)
+        if not vectors:
+            return None
+        self.embedding_cache.set(cache_key, vectors[0])
+        return vectors[0]
+
+    def search(
+        self,
+        text: str,
+        tenant_id: str,
+        language_code: str | None = None,
+        top_k: int = KB_SEMANTIC_TOP_K,
+        threshold: float = KB_SEMANTIC_THRESHOLD,
+    ) -> list[tuple[str, float]]:
+        """
+        Semantyczne wyszukiwanie tematów FAQ dla dowolnego tekstu.
+
+        Zwraca [(topic, score)] malejąco (cosinus >= threshold); pustą listę,
+        gdy tenant nie ma indeksu, brak NumPy albo nie udało się policzyć embeddingu.
+        """
+        if not (text or "").strip():
+            return []
+        index = self._load_index(tenant_id, language_code)
+        if index is None:
+            return []
+        vector = self._embed(text, index.model)
+        if vector is None:
+            return []
+        return index.search(vector, top_k=top_k, threshold=threshold)
+
+    def _bundle_answer(self, tenant_id: str, lang: str, topic: str) -> tuple[bool, Optional[str]]:
+        """(bundle ma język, odpowiedź) – (False, None), gdy nie ma bundla albo języka."""
+        for _ in range(2):
+            bundle = self._load_bundle(tenant_id)
+            if bundle is None or not bundle.has_language(lang):
+                return False, None
+            try:
+                return True, bundle.get(lang, topic)
+            except ValueError:
+                # inny wątek podmienił bundle i zamknął stare mapowanie w trakcie odczytu
+                continue
+        return False, None
 
     def answer(self, topic: str, tenant_id: str, language_code: str | None = None) -> Optional[str]:
         """
         Zwraca odpowiedź FAQ dla danego tematu i tenanta.
 
         Kolejność źródeł:
-          1. FAQ z S3 (jeśli skonfigurowano i plik istnieje),
+          1. FAQ z S3: bundle tenanta (jeśli zawiera dany język), inaczej faq_<lang>.json,
           2. domyślne DEFAULT_FAQ,
           3. None, jeśli odpowiedź nie została znaleziona.
         """
@@ -88,9 +425,34 @@ class KBService:
         if not topic:
             return None
 
-        tenant_faq = self._load_tenant_faq(tenant_id, language_code)
-        if tenant_faq and topic in tenant_faq:
-            return tenant_faq[topic]
+        in_bundle, answer = self._bundle_answer(tenant_id, self._lang(language_code), topic)
+        if in_bundle:
+            # bundle zawiera komplet FAQ dla języka – nie sięgamy po faq_<lang>.json
+            if answer is not None:
+                return answer
+        else:
+            tenant_faq = self._load_tenant_faq(tenant_id, language_code)
+            if tenant_faq and topic in tenant_faq:
+                return tenant_faq[topic]
 
         # fallback na domyślne (na razie bez wariantów językowych)
-        return DEFAULT_FAQ.get(topic)
\ No newline at end of file
+        return DEFAULT_FAQ.get(topic)
+
+
+class FaqRetrievalStage:
+    """
+    Pre-klasyfikator dla NLUService: jeśli tekst jest semantycznie bliski
+    któremuś pytaniu z FAQ tenanta, zwraca intent "faq" z tym tematem
+    bez wywołania LLM. Bez indeksu dla tenanta/języka nic nie robi.
+    """
+
+    def __init__(self, kb: KBService | None = None, threshold: float = KB_SEMANTIC_THRESHOLD) -> None:
+        self.kb = kb or KBService()
+        self.threshold = threshold
+
+    def classify(self, text: str, lang: str | None, tenant_id: str = "default") -> Optional[dict]:
+        hits = self.kb.search(text, tenant_id, lang, top_k=1, threshold=self.threshold)
+        if not hits:
+            return None
+        topic, score = hits[0]
+        return {"intent": "faq", "confidence": round(score, 4), "slots": {"topic": topic}}
@@ -1,8 +1,123 @@
-from ..adapters.openai_client import OpenAIClient
+import hashlib
+import os
+
+from ..adapters.openai_client import OpenAIClient, PROMPT_VERSION
+from ..common.cache import TTLCache, MISSING
+from ..common.logging import logger
+from ..common.utils import normalize_text
+from ..repos.nlu_cache_repo import NluCacheRepo
+from .intent_rules_service import IntentRulesService
+from .kb_service import FaqRetrievalStage
+from .metrics_service import MetricsService
+
+# Wiele wiadomości powtarza się niemal 1:1 ("cennik", "godziny otwarcia", "ok"),
+# a każda klasyfikacja to pełny round-trip do LLM. Wyniki trzymamy w cache
+# per proces, a opcjonalnie także w DynamoDB (DDB_TABLE_NLU_CACHE).
+NLU_CACHE = TTLCache(
+    maxsize=int(os.getenv("NLU_CACHE_MAX_ITEMS", "2048")),
+    ttl_seconds=int(os.getenv("NLU_CACHE_TTL_SECONDS", "3600")),
+)
+
+
+# Sloty o wartościach z zamkniętego słownika (faq.topic: hours/price/...) –
+# nie zależą od danych użytkownika, więc wynik z nimi można cache'ować.
+NLU_CACHEABLE_SLOTS = frozenset({"topic"})
+
+
+def _is_cacheable(result) -> bool:
+    """
+    Nie cache'ujemy fallbacków (brak klucza, błąd/limit API, nieczytelna odpowiedź) –
+    wszystkie kończą się intencją "clarify", więc ją pomijamy w całości.
+
+    Nie cache'ujemy też wyników ze slotami spoza NLU_CACHEABLE_SLOTS (e-mail,
+    member_id, opis zgłoszenia...): klucz jest liczony z tekstu po normalizacji
+    (bez interpunkcji), więc dwa różne adresy mogłyby dostać ten sam wpis,
+    a takie dane nie powinny trafiać do współdzielonego cache w DynamoDB.
+    """
+    if not isinstance(result, dict) or result.get("intent") in (None, "clarify"):
+        return False
+    return set(result.get("slots") or {}) <= NLU_CACHEABLE_SLOTS
+
 
 class NLUService:
-    def __init__(self):
-        self.client = OpenAIClient()
+    def __init__(
+        self,
+        client: OpenAIClient | None = None,
+        cache: TTLCache | None = None,
+        shared_cache: NluCacheRepo | None = None,
+        metrics: MetricsService | None = None,
+        pre_classifiers: list | None = None,
+    ):
+        self.client = client or OpenAIClient()
+        self.cache = cache if cache is not None else NLU_CACHE
+        if shared_cache is None and os.getenv("DDB_TABLE_NLU_CACHE"):
+            shared_cache = NluCacheRepo()
+        self.shared_cache = shared_cache
+        self.metrics = metrics or MetricsService()
+        # Etapy przed LLM: obiekty z classify(text, lang, tenant_id) -> wynik NLU | None.
+        # Kolejność: reguły (bez I/O), potem semantyczne FAQ (embedding, tylko gdy tenant ma indeks;
+        # wektory są cache'owane per znormalizowany tekst w KBService).
+        if pre_classifiers is None:
+            pre_classifiers = []
+            if os.getenv("NLU_RULES_ENABLED", "true").lower() == "true":
+                pre_classifiers.append(IntentRulesService(metrics=self.metrics))
+            if os.getenv("NLU_FAQ_RETRIEVAL_ENABLED", "true").lower() == "true":
+                pre_classifiers.append(FaqRetrievalStage())
+        self.pre_classifiers = pre_classifiers
+
+    def _cache_key(self, normalized: str, lang: str) -> str:
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+        model = getattr(self.client, "model", "")
+        return f"nlu#{PROMPT_VERSION}#{model}#{lang}#{digest}"
+
+    def _pre_classify(self, text: str, lang: str, tenant_id: str) -> dict | None:
+        for stage in self.pre_classifiers:
+            try:
+                result = stage.classify(text, lang, tenant_id=tenant_id)
+            except Exception as e:
+                logger.warning(
+                    {"nlu": "pre_classifier_failed", "stage": type(stage).__name__, "err": str(e)}
+                )
+                continue
+            if result is not None:
+                return result
+        return None
+
+    def classify_intent(self, text: str, lang: str, tenant_id: str = "default"):
+        ruled = self._pre_classify(text, lang, tenant_id)
+        if ruled is not None:
+            return ruled
+
+        normalized = normalize_text(text)
+        if not normalized:
+            return self.client.classify(text, lang)
+
+        key = self._cache_key(normalized, lang)
+
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            self.metrics.incr("nlu_cache", result="hit", tier="memory")
+            return dict(cached)
+
+        if self.shared_cache is not None:
+            try:
+                shared = self.shared_cache.get(key)
+            except Exception as e:
+                logger.warning({"nlu_cache": "shared_get_failed", "err": str(e)})
+                shared = None
+            if shared is not None:
+                self.metrics.incr("nlu_cache", result="hit", tier="ddb")
+                self.cache.set(key, shared)
+                return dict(shared)
+
+        self.metrics.incr("nlu_cache", result="miss")
+        result = self.client.classify(text, lang)
 
-    def classify_intent(self, text: str, lang: str):
-        return self.client.classify(text, lang)
+        if _is_cacheable(result):
+            self.cache.set(key, result)
+            if self.shared_cache is not None:
+                try:
+                    self.shared_cache.put(key, result)
+                except Exception as e:
+                    logger.warning({"nlu_cache": "shared_put_failed", "err": str(e)})
+        return result
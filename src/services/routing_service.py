@@ -16,7 +16,8 @@ from ..services.nlu_service import NLUService
 from ..services.kb_service import KBService
 from ..services.template_service import TemplateService
 from ..adapters.perfectgym_client import PerfectGymClient
-from ..repos.conversations_repo import ConversationsRepo
+from ..services.schedule_service import ScheduleService
+from ..repos.conversations_repo import ConversationsRepo, ConversationSnapshot
 from ..repos.tenants_repo import TenantsRepo
 from ..repos.messages_repo import MessagesRepo
 from ..common.utils import new_id
@@ -45,17 +46,19 @@ class RoutingService:
         metrics: MetricsService | None = None,
         jira: JiraClient | None = None,
         members_index: MembersIndexRepo | None = None,
+        schedule: ScheduleService | None = None,
     ) -> None:
+        self.tenants = tenants or TenantsRepo()
         self.nlu = nlu or NLUService()
         self.kb = kb or KBService()
-        self.tpl = tpl or TemplateService()
+        self.tpl = tpl or TemplateService(tenants=self.tenants)
         self.pg = pg or PerfectGymClient()
         self.conv = conv or ConversationsRepo()
-        self.tenants = tenants or TenantsRepo()
         self.messages = messages or MessagesRepo()
         self.metrics = metrics or MetricsService()
         self.jira = jira or JiraClient()
         self.members_index = members_index or MembersIndexRepo()
+        self.schedule = schedule or ScheduleService(pg=self.pg, metrics=self.metrics)
         self._words_cache: dict[tuple[str, str, str], set[str]] = {}
 
     def _generate_verification_code(self, length: int = 6) -> str:
@@ -72,12 +75,6 @@ class RoutingService:
         phone = raw.replace("whatsapp:", "") if raw else ""
         return f"https://wa.me/{phone}?text=KOD:{code}"
 
-    def _pending_key(self, phone: str) -> str:
-        """
-        Buduje klucz pod którym trzymamy w DDB oczekującą rezerwację dla danego numeru telefonu.
-        """
-        return f"pending#{phone}"
-
     def _get_words_set(self, 
         tenant_id: str, 
         template_name: str, 
@@ -111,41 +108,23 @@ class RoutingService:
         self._words_cache[key] = words
         return words
 
-    def _resolve_and_persist_language(self, msg: Message) -> str:
-        channel = msg.channel or "whatsapp"
-        channel_user_id = msg.channel_user_id or msg.from_phone
-
+    def _resolve_and_persist_language(self, msg: Message, conv: ConversationSnapshot) -> str:
         # 0. Jeśli Message już ma język (np. z frontu WWW) – używamy tego
         if getattr(msg, "language_code", None):
             lang = msg.language_code
-            self.conv.upsert_conversation(
-                msg.tenant_id,
-                channel,
-                channel_user_id,
-                language_code=lang,
-                last_intent=None,
-                state_machine_status=None,
-            )
+            conv.set(language_code=lang)
             return lang
 
         # 1. Istniejąca rozmowa
-        existing = self.conv.get_conversation(msg.tenant_id, channel, channel_user_id)
-        if existing and existing.get("language_code"):
-            return existing["language_code"]
+        if conv.get("language_code"):
+            return conv.get("language_code")
 
         # 2. Tenant
         tenant = self.tenants.get(msg.tenant_id) or {}
         lang = tenant.get("language_code") or settings.get_default_language()
 
-        # 3. Zapis/aktualizacja rozmowy
-        self.conv.upsert_conversation(
-            msg.tenant_id,
-            channel,
-            channel_user_id,
-            language_code=lang,
-            last_intent=None,
-            state_machine_status=None,
-        )
+        # 3. Zapis/aktualizacja rozmowy (flush na końcu handle)
+        conv.set(language_code=lang)
         return lang
 
     def change_conversation_language(self, tenant_id: str, phone: str, new_lang: str) -> dict:
@@ -154,7 +133,7 @@ class RoutingService:
  
     # --- Helper: wspólna weryfikacja PG (WhatsApp + WWW) ---
     def _ensure_pg_verification(
-        self, msg: Message, conv: dict, lang: str
+        self, msg: Message, conv: ConversationSnapshot, lang: str
     ) -> Optional[List[Action]]:
         """
         Sprawdza, czy użytkownik ma ważną strong-verification dla PerfectGym.
@@ -182,10 +161,14 @@ class RoutingService:
             verification_code = self._generate_verification_code()
             wa_link = self._whatsapp_wa_me_link(verification_code)
 
-            self.conv.upsert_conversation(
+            self.conv.put_verification_code(
                 tenant_id=msg.tenant_id,
+                verification_code=verification_code,
                 channel=channel,
                 channel_user_id=channel_user_id,
+            )
+
+            conv.set(
                 verification_code=verification_code,
                 pg_member_id=None,
                 pg_verification_level="none",
@@ -217,10 +200,7 @@ class RoutingService:
             ]
 
         # 3) Kanał WhatsApp → flow challenge PG (np. DOB/email)
-        self.conv.upsert_conversation(
-            tenant_id=msg.tenant_id,
-            channel=channel,
-            channel_user_id=channel_user_id,
+        conv.set(
             state_machine_status=STATE_AWAITING_CHALLENGE,
             pg_challenge_type="dob",  # na razie domyślnie DOB
             pg_challenge_attempts=0,
@@ -247,15 +227,13 @@ class RoutingService:
         ]
         
 
-    def _handle_pg_challenge(self, msg: Message, conv: dict, lang: str) -> List[Action]:
+    def _handle_pg_challenge(self, msg: Message, conv: ConversationSnapshot, lang: str) -> List[Action]:
         """
         Użytkownik jest w stanie awaiting_challenge – traktujemy wiadomość
         jako odpowiedź na challenge PG (np. data urodzenia / e-mail).
         """
         text = (msg.body or "").strip()
         tenant_id = msg.tenant_id
-        channel = msg.channel or "whatsapp"
-        channel_user_id = msg.channel_user_id or msg.from_phone
 
         challenge_type = conv.get("pg_challenge_type") or "dob"
         attempts = int(conv.get("pg_challenge_attempts") or 0)
@@ -271,10 +249,7 @@ class RoutingService:
             member = self.members_index.get_member(tenant_id, msg.from_phone)
             member_id = member["id"] if member else None
 
-            self.conv.upsert_conversation(
-                tenant_id=tenant_id,
-                channel=channel,
-                channel_user_id=channel_user_id,
+            conv.set(
                 state_machine_status=None,
                 pg_member_id=member_id,
                 pg_verification_level="strong",
@@ -304,21 +279,11 @@ class RoutingService:
 
         # Zła odpowiedź – zwiększamy licznik prób
         attempts += 1
-        self.conv.upsert_conversation(
-            tenant_id=tenant_id,
-            channel=channel,
-            channel_user_id=channel_user_id,
-            pg_challenge_attempts=attempts,
-        )
+        conv.set(pg_challenge_attempts=attempts)
 
         if attempts >= 3:
             # Po 3 próbach – blokujemy i przekazujemy do człowieka
-            self.conv.upsert_conversation(
-                tenant_id=tenant_id,
-                channel=channel,
-                channel_user_id=channel_user_id,
-                state_machine_status=None,
-            )
+            conv.set(state_machine_status=None)
 
             body = self.tpl.render_named(
                 tenant_id,
@@ -372,17 +337,27 @@ class RoutingService:
         Przetwarza pojedynczą wiadomość biznesową i zwraca listę akcji do wykonania.
 
         Zwraca zwykle jedną akcję typu "reply", ale architektura pozwala na wiele akcji w przyszłości.
+
+        Rozmowa jest czytana z DDB raz (ConversationSnapshot), a wszystkie zmiany
+        stanu są zapisywane jednym update_item po obsłużeniu wiadomości.
         """
+        channel = msg.channel or "whatsapp"
+        channel_user_id = msg.channel_user_id or msg.from_phone
+        conv = ConversationSnapshot.load(self.conv, msg.tenant_id, channel, channel_user_id)
+        try:
+            return self._handle(msg, conv)
+        finally:
+            conv.flush()
+
+    def _handle(self, msg: Message, conv: ConversationSnapshot) -> List[Action]:
         text_raw = (msg.body or "").strip()
         text_lower = text_raw.lower()
+        channel = conv.channel
 
         # 1) Język
-        lang = self._resolve_and_persist_language(msg)
+        lang = self._resolve_and_persist_language(msg, conv)
 
-        # 2) Wczytaj rozmowę + stan maszyny
-        channel = msg.channel or "whatsapp"
-        channel_user_id = msg.channel_user_id or msg.from_phone
-        conv = self.conv.get_conversation(msg.tenant_id, channel, channel_user_id) or {}
+        # 2) Stan maszyny z rozmowy
         state = conv.get("state_machine_status")
      
         # --- 0. Obsługa stanu awaiting_challenge (challenge PG na WhatsApp) ---
@@ -391,7 +366,7 @@ class RoutingService:
 
         
         # --- 1. Obsługa oczekującej rezerwacji (TAK/NIE) ---
-        pending = self.conv.get(self._pending_key(msg.from_phone))
+        pending = self.conv.get_pending(msg.tenant_id, msg.from_phone)
         if pending:
             confirm_words = self._get_words_set(
                 msg.tenant_id,
@@ -413,7 +388,7 @@ class RoutingService:
                     class_id=class_id,
                     idempotency_key=idem,
                 )
-                self.conv.delete(self._pending_key(msg.from_phone))
+                self.conv.delete_pending(msg.tenant_id, msg.from_phone)
 
                 if (res or {}).get("ok", True):
                     body = self.tpl.render_named(
@@ -455,7 +430,7 @@ class RoutingService:
 
             if text_lower in decline_words:
                 # użytkownik odrzucił rezerwację
-                self.conv.delete(self._pending_key(msg.from_phone))
+                self.conv.delete_pending(msg.tenant_id, msg.from_phone)
                 body = self.tpl.render_named(
                     msg.tenant_id,
                     "reserve_class_declined",
@@ -544,6 +519,8 @@ class RoutingService:
                 verification_code=None,  # czyścimy kod
                 state_machine_status=None,
             )
+            # kod jest jednorazowy
+            self.conv.delete_verification_code(msg.tenant_id, code)
 
             body = self.tpl.render_named(
                 msg.tenant_id,
@@ -571,7 +548,7 @@ class RoutingService:
             slots = msg.slots or {}
             confidence = 1.0
         else:
-            nlu = self.nlu.classify_intent(msg.body, lang)
+            nlu = self.nlu.classify_intent(msg.body, lang, tenant_id=msg.tenant_id)
             
             # wynik NLU może być dict albo obiektem z atrybutami
             if isinstance(nlu, dict):
@@ -588,12 +565,9 @@ class RoutingService:
 
         
         # --- 3. Zapisz info o rozmowie (intent, stan, język) ---
-        self.conv.upsert_conversation(
-            tenant_id=msg.tenant_id,
-            channel=msg.channel or "whatsapp",
-            channel_user_id=msg.channel_user_id or msg.from_phone,
+        conv.set(
             last_intent=intent,
-             state_machine_status=(
+            state_machine_status=(
                 STATE_AWAITING_CONFIRMATION if intent == "reserve_class" else None
             ),
             language_code=lang,
@@ -628,13 +602,12 @@ class RoutingService:
             class_id = slots.get("class_id", "101")
             member_id = slots.get("member_id", "105")
             idem = new_id("idem-")
-            self.conv.put(
-                {
-                    "pk": self._pending_key(msg.from_phone),
-                    "class_id": class_id,
-                    "member_id": member_id,
-                    "idempotency_key": idem,
-                }
+            self.conv.put_pending(
+                msg.tenant_id,
+                msg.from_phone,
+                class_id=class_id,
+                member_id=member_id,
+                idempotency_key=idem,
             )
             body = self.tpl.render_named(
                 msg.tenant_id,
@@ -657,11 +630,9 @@ class RoutingService:
 
         # --- 6. Handover do człowieka ---
         if intent == "handover":
-            self.conv.assign_agent(
-                tenant_id=msg.tenant_id,
-                channel=msg.channel or "whatsapp",
-                channel_user_id=msg.channel_user_id or msg.from_phone,
-                agent_id=slots.get("agent_id", "UNKNOWN"),   # np. przekazane w slots
+            conv.set(
+                assigned_agent=slots.get("agent_id", "UNKNOWN"),   # np. przekazane w slots
+                state_machine_status="handover",
             )
             body = self.tpl.render_named(
                 msg.tenant_id,
@@ -773,10 +744,15 @@ class RoutingService:
         
         # --- 8. Lista dostępnych zajęć (PerfectGym) ---
         if intent == "pg_available_classes":
-            pg = PerfectGymClient()
-            # Na początek weźmy najbliższe 10 zajęć od teraz
-            classes_resp = pg.get_available_classes(top=10)
-            classes = classes_resp.get("value", []) or []
+            # Najbliższe 10 zajęć z cache'owanego grafiku (opcjonalnie klub / zakres dat ze slotów)
+            day = slots.get("date")
+            classes = self.schedule.list_classes(
+                msg.tenant_id,
+                club_id=slots.get("club_id"),
+                date_from=slots.get("date_from") or day,
+                date_to=slots.get("date_to") or day,
+                limit=10,
+            )
 
             if not classes:
                 body = self.tpl.render_named(
@@ -915,7 +891,7 @@ class RoutingService:
             if phone.startswith("whatsapp:"):
                 phone = phone.split(":", 1)[1]
 
-            pg = PerfectGymClient()
+            pg = self.pg
             contracts_resp = pg.get_contracts_by_email_and_phone(
                 email=email,
                 phone_number=phone,
@@ -1020,7 +996,7 @@ class RoutingService:
                     )
                 ]
 
-            pg = PerfectGymClient()
+            pg = self.pg
             balance_resp = pg.get_member_balance(member_id=member_id)
             balance = balance_resp.get("balance", 0)
 
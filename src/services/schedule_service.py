@@ -0,0 +1,301 @@
+"""
+Cache grafiku zajęć z PerfectGym.
+
+Każde pytanie "jakie są zajęcia?" kończyło się identycznym zapytaniem
+OData do /Classes. Teraz per (tenant, klub) trzymamy w pamięci procesu
+okno grafiku (od teraz do +SCHEDULE_WINDOW_DAYS dni) odświeżane na krótkim TTL:
+
+- równoległe missy na tym samym kluczu czekają na jedno wywołanie PG
+  (request coalescing),
+- liczniki miejsc (attendeesCount/attendeesLimit) odświeżamy częściej
+  i lekkim zapytaniem ($select), bez pobierania całego grafiku,
+- filtry dat i limit są liczone w pamięci z zcache'owanego okna.
+
+Przy SCHEDULE_SOURCE=ddb okno czytamy z tabeli ClassSchedule (wypełnianej
+przez job schedule_sync), a do PG idziemy tylko wtedy, gdy tenant nie ma
+świeżej synchronizacji albo DynamoDB jest niedostępne.
+"""
+
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Optional
+
+import requests
+from botocore.exceptions import BotoCoreError, ClientError
+
+from ..adapters.perfectgym_client import PerfectGymClient
+from ..common.cache import TTLCache, MISSING
+from ..common.logging import logger
+from ..repos.class_schedule_repo import ClassScheduleRepo
+from .metrics_service import MetricsService
+
+# (tenant_id, club_id) -> okno grafiku (patrz ScheduleService._fetch_window)
+SCHEDULE_CACHE = TTLCache(
+    maxsize=int(os.getenv("SCHEDULE_CACHE_MAX_ITEMS", "256")),
+    ttl_seconds=int(os.getenv("SCHEDULE_CACHE_TTL_SECONDS", "300")),
+)
+SCHEDULE_WINDOW_DAYS = int(os.getenv("SCHEDULE_WINDOW_DAYS", "7"))
+SCHEDULE_SPOTS_TTL_SECONDS = int(os.getenv("SCHEDULE_SPOTS_TTL_SECONDS", "30"))
+# pusta albo niepełna lista (błąd PG, także w trakcie stronicowania) – krótki TTL
+SCHEDULE_EMPTY_TTL_SECONDS = int(os.getenv("SCHEDULE_EMPTY_TTL_SECONDS", "30"))
+
+# "pg" – okno prosto z PerfectGym, "ddb" – z tabeli ClassSchedule (fallback do PG)
+SCHEDULE_SOURCE = os.getenv("SCHEDULE_SOURCE", "pg")
+# starsza synchronizacja = job nie działa, wracamy do PG
+SCHEDULE_SYNC_MAX_AGE_SECONDS = int(os.getenv("SCHEDULE_SYNC_MAX_AGE_SECONDS", "3600"))
+
+SPOT_FIELDS = ["id", "attendeesCount", "attendeesLimit"]
+
+_KEY_LOCKS: dict[tuple, threading.Lock] = {}
+_KEY_LOCKS_GUARD = threading.Lock()
+
+
+def _key_lock(key: tuple) -> threading.Lock:
+    with _KEY_LOCKS_GUARD:
+        return _KEY_LOCKS.setdefault(key, threading.Lock())
+
+
+def class_start(c: dict) -> Optional[datetime]:
+    """Początek zajęć jako datetime z tz (naiwne traktujemy jako UTC)."""
+    raw = str(c.get("startDate") or c.get("startdate") or "")
+    if not raw:
+        return None
+    try:
+        dt = datetime.fromisoformat(raw)
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _as_day(value: Any) -> Optional[str]:
+    """date / datetime / "YYYY-MM-DD..." -> "YYYY-MM-DD" (porównujemy z datą lokalną zajęć)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    return str(value)[:10]
+
+
+def _class_id(c: dict) -> Any:
+    return c.get("id", c.get("Id"))
+
+
+class ScheduleService:
+    """
+    Grafik zajęć tenanta serwowany z cache procesu.
+    list_classes() jest jedynym wejściem dla routera.
+    """
+
+    def __init__(
+        self,
+        pg: PerfectGymClient | None = None,
+        cache: TTLCache | None = None,
+        metrics: MetricsService | None = None,
+        ttl_seconds: float = SCHEDULE_CACHE.ttl_seconds,
+        spots_ttl_seconds: float = SCHEDULE_SPOTS_TTL_SECONDS,
+        empty_ttl_seconds: float = SCHEDULE_EMPTY_TTL_SECONDS,
+        window_days: int = SCHEDULE_WINDOW_DAYS,
+        now_fn: Optional[Callable[[], float]] = None,
+        utcnow_fn: Optional[Callable[[], datetime]] = None,
+        repo: ClassScheduleRepo | None = None,
+        source: str = SCHEDULE_SOURCE,
+        sync_max_age_seconds: float = SCHEDULE_SYNC_MAX_AGE_SECONDS,
+    ) -> None:
+        self.pg = pg or PerfectGymClient()
+        if repo is None and source == "ddb":
+            repo = ClassScheduleRepo()
+        self.repo = repo
+        self.sync_max_age_seconds = sync_max_age_seconds
+        self.cache = cache if cache is not None else SCHEDULE_CACHE
+        self.metrics = metrics or MetricsService()
+        self.ttl_seconds = ttl_seconds
+        self.spots_ttl_seconds = spots_ttl_seconds
+        self.empty_ttl_seconds = empty_ttl_seconds
+        self.window_days = window_days
+        self._now_fn = now_fn or time.monotonic
+        self._utcnow_fn = utcnow_fn or (lambda: datetime.now(timezone.utc))
+
+    @staticmethod
+    def _cache_key(tenant_id: str, club_id: Any) -> tuple:
+        return (tenant_id, str(club_id) if club_id not in (None, "") else "*")
+
+    def _fetch_window_from_repo(self, tenant_id: str, club_id: Any) -> Optional[dict]:
+        """Okno z tabeli ClassSchedule albo None, gdy trzeba iść do PG."""
+        try:
+            state = self.repo.get_sync_state(tenant_id)
+            if not state or time.time() - int(state.get("synced_at", 0)) > self.sync_max_age_seconds:
+                self.metrics.incr("pg_schedule_sync_stale", tenant_id=tenant_id)
+                return None
+            synced_at = datetime.fromtimestamp(int(state["synced_at"]), timezone.utc)
+            until = min(
+                datetime.fromisoformat(state["until"]),
+                self._utcnow_fn() + timedelta(days=self.window_days),
+            )
+            classes = self.repo.query_classes(
+                tenant_id,
+                self._utcnow_fn().date().isoformat(),
+                until.date().isoformat(),
+                club_id=club_id,
+            )
+        except (BotoCoreError, ClientError, KeyError, ValueError) as e:
+            logger.warning({"schedule": "repo_read_failed", "tenant_id": tenant_id, "err": str(e)})
+            return None
+        return {
+            "classes": classes,
+            "fetched_at": synced_at,
+            "until": until,
+            "spots_at": self._now_fn(),
+            "source": "ddb",
+        }
+
+    def _pg_classes(
+        self,
+        tenant_id: str,
+        club_id: Any,
+        from_dt: datetime,
+        to_dt: datetime,
+        fields: list[str] | None = None,
+    ) -> tuple[list[dict], bool]:
+        """
+        Wszystkie strony /Classes z zakresu (@odata.nextLink).
+        Zwraca (zajęcia, komplet); przy błędzie PG – to, co zdążyliśmy pobrać, i False.
+        """
+        classes: list[dict] = []
+        try:
+            for c in self.pg.iter_available_classes(
+                from_iso=from_dt.replace(tzinfo=None),
+                to_iso=to_dt.replace(tzinfo=None),
+                club_id=club_id if club_id not in (None, "") else None,
+                fields=fields,
+            ):
+                classes.append(c)
+        except (requests.RequestException, ValueError) as e:
+            logger.warning({"schedule": "pg_fetch_failed", "tenant_id": tenant_id, "club_id": club_id,
+                            "fetched": len(classes), "err": str(e)})
+            return classes, False
+        return classes, True
+
+    def _fetch_window(self, tenant_id: str, club_id: Any) -> dict:
+        if self.repo is not None:
+            window = self._fetch_window_from_repo(tenant_id, club_id)
+            if window is not None:
+                return window
+        fetched_at = self._utcnow_fn()
+        until = fetched_at + timedelta(days=self.window_days)
+        classes, complete = self._pg_classes(tenant_id, club_id, fetched_at, until)
+        return {
+            "classes": classes,
+            "fetched_at": fetched_at,
+            "until": until,
+            "spots_at": self._now_fn(),
+            "source": "pg",
+            "complete": complete,
+        }
+
+    def _load_spots(self, tenant_id: str, club_id: Any, window: dict) -> list[dict]:
+        if window.get("source") == "ddb":
+            try:
+                return self.repo.query_classes(
+                    tenant_id,
+                    self._utcnow_fn().date().isoformat(),
+                    window["until"].date().isoformat(),
+                    club_id=club_id,
+                )
+            except (BotoCoreError, ClientError) as e:
+                logger.warning({"schedule": "repo_read_failed", "tenant_id": tenant_id, "err": str(e)})
+                return []
+        spots, _ = self._pg_classes(tenant_id, club_id, self._utcnow_fn(), window["until"], fields=SPOT_FIELDS)
+        return spots
+
+    def _refresh_spots(self, key: tuple, club_id: Any, window: dict) -> dict:
+        """
+        Odświeża tylko liczniki miejsc. Jeśli inny wątek właśnie odświeża
+        ten klucz, oddajemy bieżące dane zamiast czekać.
+        """
+        lock = _key_lock(key)
+        if not lock.acquire(blocking=False):
+            return window
+        try:
+            if self._now_fn() - window["spots_at"] < self.spots_ttl_seconds:
+                return window
+            spots = {
+                _class_id(s): s for s in self._load_spots(key[0], club_id, window) if _class_id(s) is not None
+            }
+            if spots:
+                # kopia przy zapisie – inne wątki mogą właśnie iterować po starej liście
+                classes = []
+                for c in window["classes"]:
+                    s = spots.get(_class_id(c))
+                    if s is not None:
+                        c = {**c, **{f: s[f] for f in ("attendeesCount", "attendeesLimit") if f in s}}
+                    classes.append(c)
+                window["classes"] = classes
+            window["spots_at"] = self._now_fn()
+            self.metrics.incr("pg_schedule_spots", tenant_id=key[0], updated=len(spots))
+            return window
+        finally:
+            lock.release()
+
+    def get_window(self, tenant_id: str, club_id: Any = None) -> dict:
+        key = self._cache_key(tenant_id, club_id)
+        window = self.cache.get(key)
+        if window is not MISSING:
+            self.metrics.incr("pg_schedule_cache", result="hit", tenant_id=tenant_id)
+            if self._now_fn() - window["spots_at"] >= self.spots_ttl_seconds:
+                window = self._refresh_spots(key, club_id, window)
+            return window
+
+        with _key_lock(key):
+            window = self.cache.get(key)
+            if window is not MISSING:
+                # ktoś pobrał grafik, gdy czekaliśmy na lock
+                self.metrics.incr("pg_schedule_cache", result="coalesced", tenant_id=tenant_id)
+                return window
+            window = self._fetch_window(tenant_id, club_id)
+            # pusta albo niepełna (błąd PG w trakcie stronicowania) lista – krótki TTL
+            complete = window["classes"] and window.get("complete", True)
+            ttl = self.ttl_seconds if complete else self.empty_ttl_seconds
+            self.cache.set(key, window, ttl_seconds=ttl)
+        self.metrics.incr("pg_schedule_cache", result="miss", tenant_id=tenant_id)
+        logger.info({"schedule": "window_loaded", "tenant_id": tenant_id, "club_id": key[1],
+                     "source": window["source"], "classes": len(window["classes"])})
+        return window
+
+    def list_classes(
+        self,
+        tenant_id: str,
+        club_id: Any = None,
+        date_from: Any = None,
+        date_to: Any = None,
+        limit: Optional[int] = 10,
+    ) -> list[dict]:
+        """
+        Najbliższe zajęcia z okna grafiku, opcjonalnie w zakresie dat
+        (włącznie, po dacie lokalnej zajęć). Zakres wykraczający poza okno
+        jest obcinany do tego, co mamy w cache.
+        """
+        window = self.get_window(tenant_id, club_id)
+        now = self._utcnow_fn()
+        day_from, day_to = _as_day(date_from), _as_day(date_to)
+
+        out: list[dict] = []
+        for c in window["classes"]:
+            start = class_start(c)
+            # zajęcia, które rozpoczęły się od czasu pobrania okna
+            if start is not None and window["fetched_at"] < start <= now:
+                continue
+            day = _as_day(c.get("startDate") or c.get("startdate"))
+            if day_from and (not day or day < day_from):
+                continue
+            if day_to and (not day or day > day_to):
+                continue
+            out.append(c)
+            if limit is not None and len(out) >= limit:
+                break
+        return out
+
+    def invalidate(self, tenant_id: str, club_id: Any = None) -> None:
+        """Np. po rezerwacji – następne zapytanie pobierze świeży grafik."""
+        self.cache.invalidate(self._cache_key(tenant_id, club_id))
@@ -1,27 +1,79 @@
 # src/services/spam_service.py
 import os
+import random
 import time
 import datetime
 from typing import Optional
 
-from ..common.aws import ddb_resource
+from botocore.exceptions import ClientError
+
+from ..common.aws import ddb_table
+from ..common.cache import TTLCache, MISSING
 from ..common.logging import logger
+from ..repos.tenants_repo import TenantsRepo
 
 
 TABLE_NAME = os.getenv("DDB_TABLE_INTENTS_STATS", "IntentsStats")
 
+TOTAL_SK = "__TOTAL__"
+
+# Licznik tenanta jest rozbity na N kluczy (sk = "__TOTAL__#<shard>"), żeby jedna
+# gorąca pozycja nie była throttlowana przy burzy odpowiedzi na kampanię.
+# Limity shardów sumują się dokładnie do limitu tenanta (limit // N, pierwsze
+# limit % N shardów o jeden więcej), a N jest obcinane do limitu (każdy shard >= 1).
+# Pełny wylosowany shard nie kończy sprawy: jeśli suma shardów jest poniżej
+# limitu, wiadomość trafia do shardu, który ma jeszcze miejsce.
+SPAM_TENANT_SHARDS = int(os.getenv("SPAM_TENANT_SHARDS", "8"))
+
+# Każda pozycja dostaje expires_at – stare liczniki i blokady usuwa TTL DynamoDB.
+SPAM_STATS_MAX_AGE_SECONDS = int(os.getenv("SPAM_STATS_MAX_AGE_SECONDS", "86400"))
+
+# Stan lokalny (per kontener): token buckety numerów i znane blokady
+#   ("bucket", tenant_id, phone)      -> [tokens, last_ts]
+#   ("blocked", tenant_id, phone|__TOTAL__) -> blocked_until
+SPAM_LOCAL_STATE = TTLCache(
+    maxsize=int(os.getenv("SPAM_LOCAL_MAX_KEYS", "10000")),
+    ttl_seconds=int(os.getenv("SPAM_LOCAL_STATE_TTL_SECONDS", "3600")),
+)
+
+# Tryb limitera (domyślny; per tenant: Tenants.spam_limiter.mode):
+#   "ddb"    – zawsze liczniki w DDB (lokalnie tylko cache znanych blokad),
+#   "hybrid" – lokalny token bucket odrzuca oczywisty flood bez DDB, resztę liczy DDB,
+#   "local"  – tylko lokalny token bucket (przybliżony limit, zero zapisów do DDB).
+SPAM_LIMITER_MODES = ("ddb", "hybrid", "local")
+SPAM_LIMITER_MODE = os.getenv("SPAM_LIMITER_MODE", "hybrid")
+# W trybie hybrid DDB jest pomijane, dopóki lokalne zużycie bucketa nie przekroczy
+# tej części limitu (0 = zawsze DDB). Przy N kontenerach numer może wysłać
+# maks. ok. N × ratio × limit wiadomości, zanim DDB je policzy.
+SPAM_LOCAL_DDB_RATIO = float(os.getenv("SPAM_LOCAL_DDB_RATIO", "0"))
+
 
 class SpamService:
     """
-    Bardzo prosty rate limiter per tenant+numer telefonu.
+    Rate limiter per tenant+numer telefonu (okno stałe o długości bucket_seconds).
 
     Założenia:
-    - bucket czasowy = 1 minuta (lub tyle, ile ustawisz w SPAM_BUCKET_SECONDS),
-    - limit wiadomości w buckecie = SPAM_MAX_PER_BUCKET (domyślnie 20),
+    - okno = SPAM_BUCKET_SECONDS (domyślnie 60 s), wyrównane do epoki,
+    - limit wiadomości w oknie = SPAM_MAX_PER_BUCKET (domyślnie 20) per numer
+      i SPAM_TENANT_MAX_PER_BUCKET per tenant,
+    - po przekroczeniu limitu numer jest blokowany na bucket_seconds
+      (blokada nie zależy od okna, więc przechodzi na kolejne okna),
     - dane trzymane w DDB w tabeli IntentsStats:
-        pk = "{tenant_id}#{bucket}"
-        sk = "{phone}"
-        attrs: cnt, last_ts, blocked_until
+        licznik numeru : pk = "{tenant_id}#{bucket}", sk = "{phone}",     attrs: cnt, last_ts, expires_at
+        licznik tenanta: pk = "{tenant_id}#{bucket}", sk = "__TOTAL__#{shard}", attrs: cnt, last_ts, expires_at
+        blokada        : pk = "{tenant_id}#blocked",  sk = "{phone}",     attrs: blocked_until, expires_at
+      expires_at = ostatni zapis + SPAM_STATS_MAX_AGE_SECONDS (TTL tabeli).
+
+    Dozwolona wiadomość to jedno TransactWriteItems (oba liczniki + sprawdzenie
+    blokady) – limity są sprawdzane w warunkach zapisu, więc nie ma odczytu
+    przed zapisem. Odrzucona wiadomość nie podbija liczników. Dopiero pełny
+    shard licznika tenanta kosztuje BatchGetItem (suma shardów) i ewentualnie
+    ponowienie transakcji na shardzie z wolnym miejscem.
+
+    Przed DDB stoi stan lokalny kontenera (SPAM_LOCAL_STATE): znane blokady
+    (numeru i tenanta) odrzucamy bez zapytania, a w trybie hybrid/local
+    token bucket (max_per_bucket tokenów, uzupełnianych w ciągu bucket_seconds)
+    odrzuca flood z jednego numeru zanim dojdzie do DDB.
     """
 
     def __init__(
@@ -30,8 +82,20 @@ class SpamService:
         bucket_seconds: Optional[int] = None,
         max_per_bucket: Optional[int] = None,
         tenant_max_per_bucket: Optional[int] = None,
+        local_state: Optional[TTLCache] = None,
+        tenants: Optional[TenantsRepo] = None,
+        mode: Optional[str] = None,
+        local_ddb_ratio: Optional[float] = None,
+        tenant_shards: Optional[int] = None,
+        shard_fn=None,
+        stats_max_age_seconds: Optional[int] = None,
     ) -> None:
-        self.table = ddb_resource().Table(TABLE_NAME)
+        self.table = ddb_table(TABLE_NAME)
+        self.local = local_state if local_state is not None else SPAM_LOCAL_STATE
+        self.tenants = tenants or TenantsRepo()
+        self.mode = mode or SPAM_LIMITER_MODE
+        self.local_ddb_ratio = SPAM_LOCAL_DDB_RATIO if local_ddb_ratio is None else local_ddb_ratio
+        self.stats_max_age_seconds = stats_max_age_seconds or SPAM_STATS_MAX_AGE_SECONDS
         self._now_fn = now_fn or (lambda: int(time.time()))
         self.bucket_seconds = bucket_seconds or int(
             os.getenv("SPAM_BUCKET_SECONDS", "60")
@@ -42,16 +106,18 @@ class SpamService:
         self.tenant_max_per_bucket = tenant_max_per_bucket or int(
             os.getenv("SPAM_TENANT_MAX_PER_BUCKET", "300")  # 300 msg/min/tenant
         )
-
+        # więcej shardów niż limit dawałoby shardy z limitem 0
+        self.tenant_shards = max(1, min(tenant_shards or SPAM_TENANT_SHARDS, self.tenant_max_per_bucket))
+        self._shard_fn = shard_fn or (lambda: random.randrange(self.tenant_shards))
 
     def _bucket_for_ts(self, ts: int) -> str:
         """
-        Zwraca identyfikator bucketa czasowego.
-        Domyślnie: dokładność do minuty (YYYYMMDDHHMM).
+        Identyfikator okna: początek okna (UTC, YYYYMMDDHHMMSS) + jego długość,
+        żeby zmiana SPAM_BUCKET_SECONDS nie mieszała liczników.
         """
-        # Można w przyszłości dostosować do bucket_seconds, na razie prosto: 1 minuta
-        dt = datetime.datetime.utcfromtimestamp(ts)
-        return dt.strftime("%Y%m%d%H%M")
+        start = ts - ts % self.bucket_seconds
+        dt = datetime.datetime.utcfromtimestamp(start)
+        return f"{dt.strftime('%Y%m%d%H%M%S')}-{self.bucket_seconds}"
 
     def _key(self, tenant_id: str, phone: str, ts: int) -> dict:
         bucket = self._bucket_for_ts(ts)
@@ -60,128 +126,280 @@ class SpamService:
             "sk": phone,
         }
 
-    def is_blocked(self, tenant_id: str, phone: Optional[str]) -> bool:
-        """
-        Zwiększa licznik wiadomości w aktualnym buckecie
-        i zwraca True, jeśli numer powinien być zablokowany.
+    def shard_limit(self, shard: int) -> int:
+        """Limit jednego shardu; suma po wszystkich shardach = tenant_max_per_bucket."""
+        base, extra = divmod(self.tenant_max_per_bucket, self.tenant_shards)
+        return base + (1 if shard < extra else 0)
 
-        Uwaga: wołamy to PRZED wrzuceniem wiadomości do kolejki.
-        """
-        if not phone:
-            # brak numeru → nie blokujemy, ale logujemy
-            logger.warning({"spam": "no_phone_in_event", "tenant_id": tenant_id})
-            return False
+    def _total_key(self, pk: str, shard: int) -> dict:
+        return {"pk": pk, "sk": f"{TOTAL_SK}#{shard}"}
 
-        now_ts = self._now_fn()
+    def tenant_shard_counts(self, tenant_id: str, ts: Optional[int] = None) -> dict[int, int]:
+        """{shard: cnt} licznika tenanta w oknie (brak pozycji = 0), jedno BatchGetItem."""
+        pk = f"{tenant_id}#{self._bucket_for_ts(self._now_fn() if ts is None else ts)}"
+        keys = [self._total_key(pk, i) for i in range(self.tenant_shards)]
+        counts = {i: 0 for i in range(self.tenant_shards)}
+        for start in range(0, len(keys), 100):  # limit BatchGetItem
+            request = {self.table.name: {"Keys": keys[start : start + 100], "ProjectionExpression": "sk, cnt"}}
+            while request:
+                resp = self.table.meta.client.batch_get_item(RequestItems=request)
+                for item in resp.get("Responses", {}).get(self.table.name, []):
+                    counts[int(str(item["sk"]).rsplit("#", 1)[1])] = int(item.get("cnt", 0))
+                request = resp.get("UnprocessedKeys") or None
+        return counts
+
+    def tenant_count(self, tenant_id: str, ts: Optional[int] = None) -> int:
+        """Suma shardów licznika tenanta w oknie."""
+        return sum(self.tenant_shard_counts(tenant_id, ts).values())
+
+    def _shard_counts_or_none(self, tenant_id: str, now_ts: int) -> Optional[dict[int, int]]:
+        """tenant_shard_counts() na ścieżce odrzucenia – błąd DDB = brak danych (None)."""
+        try:
+            return self.tenant_shard_counts(tenant_id, now_ts)
+        except Exception as e:
+            logger.error({"spam": "tenant_count_failed", "error": str(e), "tenant_id": tenant_id})
+            return None
+
+    @staticmethod
+    def _block_key(tenant_id: str, phone: str) -> dict:
+        return {"pk": f"{tenant_id}#blocked", "sk": phone}
+
+    def _transact_items(self, tenant_id: str, phone: str, now_ts: int, shard: int) -> list[dict]:
         key = self._key(tenant_id, phone, now_ts)
+        total_key = self._total_key(key["pk"], shard)
+        # klient zasobu (table.meta.client) sam serializuje wartości Pythona
+        table = self.table.name
+        return [
+            {
+                "ConditionCheck": {
+                    "TableName": table,
+                    "Key": self._block_key(tenant_id, phone),
+                    "ConditionExpression": "attribute_not_exists(blocked_until) OR blocked_until <= :now",
+                    "ExpressionAttributeValues": {":now": now_ts},
+                    "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+                }
+            },
+            {
+                "Update": {
+                    "TableName": table,
+                    "Key": key,
+                    "UpdateExpression": "ADD cnt :one SET last_ts = :ts, expires_at = :exp",
+                    "ConditionExpression": "attribute_not_exists(cnt) OR cnt < :max",
+                    "ExpressionAttributeValues": {
+                        ":one": 1,
+                        ":ts": now_ts,
+                        ":exp": now_ts + self.stats_max_age_seconds,
+                        ":max": self.max_per_bucket,
+                    },
+                    "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+                }
+            },
+            {
+                "Update": {
+                    "TableName": table,
+                    "Key": total_key,
+                    "UpdateExpression": "ADD cnt :one SET last_ts = :ts, expires_at = :exp",
+                    "ConditionExpression": "attribute_not_exists(cnt) OR cnt < :max",
+                    "ExpressionAttributeValues": {
+                        ":one": 1,
+                        ":ts": now_ts,
+                        ":exp": now_ts + self.stats_max_age_seconds,
+                        ":max": self.shard_limit(shard),
+                    },
+                    "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+                }
+            },
+        ]
 
+    def _block(self, tenant_id: str, phone: str, now_ts: int) -> None:
         try:
-            resp = self.table.update_item(
-                Key=key,
-                UpdateExpression=(
-                    "ADD cnt :one "
-                    "SET last_ts = :ts"
-                ),
+            self.table.update_item(
+                Key=self._block_key(tenant_id, phone),
+                UpdateExpression="SET blocked_until = :bu, expires_at = :exp",
                 ExpressionAttributeValues={
-                    ":one": 1,
-                    ":ts": now_ts,
+                    ":bu": now_ts + self.bucket_seconds,
+                    ":exp": now_ts + self.bucket_seconds + self.stats_max_age_seconds,
                 },
-                ReturnValues="ALL_NEW",
             )
-            attrs = resp.get("Attributes", {}) or {}
         except Exception as e:
-            # W razie problemów z DDB wolimy NIE blokować klienta, tylko zalogować błąd.
             logger.error(
                 {
-                    "spam": "ddb_update_error",
+                    "spam": "set_blocked_until_failed",
                     "error": str(e),
                     "tenant_id": tenant_id,
                     "phone": phone,
                 }
             )
-            return False
 
-        #---  total per tenant/bucket ---
-        cnt = int(attrs.get("cnt", 0))
-        blocked_until = int(attrs.get("blocked_until", 0))
-        total_key = {"pk": key["pk"], "sk": "__TOTAL__"}
-        total_cnt = 0
+    def _limiter_config(self, tenant_id: str) -> tuple[str, float]:
+        """(mode, local_ddb_ratio) z konfiguracji tenanta, z domyślnymi z env."""
         try:
-            total_resp = self.table.update_item(
-                Key=total_key,
-                UpdateExpression="ADD cnt :one SET last_ts = :ts",
-                ExpressionAttributeValues={":one": 1, ":ts": now_ts},
-                ReturnValues="ALL_NEW",
-            )
-            total_attrs = total_resp.get("Attributes", {}) or {}
-            total_cnt = int(total_attrs.get("cnt", 0))
+            cfg = (self.tenants.get(tenant_id) or {}).get("spam_limiter") or {}
         except Exception as e:
-            logger.error(
-                {
-                    "spam": "ddb_update_error_total",
-                    "error": str(e),
-                    "tenant_id": tenant_id,
-                }
-            )
-            # jeśli padnie total – nie blokujemy z tego powodu
-            total_cnt = 0
-            
-        # 1) Jeżeli mamy aktywną blokadę czasową – honorujemy ją
-        if blocked_until and now_ts < blocked_until:
-            logger.info(
-                {
-                    "spam": "already_blocked",
-                    "tenant_id": tenant_id,
-                    "phone": phone,
-                    "blocked_until": blocked_until,
-                }
-            )
+            logger.warning({"spam": "tenant_config_failed", "tenant_id": tenant_id, "error": str(e)})
+            cfg = {}
+        mode = cfg.get("mode") or self.mode
+        if mode not in SPAM_LIMITER_MODES:
+            mode = self.mode
+        return mode, float(cfg.get("local_ddb_ratio", self.local_ddb_ratio))
+
+    def _remember_block(self, tenant_id: str, sk: str, until: int, now_ts: int) -> None:
+        if until > now_ts:
+            self.local.set(("blocked", tenant_id, sk), until, ttl_seconds=until - now_ts)
+
+    def _locally_blocked(self, tenant_id: str, phone: str, now_ts: int) -> Optional[int]:
+        for sk in (phone, TOTAL_SK):
+            until = self.local.get(("blocked", tenant_id, sk))
+            if until is not MISSING and now_ts < until:
+                return until
+        return None
+
+    def _take_token(self, tenant_id: str, phone: str, now_ts: int) -> Optional[float]:
+        """
+        Zabiera token z lokalnego bucketa numeru.
+        Zwraca liczbę pozostałych tokenów albo None, gdy bucket jest pusty.
+        """
+        key = ("bucket", tenant_id, phone)
+        capacity = float(self.max_per_bucket)
+        state = self.local.get(key)
+        if state is MISSING:
+            tokens = capacity
+        else:
+            tokens, last_ts = state
+            tokens = min(capacity, tokens + (now_ts - last_ts) * capacity / self.bucket_seconds)
+        if tokens < 1:
+            self.local.set(key, (tokens, now_ts))
+            return None
+        tokens -= 1
+        self.local.set(key, (tokens, now_ts))
+        return tokens
+
+    def is_blocked(self, tenant_id: str, phone: Optional[str]) -> bool:
+        """
+        Zlicza wiadomość w aktualnym oknie i zwraca True, jeśli numer
+        (albo cały tenant) przekroczył limit lub numer ma aktywną blokadę.
+
+        Uwaga: wołamy to PRZED wrzuceniem wiadomości do kolejki.
+        """
+        if not phone:
+            # brak numeru → nie blokujemy, ale logujemy
+            logger.warning({"spam": "no_phone_in_event", "tenant_id": tenant_id})
+            return False
+
+        now_ts = self._now_fn()
+
+        # 0) Znana blokada (numeru albo tenanta) – bez DDB
+        if self._locally_blocked(tenant_id, phone, now_ts):
+            logger.debug({"spam": "locally_blocked", "tenant_id": tenant_id, "phone": phone})
             return True
 
-        # 2) Jeżeli przekroczono limit w buckecie – ustawiamy blokadę i zwracamy True
-        if cnt > self.max_per_bucket:
-            new_blocked_until = now_ts + self.bucket_seconds
+        mode, ddb_ratio = self._limiter_config(tenant_id)
+        if mode != "ddb":
+            remaining = self._take_token(tenant_id, phone, now_ts)
+            if remaining is None:
+                # lokalny bucket pusty – numer przekroczył limit już w tym kontenerze
+                self._remember_block(tenant_id, phone, now_ts + self.bucket_seconds, now_ts)
+                logger.warning(
+                    {
+                        "spam": "local_rate_limit_hit",
+                        "tenant_id": tenant_id,
+                        "phone": phone,
+                        "max_per_bucket": self.max_per_bucket,
+                        "bucket_seconds": self.bucket_seconds,
+                    }
+                )
+                return True
+            if mode == "local":
+                return False
+            if self.max_per_bucket - remaining <= ddb_ratio * self.max_per_bucket:
+                # daleko od progu – nie płacimy za zapis do DDB
+                return False
+
+        shard = self._shard_fn() % self.tenant_shards
+        tried: set[int] = set()
+        while True:
             try:
-                self.table.update_item(
-                    Key=key,
-                    UpdateExpression="SET blocked_until = :bu",
-                    ExpressionAttributeValues={":bu": new_blocked_until},
+                self.table.meta.client.transact_write_items(
+                    TransactItems=self._transact_items(tenant_id, phone, now_ts, shard)
                 )
+                return False
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+                    # W razie problemów z DDB wolimy NIE blokować klienta, tylko zalogować błąd.
+                    logger.error(
+                        {"spam": "ddb_update_error", "error": str(e), "tenant_id": tenant_id, "phone": phone}
+                    )
+                    return False
+                reasons = e.response.get("CancellationReasons") or []
             except Exception as e:
-                logger.error(
+                logger.error({"spam": "ddb_update_error", "error": str(e), "tenant_id": tenant_id, "phone": phone})
+                return False
+
+            failed = [r.get("Code") == "ConditionalCheckFailed" for r in reasons] + [False] * 3
+            blocked_check, phone_limit, tenant_limit = failed[:3]
+
+            # 1) Aktywna blokada czasowa – honorujemy ją
+            if blocked_check:
+                until = int((reasons[0].get("Item") or {}).get("blocked_until", now_ts + self.bucket_seconds))
+                self._remember_block(tenant_id, phone, until, now_ts)
+                logger.info(
                     {
-                        "spam": "set_blocked_until_failed",
-                        "error": str(e),
+                        "spam": "already_blocked",
                         "tenant_id": tenant_id,
                         "phone": phone,
+                        "blocked_until": until,
                     }
                 )
+                return True
 
-            logger.warning(
-                {
-                    "spam": "rate_limit_hit",
-                    "tenant_id": tenant_id,
-                    "phone": phone,
-                    "cnt": cnt,
-                    "max_per_bucket": self.max_per_bucket,
-                    "bucket_seconds": self.bucket_seconds,
-                }
-            )
-            return True
-            
-        # 3) Jeżeli przekroczono limit TENANTA w buckecie – też blokujemy ten request
-        if self.tenant_max_per_bucket and total_cnt > self.tenant_max_per_bucket:
+            # 2) Przekroczony limit numeru w oknie – ustawiamy blokadę
+            if phone_limit:
+                self._block(tenant_id, phone, now_ts)
+                self._remember_block(tenant_id, phone, now_ts + self.bucket_seconds, now_ts)
+                logger.warning(
+                    {
+                        "spam": "rate_limit_hit",
+                        "tenant_id": tenant_id,
+                        "phone": phone,
+                        "cnt": int((reasons[1].get("Item") or {}).get("cnt", 0)),
+                        "max_per_bucket": self.max_per_bucket,
+                        "bucket_seconds": self.bucket_seconds,
+                    }
+                )
+                return True
+
+            if not tenant_limit:
+                break
+
+            # 3) Pełny shard licznika TENANTA – sprawdzamy sumę shardów (jedno BatchGetItem)
+            tried.add(shard)
+            counts = self._shard_counts_or_none(tenant_id, now_ts)
+            total = sum(counts.values()) if counts is not None else None
+            if total is not None and total < self.tenant_max_per_bucket:
+                free = [i for i, cnt in counts.items() if i not in tried and cnt < self.shard_limit(i)]
+                if free:
+                    # limit tenanta nie jest wyczerpany – próbujemy najmniej zajęty shard
+                    shard = min(free, key=counts.__getitem__)
+                    continue
+
+            # odrzucamy ten request (bez blokady numeru); blokadę całego tenanta do końca
+            # okna zapamiętujemy lokalnie tylko wtedy, gdy potwierdza ją suma shardów
+            if total is not None and total >= self.tenant_max_per_bucket:
+                window_end = now_ts - now_ts % self.bucket_seconds + self.bucket_seconds
+                self._remember_block(tenant_id, TOTAL_SK, window_end, now_ts)
             logger.warning(
                 {
                     "spam": "tenant_bucket_limit_exceeded",
                     "tenant_id": tenant_id,
                     "phone": phone,
-                    "total_cnt": total_cnt,
+                    "shard_cnt": int((reasons[2].get("Item") or {}).get("cnt", 0)),
+                    "tenant_cnt": total,
+                    "tenant_shards": self.tenant_shards,
                 }
             )
-            # nie ustawiamy tu osobnego blocked_until dla wszystkich,
-            # po prostu ten konkretny request jest odrzucony
             return True
-        
-        # 3) W normalnym przypadku – nie blokujemy
+
+        # transakcja anulowana z innego powodu (konflikt, throttling) – nie blokujemy
+        logger.error({"spam": "transaction_canceled", "tenant_id": tenant_id, "phone": phone,
+                      "reasons": [r.get("Code") for r in reasons]})
         return False
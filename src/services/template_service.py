@@ -1,14 +1,111 @@
-from ..domain.templates import render_template
+import os
+
+from ..domain.templates import render_template, ROUTER_TEMPLATE_NAMES
 from ..repos.templates_repo import TemplatesRepo
-from ..repos.tenants_repo import TenantsRepo
+from ..repos.tenants_repo import TenantsRepo, TENANT_CHANGE_LISTENERS
+from ..common.cache import TTLCache, MISSING
 from ..common.config import settings
 from ..common.logging import logger
 
+# Cache szablonów współdzielony w obrębie procesu (ciepły kontener Lambdy).
+# Klucze:
+#   ("tpl", tenant_id, name, lang)   -> item z DDB albo None (negative caching)
+#   ("chain", tenant_id, lang)       -> rozwiązany łańcuch fallbacków językowych
+#   ("warm", tenant_id, lang)        -> znacznik, że preload dla języka już był
+TEMPLATES_CACHE = TTLCache(
+    maxsize=int(os.getenv("TEMPLATES_CACHE_MAX_ITEMS", "2048")),
+    ttl_seconds=int(os.getenv("TEMPLATES_CACHE_TTL_SECONDS", "300")),
+)
+TEMPLATES_NEGATIVE_TTL_SECONDS = int(os.getenv("TEMPLATES_CACHE_NEGATIVE_TTL_SECONDS", "60"))
+
+
+def invalidate_templates(tenant_id: str | None = None, name: str | None = None) -> int:
+    """
+    Hook do unieważniania cache szablonów (np. po edycji w panelu).
+
+    Bez argumentów czyści cały cache; z tenant_id – tylko wpisy tenanta;
+    z name – tylko dany szablon (łańcuchy językowe zostają).
+    """
+    def _match(key) -> bool:
+        if tenant_id is not None and key[1] != tenant_id:
+            return False
+        if name is not None and (key[0] != "tpl" or key[2] != name):
+            return False
+        return True
+
+    return TEMPLATES_CACHE.invalidate_where(_match)
+
+
+def invalidate_lang_chains(tenant_id: str | None = None) -> int:
+    """
+    Unieważnia łańcuchy języków (zależą od language_code tenanta).
+    Wołane przez TenantsRepo po set_language / invalidate.
+    """
+    return TEMPLATES_CACHE.invalidate_where(
+        lambda key: key[0] == "chain" and (tenant_id is None or key[1] == tenant_id)
+    )
+
+
+TENANT_CHANGE_LISTENERS.append(invalidate_lang_chains)
+
 
 class TemplateService:
-    def __init__(self, repo: TemplatesRepo | None = None) -> None:
+    def __init__(
+        self,
+        repo: TemplatesRepo | None = None,
+        cache: TTLCache | None = None,
+        tenants: TenantsRepo | None = None,
+    ) -> None:
         self.repo = repo or TemplatesRepo()
-        self.tenants = TenantsRepo()
+        self.tenants = tenants or TenantsRepo()
+        self.cache = cache if cache is not None else TEMPLATES_CACHE
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats()
+
+    def preload(
+        self,
+        tenant_id: str,
+        languages: list[str],
+        names: tuple[str, ...] = ROUTER_TEMPLATE_NAMES,
+    ) -> int:
+        """
+        Rozgrzewa cache: ładuje hurtowo (BatchGetItem) wszystkie znane szablony
+        tenanta w językach, które nie były jeszcze załadowane.
+        Zwraca liczbę wpisów zapisanych w cache.
+        """
+        batch_get = getattr(self.repo, "batch_get_templates", None)
+        if batch_get is None:
+            # repo bez batch (np. fake w testach) – zostajemy przy get_item
+            return 0
+
+        cold = [
+            lang for lang in languages
+            if lang and self.cache.get(("warm", tenant_id, lang)) is MISSING
+        ]
+        if not cold:
+            return 0
+
+        try:
+            loaded = batch_get(tenant_id, names, cold)
+        except Exception as e:
+            logger.warning({"templates": "preload_failed", "tenant_id": tenant_id, "err": str(e)})
+            return 0
+
+        for (name, lang), tpl in loaded.items():
+            if tpl:
+                self.cache.set(("tpl", tenant_id, name, lang), tpl)
+            else:
+                self.cache.set(
+                    ("tpl", tenant_id, name, lang), None, ttl_seconds=TEMPLATES_NEGATIVE_TTL_SECONDS
+                )
+        for lang in cold:
+            self.cache.set(("warm", tenant_id, lang), True)
+
+        logger.info(
+            {"templates": "preloaded", "tenant_id": tenant_id, "langs": cold, "count": len(loaded)}
+        )
+        return len(loaded)
 
     def render(self, template: str, context: dict):
         """
@@ -24,25 +121,34 @@ class TemplateService:
     def _try_get_template(self, tenant_id: str, name: str, language_code: str | None):
         if not language_code:
             return None
-        return self.repo.get_template(tenant_id, name, language_code)
 
-    def render_named(
-        self,
-        tenant_id: str,
-        name: str,
-        language_code: str | None,
-        context: dict | None = None,
-    ) -> str:
-        """
-        Główna metoda do wszystkich odpowiedzi bot-a.
+        key = ("tpl", tenant_id, name, language_code)
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            return cached
 
-        Priorytety:
+        tpl = self.repo.get_template(tenant_id, name, language_code)
+        if tpl:
+            self.cache.set(key, tpl)
+        else:
+            self.cache.set(key, None, ttl_seconds=TEMPLATES_NEGATIVE_TTL_SECONDS)
+        return tpl
+
+    def _lang_chain(self, tenant_id: str, language_code: str | None) -> list[str]:
+        """
+        Łańcuch języków do sprawdzenia:
         1) exact language_code, np. "pl-PL"
         2) base language z prefixu, np. "pl"
         3) default language tenanta
         4) global default (settings.get_default_language)
-        Jeśli nic nie ma – zwracamy samą nazwę szablonu (łatwo szukać braków w logach).
+
+        Wynik jest cache'owany per (tenant, language_code), więc TenantsRepo
+        nie jest odpytywane przy każdym render_named.
         """
+        key = ("chain", tenant_id, language_code or "")
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            return cached
 
         lang_chain: list[str] = []
 
@@ -61,6 +167,33 @@ class TemplateService:
         if global_default and global_default not in lang_chain:
             lang_chain.append(global_default)
 
+        self.cache.set(key, lang_chain)
+        return lang_chain
+
+    def render_named(
+        self,
+        tenant_id: str,
+        name: str,
+        language_code: str | None,
+        context: dict | None = None,
+    ) -> str:
+        """
+        Główna metoda do wszystkich odpowiedzi bot-a.
+
+        Priorytety:
+        1) exact language_code, np. "pl-PL"
+        2) base language z prefixu, np. "pl"
+        3) default language tenanta
+        4) global default (settings.get_default_language)
+        Jeśli nic nie ma – zwracamy samą nazwę szablonu (łatwo szukać braków w logach).
+
+        Odczyty z DDB (szablony, także brakujące, oraz łańcuch języków)
+        idą przez TEMPLATES_CACHE; przy pierwszym użyciu tenanta w danym
+        języku cache jest rozgrzewany jednym BatchGetItem (preload).
+        """
+        lang_chain = self._lang_chain(tenant_id, language_code)
+        self.preload(tenant_id, lang_chain)
+
         tpl = None
         for lang in lang_chain:
             tpl = self._try_get_template(tenant_id, name, lang)
@@ -16,7 +16,7 @@ def mock_ai(monkeypatch):
     - inne -> clarify
     Patchujemy NLUService.classify_intent, więc nie obchodzi nas kolejność importów.
     """
-    def fake_classify_intent(self, text: str, lang: str = "pl"):
+    def fake_classify_intent(self, text: str, lang: str = "pl", tenant_id="default"):
         t = (text or "").lower()
         if "godzin" in t or "otwar" in t:
             return {"intent": "faq", "confidence": 0.95, "slots": {"topic": "hours"}}
@@ -180,20 +180,49 @@ def env_setup(monkeypatch):
     monkeypatch.setenv("WebOutboundEventsQueueUrl", "http://localhost/queue/outbound")
 
 
+@pytest.fixture(autouse=True)
+def clear_process_caches():
+    """
+    Cache'e per proces (klienci boto3, szablony itp.) przeżywają między testami tak jak
+    między wywołaniami w ciepłym kontenerze – czyścimy je przed każdym testem.
+    """
+    from src.common import aws
+    from src.services import template_service
+    from src.repos import tenants_repo
+    from src.services import nlu_service, intent_rules_service, kb_service, schedule_service, spam_service
+
+    aws.reset_clients()
+    aws.reset_queue_urls()
+    template_service.TEMPLATES_CACHE.clear()
+    tenants_repo.TENANTS_CACHE.clear()
+    nlu_service.NLU_CACHE.clear()
+    intent_rules_service.INTENT_RULES_CACHE.clear()
+    kb_service.FAQ_CACHE.clear()
+    kb_service.FAQ_INDEX_CACHE.clear()
+    kb_service.FAQ_EMBEDDING_CACHE.clear()
+    schedule_service.SCHEDULE_CACHE.clear()
+    spam_service.SPAM_LOCAL_STATE.clear()
+    yield
+
+
 # ============================
 #  AWS STACK (Moto: SQS + DDB)
 # ============================
 
-def ensure_table(name, key_schema, attr_defs):
+def ensure_table(name, key_schema, attr_defs, gsis=None):
     ddb = boto3.client("dynamodb", region_name="eu-central-1")
     try:
         ddb.describe_table(TableName=name)
     except ddb.exceptions.ResourceNotFoundException:
+        kwargs = {}
+        if gsis:
+            kwargs["GlobalSecondaryIndexes"] = gsis
         ddb.create_table(
             TableName=name,
             KeySchema=key_schema,
             AttributeDefinitions=attr_defs,
             BillingMode="PAY_PER_REQUEST",
+            **kwargs,
         )
 @pytest.fixture()
 def aws_stack(monkeypatch):
@@ -227,16 +256,22 @@ def aws_stack(monkeypatch):
             ],
         )
 
-        # Conversations
+        # Conversations – schemat jak w template.yaml (pk + sk, TTL expires_at)
         ensure_table(
             "Conversations",
             attr_defs=[
                 {"AttributeName": "pk", "AttributeType": "S"},
+                {"AttributeName": "sk", "AttributeType": "S"},
             ],
             key_schema=[
                 {"AttributeName": "pk", "KeyType": "HASH"},
+                {"AttributeName": "sk", "KeyType": "RANGE"},
             ],
         )
+        ddb.update_time_to_live(
+            TableName="Conversations",
+            TimeToLiveSpecification={"Enabled": True, "AttributeName": "expires_at"},
+        )
 
         # Campaigns
         ensure_table(
@@ -249,6 +284,19 @@ def aws_stack(monkeypatch):
             ],
         )
 
+        # CampaignRuns – kursory fan-outu kampanii
+        ensure_table(
+            "CampaignRuns",
+            attr_defs=[
+                {"AttributeName": "pk", "AttributeType": "S"},
+                {"AttributeName": "sk", "AttributeType": "S"},
+            ],
+            key_schema=[
+                {"AttributeName": "pk", "KeyType": "HASH"},
+                {"AttributeName": "sk", "KeyType": "RANGE"},
+            ],
+        )
+
         # IntentsStats – pod SpamService
         ensure_table(
             "IntentsStats",
@@ -295,15 +343,51 @@ def aws_stack(monkeypatch):
             ],
         )
 
+        # NluCache – współdzielony cache klasyfikacji NLU
+        ensure_table(
+            "NluCache",
+            attr_defs=[
+                {"AttributeName": "pk", "AttributeType": "S"},
+            ],
+            key_schema=[
+                {"AttributeName": "pk", "KeyType": "HASH"},
+            ],
+        )
+
+        # ClassSchedule – grafik zajęć PG (schedule_sync)
+        ensure_table(
+            "ClassSchedule",
+            attr_defs=[
+                {"AttributeName": "pk", "AttributeType": "S"},
+                {"AttributeName": "sk", "AttributeType": "S"},
+            ],
+            key_schema=[
+                {"AttributeName": "pk", "KeyType": "HASH"},
+                {"AttributeName": "sk", "KeyType": "RANGE"},
+            ],
+        )
+
         # MembersIndex – pod MembersIndexRepo
         ensure_table(
             "MembersIndex",
             attr_defs=[
                 {"AttributeName": "pk", "AttributeType": "S"},
+                {"AttributeName": "tenant_id", "AttributeType": "S"},
+                {"AttributeName": "phone", "AttributeType": "S"},
             ],
             key_schema=[
                 {"AttributeName": "pk", "KeyType": "HASH"},
             ],
+            gsis=[
+                {
+                    "IndexName": "tenant_phone_index",
+                    "KeySchema": [
+                        {"AttributeName": "tenant_id", "KeyType": "HASH"},
+                        {"AttributeName": "phone", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+            ],
         )
 
         # SpamService – SpamService
@@ -329,6 +413,12 @@ def aws_stack(monkeypatch):
             "outbound": outbound["QueueUrl"],
         }
         
+@pytest.fixture()
+def conversations_table(aws_stack):
+    """Tabela Conversations z aws_stack (pk + sk, TTL expires_at)."""
+    return boto3.resource("dynamodb", region_name="eu-central-1").Table("Conversations")
+
+
 @pytest.fixture()
 def requests_mock(monkeypatch):
     """
@@ -364,4 +454,6 @@ def requests_mock(monkeypatch):
 
     mock = _RequestsMock()
     monkeypatch.setattr("requests.get", mock._fake_get)
+    # PerfectGymClient idzie przez współdzieloną sesję (pula połączeń)
+    monkeypatch.setattr("requests.Session.get", lambda self, url, **kw: mock._fake_get(url, **kw))
     return mock
\ No newline at end of file
@@ -0,0 +1,67 @@
+from src.common import aws
+
+
+def test_clients_are_memoized_per_service_and_region(monkeypatch):
+    assert aws.sqs_client() is aws.sqs_client()
+    assert aws.ddb_resource() is aws.ddb_resource()
+    assert aws.s3_client() is not aws.sqs_client()
+
+    monkeypatch.setenv("AWS_REGION", "eu-west-1")
+    other = aws.sqs_client()
+    assert other.meta.region_name == "eu-west-1"
+    assert other is not aws._CLIENTS[("client", "sqs", None, "eu-central-1")]
+
+
+def test_client_config_uses_pool_and_timeouts(monkeypatch):
+    monkeypatch.setenv("AWS_MAX_POOL_CONNECTIONS", "50")
+    monkeypatch.setenv("AWS_READ_TIMEOUT", "3")
+
+    cfg = aws.sqs_client().meta.config
+    assert cfg.max_pool_connections == 50
+    assert cfg.read_timeout == 3
+    assert cfg.tcp_keepalive is True
+
+
+def test_queue_url_lookup_is_cached_including_misses(aws_stack, monkeypatch):
+    import boto3
+
+    boto3.client("sqs", region_name="eu-central-1").create_queue(QueueName="SomeQueueUrl")
+    monkeypatch.delenv("SomeQueueUrl", raising=False)
+    monkeypatch.delenv("MissingQueueUrl", raising=False)
+
+    first = aws.resolve_queue_url("SomeQueueUrl")
+    assert first.endswith("/SomeQueueUrl")
+    assert aws.resolve_queue_url("SomeQueueUrl") == first
+    assert aws.QUEUE_URL_LOOKUPS["SomeQueueUrl"] == 1
+
+    assert aws.resolve_optional_queue_url("MissingQueueUrl") is None
+    assert aws.resolve_optional_queue_url("MissingQueueUrl") is None
+    assert aws.QUEUE_URL_LOOKUPS["MissingQueueUrl"] == 1
+
+
+def test_ddb_resources_and_tables_are_per_thread():
+    import threading
+
+    main_resource = aws.ddb_resource()
+    table = aws.ddb_table("Tenants")
+    main_table = table._table()
+    seen = {}
+
+    def worker():
+        seen["resource"] = aws.ddb_resource()
+        seen["table"] = table._table()
+        seen["client"] = aws.sqs_client()
+
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join()
+
+    assert seen["resource"] is not main_resource
+    assert seen["table"] is not main_table
+    assert table._table() is main_table
+    assert table.name == "Tenants"
+    # klienci są bezpieczni wątkowo – wspólni dla procesu
+    assert seen["client"] is aws.sqs_client()
+
+    aws.reset_clients()
+    assert aws.ddb_resource() is not main_resource
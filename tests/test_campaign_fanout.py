@@ -0,0 +1,197 @@
+import json
+from datetime import datetime
+
+import boto3
+
+from src.common.aws import ddb_resource
+from src.common.sqs_publisher import SqsBatchPublisher
+from src.lambdas.campaign_runner import handler as campaign_runner
+from src.repos.campaign_runs_repo import CampaignRunsRepo
+from src.services.campaign_service import CampaignService
+
+PHONES = [f"whatsapp:+48{i:09d}" for i in range(25)]
+CAMPAIGN = {"pk": "camp#1", "campaign_id": "camp-1", "tenant_id": "t1", "active": True,
+            "body": "Promocja!", "language_code": "pl", "recipients": PHONES}
+
+
+class FakeConversations:
+    def get_conversation(self, tenant_id, channel, channel_user_id):
+        return None
+
+
+class FakeTenants:
+    def get(self, tenant_id):
+        return {"tenant_id": tenant_id, "language_code": "pl"}
+
+
+class FakeSQS:
+    """send_message_batch z rejestrem odbiorców; numery z `reject` są odrzucane (SenderFault)."""
+
+    def __init__(self, reject=()):
+        self.delivered = []
+        self.reject = set(reject)
+
+    def send_message_batch(self, QueueUrl, Entries):
+        ok, failed = [], []
+        for e in Entries:
+            to = json.loads(e["MessageBody"])["to"]
+            if to in self.reject:
+                failed.append({"Id": e["Id"], "SenderFault": True, "Code": "InvalidMessageContents"})
+            else:
+                ok.append({"Id": e["Id"]})
+                self.delivered.append(to)
+        return {"Successful": ok, "Failed": failed}
+
+
+def _svc():
+    return CampaignService(now_fn=lambda: datetime(2024, 1, 1, 10, 0), tenants_repo=FakeTenants(),
+                           conversations_repo=FakeConversations())
+
+
+def _budget(checks):
+    """has_time, które zwraca True `checks` razy (symulacja kończącego się czasu Lambdy)."""
+    left = [checks]
+
+    def has_time():
+        left[0] -= 1
+        return left[0] >= 0
+
+    return has_time
+
+
+def test_resumed_run_continues_from_cursor_without_double_sends(aws_stack, monkeypatch):
+    monkeypatch.setattr(campaign_runner, "svc", _svc())
+    runs = CampaignRunsRepo(table_name="CampaignRuns")
+    sqs = FakeSQS()
+
+    # czas kończy się w połowie drugiej paczki: 1 + 9 sprawdzeń w pierwszej, 1 + 4 w drugiej
+    first = campaign_runner.process_campaign(CAMPAIGN, "2024-01-01", SqsBatchPublisher(sqs), "q",
+                                             runs_repo=runs, has_time=_budget(15), chunk_size=10)
+    assert first["status"] == "partial" and first["cursor"] == 15
+    # przetworzona część paczki jest wysłana i zapisana w kursorze
+    assert sqs.delivered == PHONES[:15]
+    assert runs.get_run("camp#1", "2024-01-01")["cursor"] == 15
+
+    # poprzedni worker zdążył wysłać jeszcze jedną wiadomość przed timeoutem
+    runs.claim_send("camp#1", "2024-01-01", PHONES[22])
+
+    second = campaign_runner.process_campaign(CAMPAIGN, "2024-01-01", SqsBatchPublisher(sqs), "q",
+                                              runs_repo=runs, chunk_size=10)
+    assert second["status"] == "done" and second["cursor"] == 25
+
+    assert sorted(sqs.delivered) == sorted(set(PHONES) - {PHONES[22]})
+    run = runs.get_run("camp#1", "2024-01-01")
+    assert (run["status"], run["sent"], run["skipped"]) == ("done", 24, 1)
+
+    # przebieg zakończony – kolejne wywołanie tego dnia nic nie wysyła
+    campaign_runner.process_campaign(CAMPAIGN, "2024-01-01", SqsBatchPublisher(sqs), "q", runs_repo=runs)
+    assert len(sqs.delivered) == 24
+
+
+def test_rejected_messages_keep_cursor_and_release_send_keys(aws_stack, monkeypatch):
+    monkeypatch.setattr(campaign_runner, "svc", _svc())
+    runs = CampaignRunsRepo(table_name="CampaignRuns")
+    sqs = FakeSQS(reject={PHONES[3]})
+
+    result = campaign_runner.process_campaign(CAMPAIGN, "r1", SqsBatchPublisher(sqs), "q",
+                                              runs_repo=runs, chunk_size=10)
+
+    assert result["status"] == "partial" and result["cursor"] == 0 and result["failed"] == 1
+    assert runs.claim_send("camp#1", "r1", PHONES[3]) is True  # klucz zwolniony
+    assert runs.claim_send("camp#1", "r1", PHONES[4]) is False
+
+
+def test_stale_cursor_loses_to_other_worker(aws_stack):
+    runs = CampaignRunsRepo(table_name="CampaignRuns")
+    runs.start_run("camp#1", "r1", total=30)
+
+    assert runs.advance("camp#1", "r1", 0, 10, sent=10, skipped=0, done=False) is True
+    assert runs.advance("camp#1", "r1", 0, 10, sent=10, skipped=0, done=False) is False
+    assert runs.get_run("camp#1", "r1")["cursor"] == 10
+
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def test_schedule_queues_campaigns_and_worker_continues_them(aws_stack, monkeypatch):
+    monkeypatch.setattr(campaign_runner, "svc", _svc())
+    monkeypatch.setattr(campaign_runner, "runs", CampaignRunsRepo(table_name="CampaignRuns"))
+    monkeypatch.setattr(campaign_runner, "CAMPAIGNS_SCAN_MAX_WORKERS", 1)
+    monkeypatch.setattr(campaign_runner, "CAMPAIGNS_SCAN_SEGMENTS", 1)
+    monkeypatch.setattr(campaign_runner, "CAMPAIGN_CHUNK_SIZE", 10)
+    sqs = boto3.client("sqs", region_name="eu-central-1")
+    fanout_url = sqs.create_queue(QueueName="campaign-fanout")["QueueUrl"]
+    monkeypatch.setenv("CampaignFanoutQueueUrl", fanout_url)
+    ddb_resource().Table("Campaigns").put_item(Item=CAMPAIGN)
+
+    campaign_runner.lambda_handler({}, FakeContext(20_000))
+
+    msgs = sqs.receive_message(QueueUrl=fanout_url, MaxNumberOfMessages=10)["Messages"]
+    assert [json.loads(m["Body"]) for m in msgs] == [
+        {"campaign_pk": "camp#1", "run_id": campaign_runner.current_run_id()}
+    ]
+
+    # czas Lambdy się kończy – worker zapisuje kursor i wrzuca kontynuację
+    resp = campaign_runner.lambda_handler({"Records": [{"messageId": "m1", "body": msgs[0]["Body"]}]},
+                                          FakeContext(1_000))
+    assert resp["batchItemFailures"] == []
+    cont = sqs.receive_message(QueueUrl=fanout_url, MaxNumberOfMessages=10, VisibilityTimeout=0)["Messages"]
+    assert len(cont) == 1 and json.loads(cont[0]["Body"]) == json.loads(msgs[0]["Body"])
+
+    resp = campaign_runner.lambda_handler({"Records": [{"messageId": "m2", "body": cont[0]["Body"]}]},
+                                          FakeContext(20_000))
+    assert resp["batchItemFailures"] == []
+    out_url = sqs.get_queue_url(QueueName="outbound-messages")["QueueUrl"]
+    sent = []
+    while True:
+        batch = sqs.receive_message(QueueUrl=out_url, MaxNumberOfMessages=10).get("Messages", [])
+        if not batch:
+            break
+        sent += [json.loads(m["Body"])["to"] for m in batch]
+    assert sorted(sent) == PHONES
+
+
+def test_unfinished_run_continues_after_midnight(aws_stack, monkeypatch):
+    monkeypatch.setattr(campaign_runner, "svc", _svc())
+    runs = CampaignRunsRepo(table_name="CampaignRuns")
+    monkeypatch.setattr(campaign_runner, "runs", runs)
+    monkeypatch.setattr(campaign_runner, "CAMPAIGNS_SCAN_MAX_WORKERS", 1)
+    monkeypatch.setattr(campaign_runner, "CAMPAIGNS_SCAN_SEGMENTS", 1)
+    monkeypatch.setattr(campaign_runner, "CAMPAIGN_CHUNK_SIZE", 10)
+    monkeypatch.setattr(campaign_runner, "current_run_id", lambda: "2024-01-01")
+    sqs = boto3.client("sqs", region_name="eu-central-1")
+    fanout_url = sqs.create_queue(QueueName="campaign-fanout")["QueueUrl"]
+    monkeypatch.setenv("CampaignFanoutQueueUrl", fanout_url)
+    ddb_resource().Table("Campaigns").put_item(Item=CAMPAIGN)
+
+    # 2024-01-01: przebieg założony, worker przetwarza jedną paczkę i kończy mu się czas
+    campaign_runner.lambda_handler({}, FakeContext(20_000))
+    msg = sqs.receive_message(QueueUrl=fanout_url)["Messages"][0]
+    runs.advance("camp#1", "2024-01-01", 0, 10, sent=10, skipped=0, done=False)
+
+    # po północy: harmonogram nie zaczyna nowego przebiegu, tylko wznawia stary
+    monkeypatch.setattr(campaign_runner, "current_run_id", lambda: "2024-01-02")
+    campaign_runner.lambda_handler({}, FakeContext(20_000))
+    queued = sqs.receive_message(QueueUrl=fanout_url, MaxNumberOfMessages=10, VisibilityTimeout=0)["Messages"]
+    assert {json.loads(m["Body"])["run_id"] for m in queued} == {"2024-01-01"}
+    assert runs.get_run("camp#1", "2024-01-02") is None
+
+    # kontynuacja z poprzedniego dnia jest przetwarzana do końca
+    resp = campaign_runner.lambda_handler({"Records": [{"messageId": "m1", "body": msg["Body"]}]},
+                                          FakeContext(20_000))
+    assert resp["batchItemFailures"] == []
+    run = runs.get_run("camp#1", "2024-01-01")
+    assert (run["status"], run["cursor"]) == ("done", 25)
+    assert runs.pending_run_id("camp#1") is None
+
+    # zakończony przebieg – zdublowana kontynuacja nic nie robi, kolejny dzień startuje nowy
+    campaign_runner.lambda_handler({"Records": [{"messageId": "m2", "body": msg["Body"]}]}, FakeContext(20_000))
+    assert runs.get_run("camp#1", "2024-01-01")["sent"] == 25  # 10 (advance wyżej) + 15
+    monkeypatch.setattr(campaign_runner, "current_run_id", lambda: "2024-01-03")
+    campaign_runner.lambda_handler({}, FakeContext(20_000))
+    assert runs.get_run("camp#1", "2024-01-03")["status"] == "running"
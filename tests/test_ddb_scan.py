@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+from boto3.dynamodb.conditions import Attr
+
+from src.common.aws import ddb_resource
+from src.common.ddb_scan import ScanStats, parallel_scan, projection_kwargs
+
+
+def test_scan_follows_last_evaluated_key(aws_stack):
+    table = ddb_resource().Table("Campaigns")
+    with table.batch_writer() as batch:
+        for i in range(25):
+            batch.put_item(Item={"pk": f"c{i}", "active": i % 5 != 0, "status": "x" * 10})
+
+    stats = ScanStats()
+    items = list(
+        parallel_scan(
+            table,
+            segments=1,  # moto ignoruje Segment/TotalSegments (segmenty: FakeClient niżej)
+            max_workers=1,
+            page_size=4,
+            projection=["pk", "status"],  # "status" to słowo zarezerwowane w DDB
+            filter_expression=Attr("active").eq(True),
+            stats=stats,
+        )
+    )
+
+    assert sorted(i["pk"] for i in items) == sorted(f"c{i}" for i in range(25) if i % 5 != 0)
+    assert all(set(i) == {"pk", "status"} for i in items)
+    assert stats.scanned == 25
+    assert stats.returned == 20
+    assert stats.pages == 7
+
+
+def test_projection_keeps_filter_attribute_names():
+    kw = projection_kwargs(["pk", "name"], {"#s": "status"})
+
+    assert kw["ProjectionExpression"] == "#p0, #p1"
+    assert kw["ExpressionAttributeNames"] == {"#s": "status", "#p0": "pk", "#p1": "name"}
+
+
+class FakeClient:
+    """scan() z segmentami i stronami po 2 pozycje; rejestruje wątki."""
+
+    def __init__(self, total=20, fail_segment=None):
+        self.rows = [{"pk": str(i)} for i in range(total)]
+        self.fail_segment = fail_segment
+        self.threads = set()
+
+    def scan(self, TableName, Segment=0, TotalSegments=1, ExclusiveStartKey=None, **kwargs):
+        self.threads.add(threading.get_ident())
+        if Segment == self.fail_segment:
+            raise RuntimeError("ProvisionedThroughputExceeded")
+        rows = [r for i, r in enumerate(self.rows) if i % TotalSegments == Segment]
+        start = int(ExclusiveStartKey["pos"]) if ExclusiveStartKey else 0
+        page = rows[start:start + 2]
+        resp = {"Items": page, "Count": len(page), "ScannedCount": len(page)}
+        if start + 2 < len(rows):
+            resp["LastEvaluatedKey"] = {"pos": start + 2}
+        return resp
+
+
+class FakeTable:
+    name = "Fake"
+
+    def __init__(self, client):
+        self.meta = type("Meta", (), {"client": client})()
+
+
+def test_parallel_workers_stream_all_items():
+    client = FakeClient(total=40)
+
+    items = list(parallel_scan(FakeTable(client), segments=4, max_workers=4))
+
+    assert sorted(int(i["pk"]) for i in items) == list(range(40))
+    assert threading.get_ident() not in client.threads
+
+
+def test_segment_error_is_raised_to_consumer():
+    with pytest.raises(RuntimeError, match="ProvisionedThroughput"):
+        list(parallel_scan(FakeTable(FakeClient(fail_segment=2)), segments=4, max_workers=4))
+
+
+def test_consumer_can_stop_early():
+    gen = parallel_scan(FakeTable(FakeClient(total=1000)), segments=4, max_workers=2)
+
+    first = [next(gen) for _ in range(3)]
+    gen.close()  # zatrzymuje wątki, nie czyta reszty tabeli
+
+    assert len(first) == 3
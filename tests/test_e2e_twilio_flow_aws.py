@@ -80,6 +80,11 @@ def test_e2e_twilio_to_outbound_queue(monkeypatch, mock_ai):
                 outbound_msgs.append({"Body": MessageBody})
             return {"MessageId": "fake-msg"}
 
+        def send_message_batch(self, QueueUrl, Entries):
+            for e in Entries:
+                self.send_message(QueueUrl, e["MessageBody"])
+            return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
     fake_sqs = FakeSQS()
 
     def fake_sqs_client():
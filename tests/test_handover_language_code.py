@@ -4,7 +4,7 @@ from src.domain.models import Message
 
 def test_handover_reply_contains_language_code(monkeypatch):
     class DummyNLU:
-        def classify_intent(self, text: str, lang: str | None):
+        def classify_intent(self, text: str, lang: str | None, tenant_id="default"):
             return {"intent": "handover", "confidence": 0.99, "slots": {}}
 
     class DummyTpl:
@@ -24,16 +24,14 @@ def test_handover_reply_contains_language_code(monkeypatch):
             pass
 
         # używane przez RoutingService do obsługi pending rezerwacji
-        def get(self, key):
-            return self.pending.get(key)
+        def get_pending(self, tenant_id, phone):
+            return self.pending.get((tenant_id, phone))
 
-        def put(self, item: dict):
-            pk = item.get("pk")
-            if pk:
-                self.pending[pk] = item
+        def put_pending(self, tenant_id, phone, **attrs):
+            self.pending[(tenant_id, phone)] = attrs
 
-        def delete(self, key):
-            self.pending.pop(key, None)
+        def delete_pending(self, tenant_id, phone):
+            self.pending.pop((tenant_id, phone), None)
         
         def assign_agent(self, tenant_id, channel, channel_user_id, agent_id):
             self.assigned = {
@@ -0,0 +1,40 @@
+import time
+
+from src.common.aws import ddb_resource
+from src.lambdas.housekeeping import handler as housekeeping
+from src.services.spam_service import SpamService
+
+
+def test_housekeeping_deletes_only_stale_rows_without_ttl(aws_stack, monkeypatch):
+    # moto nie jest bezpieczne wątkowo i ignoruje Segment/TotalSegments
+    # (każdy segment zwróciłby całą tabelę) – jeden segment, stronicowany
+    monkeypatch.setattr(housekeeping, "HOUSEKEEPING_MAX_WORKERS", 1)
+    table = ddb_resource().Table("IntentsStats")
+    now = int(time.time())
+    old = now - 10 * 86400
+
+    with table.batch_writer() as batch:
+        for i in range(60):
+            batch.put_item(Item={"pk": f"legacy#{i}", "sk": "p", "cnt": 1, "last_ts": old})
+        batch.put_item(Item={"pk": "legacy#block", "sk": "p", "blocked_until": old})
+        batch.put_item(Item={"pk": "fresh", "sk": "p", "cnt": 1, "last_ts": now})
+        batch.put_item(Item={"pk": "ttl", "sk": "p", "cnt": 1, "last_ts": old, "expires_at": old + 86400})
+
+    resp = housekeeping.lambda_handler({"segments": 1}, None)
+
+    assert resp["statusCode"] == 200
+    left = {item["pk"] for item in table.scan()["Items"]}
+    assert left == {"fresh", "ttl"}
+
+
+def test_spam_counters_carry_expires_at(aws_stack):
+    svc = SpamService(now_fn=lambda: 1_700_000_000, max_per_bucket=1, tenant_shards=1,
+                      stats_max_age_seconds=3600, mode="ddb")
+
+    svc.is_blocked("t-ttl", "p1")
+    svc.is_blocked("t-ttl", "p1")  # przekroczenie -> pozycja blokady
+
+    items = [i for i in ddb_resource().Table("IntentsStats").scan()["Items"] if i["pk"].startswith("t-ttl#")]
+    assert len(items) == 3
+    for item in items:
+        assert int(item["expires_at"]) >= 1_700_000_000 + 3600
@@ -0,0 +1,118 @@
+import json
+
+import boto3
+from moto import mock_aws
+
+from src.services.intent_rules_service import IntentRulesService, compile_rules
+from src.services.nlu_service import NLUService
+from src.common.cache import TTLCache
+
+
+class FakeMetrics:
+    def __init__(self):
+        self.events = []
+
+    def incr(self, name, **labels):
+        self.events.append((name, labels))
+
+
+class FailingClient:
+    model = "test-model"
+
+    def classify(self, text, lang="pl"):
+        raise AssertionError("LLM nie powinien być wołany dla oczywistych intencji")
+
+
+def test_default_rules_short_circuit_obvious_intents():
+    metrics = FakeMetrics()
+    rules = IntentRulesService(bucket="", cache=TTLCache(), metrics=metrics)
+    nlu = NLUService(client=FailingClient(), cache=TTLCache(), metrics=metrics, pre_classifiers=[rules])
+
+    assert nlu.classify_intent("Godziny otwarcia?", "pl")["slots"] == {"topic": "hours"}
+    assert nlu.classify_intent("Cennik", "pl-PL")["slots"] == {"topic": "price"}
+    assert nlu.classify_intent("chcę rozmawiać z konsultantem", "pl")["intent"] == "handover"
+
+    assert rules.stats() == {"hits": 3, "misses": 0}
+    assert [labels["intent"] for name, labels in metrics.events if name == "nlu_rules"] == [
+        "faq",
+        "faq",
+        "handover",
+    ]
+
+
+def test_ambiguous_or_long_messages_fall_through_to_llm():
+    rules = IntentRulesService(bucket="", cache=TTLCache(), metrics=FakeMetrics(), max_words=6)
+
+    # dwa różne tematy naraz
+    assert rules.classify("cennik i godziny otwarcia", "pl") is None
+    # za długie na regułę
+    assert rules.classify("czy mogę przyjść jutro rano i zapytać o godziny", "pl") is None
+    # brak reguł dla języka
+    assert rules.classify("Öffnungszeiten", "de") is None
+    assert rules.stats()["misses"] == 3
+
+
+def test_rules_do_not_guess_on_reserve_cancel_negation_or_loose_words():
+    rules = IntentRulesService(bucket="", cache=TTLCache(), metrics=FakeMetrics(), max_words=10)
+
+    for text, lang in [
+        ("Chcę zarezerwować zajęcia na jutro", "pl"),
+        ("odwołaj moje zajęcia", "pl"),
+        ("I want to cancel my classes", "en"),
+        ("zmieniłem numer telefonu", "pl"),
+        ("nie chcę konsultanta", "pl"),
+        ("Please open a complaint", "en"),
+    ]:
+        assert rules.classify(text, lang) is None, text
+
+    assert rules.stats() == {"hits": 0, "misses": 6}
+
+
+def test_tenant_keywords_match_whole_words_and_fallthrough_still_applies():
+    compiled = compile_rules([{"intent": "faq", "slots": {"topic": "price"}, "keywords": ["karnet", "opłat*"]}])
+    regex = compiled[0].regex
+
+    assert regex.search("ile kosztuje karnet")
+    assert regex.search("jakie są opłaty")
+    assert not regex.search("karnety")
+    assert not regex.search("bezkarnet")
+
+    rules = IntentRulesService(bucket="", cache=TTLCache(), metrics=FakeMetrics())
+    rules.cache.set(("t-1", "pl"), compiled)
+    assert rules.classify("karnet", "pl", tenant_id="t-1")["slots"] == {"topic": "price"}
+    assert rules.classify("anuluj karnet", "pl", tenant_id="t-1") is None
+
+
+@mock_aws
+def test_tenant_rules_from_s3_are_compiled_once():
+    s3 = boto3.client("s3", region_name="eu-central-1")
+    s3.create_bucket(
+        Bucket="kb-rules",
+        CreateBucketConfiguration={"LocationConstraint": "eu-central-1"},
+    )
+    s3.put_object(
+        Bucket="kb-rules",
+        Key="t-1/intent_rules_pl.json",
+        Body=json.dumps(
+            [
+                {"intent": "faq", "slots": {"topic": "price"}, "keywords": ["karnet"]},
+                {"intent": "ticket", "patterns": [r"\breklamacj"], "confidence": 0.9},
+            ]
+        ).encode("utf-8"),
+    )
+
+    cache = TTLCache()
+    rules = IntentRulesService(bucket="kb-rules", cache=cache, metrics=FakeMetrics())
+
+    assert rules.classify("Ile kosztuje karnet?", "pl", tenant_id="t-1")["slots"] == {"topic": "price"}
+    assert rules.classify("reklamacja", "pl", tenant_id="t-1") == {
+        "intent": "ticket",
+        "confidence": 0.9,
+        "slots": {},
+    }
+    # reguły tenanta zastępują domyślne
+    assert rules.classify("cennik", "pl", tenant_id="t-1") is None
+    # drugi tenant bez pliku – reguły domyślne
+    assert rules.classify("cennik", "pl", tenant_id="t-2")["intent"] == "faq"
+
+    assert cache.stats()["misses"] == 2  # po jednym ładowaniu na (tenant, lang)
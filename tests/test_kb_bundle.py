@@ -0,0 +1,100 @@
+import json
+import threading
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from src.common.cache import TTLCache
+from src.common.kb_bundle import KbBundle, BundleFormatError, pack_bundle
+from src.services import kb_service
+from src.services.kb_service import KBService
+
+FAQS = {
+    "pl": {"Hours": "6-22", "parking": {"answer": "2h gratis", "questions": ["gdzie parkować"]}},
+    "en": {"hours": "6am-10pm"},
+}
+
+
+def test_bundle_roundtrip_and_binary_lookup():
+    bundle = KbBundle(pack_bundle(FAQS, built_at=123))
+
+    assert bundle.count == 3
+    assert bundle.built_at == 123
+    assert bundle.get("pl", "hours") == "6-22"
+    assert bundle.get("pl", " PARKING ") == "2h gratis"
+    assert bundle.get("en", "hours") == "6am-10pm"
+    assert bundle.get("en", "parking") is None
+    assert bundle.languages() == {"pl", "en"}
+
+    with pytest.raises(BundleFormatError):
+        KbBundle(b"not-a-bundle-at-all")
+
+
+@mock_aws
+def test_kb_service_serves_bundle_from_tmp_without_redownload(monkeypatch, tmp_path):
+    s3 = boto3.client("s3", region_name="eu-central-1")
+    s3.create_bucket(Bucket="kb-bundle", CreateBucketConfiguration={"LocationConstraint": "eu-central-1"})
+    s3.put_object(Bucket="kb-bundle", Key="t-1/kb_bundle.bin", Body=pack_bundle(FAQS))
+    # JSON per język nie powinien być czytany, gdy bundle ma dany język
+    s3.put_object(Bucket="kb-bundle", Key="t-1/faq_pl.json", Body=json.dumps({"hours": "stare"}).encode())
+
+    gets = []
+
+    class RecordingS3:
+        def get_object(self, **kwargs):
+            gets.append(kwargs)
+            return s3.get_object(**kwargs)
+
+    monkeypatch.setattr(kb_service, "s3_client", lambda: RecordingS3())
+
+    kb = KBService(cache=TTLCache(), bundle_dir=str(tmp_path))
+    kb.bucket = "kb-bundle"
+    assert kb.answer("hours", "t-1", "pl-PL") == "6-22"
+    assert kb.answer("parking", "t-1", "pl") == "2h gratis"
+    assert [g["Key"] for g in gets] == ["t-1/kb_bundle.bin"]
+    assert (tmp_path / "t-1.bin").exists()
+
+    # nowy cache w pamięci (np. po eviction) – plik z /tmp + ETag, S3 zwraca 304
+    kb2 = KBService(cache=TTLCache(), bundle_dir=str(tmp_path))
+    kb2.bucket = "kb-bundle"
+    assert kb2.answer("hours", "t-1", "en") == "6am-10pm"
+    assert gets[-1].get("IfNoneMatch")
+
+    # język spoza bundla – klasyczny faq_<lang>.json (tu brak) i DEFAULT_FAQ
+    assert kb.answer("hours", "t-1", "de") == kb_service.DEFAULT_FAQ["hours"]
+    assert gets[-1]["Key"] == "t-1/faq_de.json"
+
+
+def test_concurrent_bundle_writes_use_separate_temp_files(tmp_path):
+    target = tmp_path / "t-1.bin"
+    payloads = [bytes([i]) * 50_000 for i in range(8)]
+    threads = [threading.Thread(target=kb_service._atomic_write, args=(str(target), p)) for p in payloads]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert target.read_bytes() in payloads  # jedna pełna wersja, bez przeplotu
+    assert [p.name for p in tmp_path.iterdir()] == ["t-1.bin"]
+
+
+@mock_aws
+def test_replaced_bundle_mapping_is_closed(tmp_path):
+    s3 = boto3.client("s3", region_name="eu-central-1")
+    s3.create_bucket(Bucket="kb-bundle", CreateBucketConfiguration={"LocationConstraint": "eu-central-1"})
+    s3.put_object(Bucket="kb-bundle", Key="t-1/kb_bundle.bin", Body=pack_bundle(FAQS))
+    clock = [0.0]
+    cache = TTLCache()
+    kb = KBService(cache=cache, bundle_dir=str(tmp_path), now_fn=lambda: clock[0], ttl_seconds=300)
+    kb.bucket = "kb-bundle"
+
+    assert kb.answer("hours", "t-1", "pl") == "6-22"
+    old = cache.get(("t-1", "*"))["data"]
+
+    s3.put_object(Bucket="kb-bundle", Key="t-1/kb_bundle.bin", Body=pack_bundle({"pl": {"hours": "7-23"}}))
+    clock[0] += 301  # rewalidacja ETagu -> nowa wersja
+
+    assert kb.answer("hours", "t-1", "pl") == "7-23"
+    assert old.closed
+    assert not cache.get(("t-1", "*"))["data"].closed
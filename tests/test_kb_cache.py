@@ -0,0 +1,95 @@
+import json
+
+import boto3
+from moto import mock_aws
+
+from src.common.cache import TTLCache
+from src.services import kb_service
+from src.services.kb_service import KBService
+
+
+class Clock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+class RecordingS3:
+    """Przepuszcza wywołania do moto i zapisuje parametry get_object."""
+
+    def __init__(self, client):
+        self.client = client
+        self.gets = []
+
+    def get_object(self, **kwargs):
+        self.gets.append(kwargs)
+        return self.client.get_object(**kwargs)
+
+
+def _setup(monkeypatch):
+    s3 = boto3.client("s3", region_name="eu-central-1")
+    s3.create_bucket(Bucket="kb-cache", CreateBucketConfiguration={"LocationConstraint": "eu-central-1"})
+    recorder = RecordingS3(s3)
+    monkeypatch.setattr(kb_service, "s3_client", lambda: recorder)
+    clock = Clock()
+    kb = KBService(
+        cache=TTLCache(ttl_seconds=86400, now_fn=clock),
+        ttl_seconds=300,
+        negative_ttl_seconds=60,
+        now_fn=clock,
+        use_bundles=False,
+    )
+    kb.bucket = "kb-cache"
+    return s3, recorder, clock, kb
+
+
+@mock_aws
+def test_faq_is_revalidated_with_etag_after_ttl(monkeypatch):
+    s3, recorder, clock, kb = _setup(monkeypatch)
+    s3.put_object(Bucket="kb-cache", Key="t-1/faq_pl.json", Body=json.dumps({"hours": "6-22"}).encode())
+
+    assert kb.answer("hours", "t-1", "pl") == "6-22"
+    assert kb.answer("hours", "t-1", "pl-PL") == "6-22"  # ten sam klucz cache
+    assert len(recorder.gets) == 1
+
+    # po TTL: warunkowy GET -> 304, treść z cache
+    clock.t += 301
+    assert kb.answer("hours", "t-1", "pl") == "6-22"
+    assert len(recorder.gets) == 2
+    assert recorder.gets[1]["IfNoneMatch"]
+
+    # zmiana pliku w S3 widoczna po kolejnym TTL
+    s3.put_object(Bucket="kb-cache", Key="t-1/faq_pl.json", Body=json.dumps({"hours": "7-23"}).encode())
+    assert kb.answer("hours", "t-1", "pl") == "6-22"
+    clock.t += 301
+    assert kb.answer("hours", "t-1", "pl") == "7-23"
+
+
+@mock_aws
+def test_missing_faq_is_retried_after_negative_ttl(monkeypatch):
+    s3, recorder, clock, kb = _setup(monkeypatch)
+
+    assert kb._load_tenant_faq("t-2", "pl") is None
+    assert kb._load_tenant_faq("t-2", "pl") is None
+    assert len(recorder.gets) == 1
+
+    s3.put_object(Bucket="kb-cache", Key="t-2/faq_pl.json", Body=json.dumps({"price": "139 zł"}).encode())
+    clock.t += 61
+    assert kb.answer("price", "t-2", "pl") == "139 zł"
+    assert len(recorder.gets) == 2
+
+
+@mock_aws
+def test_faq_cache_evicts_least_recently_used(monkeypatch):
+    s3, recorder, clock, kb = _setup(monkeypatch)
+    kb.cache = TTLCache(maxsize=2, ttl_seconds=86400, now_fn=clock)
+    for lang in ("pl", "en", "de"):
+        s3.put_object(Bucket="kb-cache", Key=f"t-1/faq_{lang}.json", Body=json.dumps({"hours": lang}).encode())
+
+    for lang in ("pl", "en", "de"):
+        assert kb.answer("hours", "t-1", lang) == lang
+
+    assert len(kb.cache) == 2
+    assert kb.cache.stats()["evictions"] == 1
@@ -0,0 +1,99 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+np = pytest.importorskip("numpy")
+
+from src.scripts.build_faq_embeddings import build_index, upload_index
+from src.services.kb_service import KBService, FaqRetrievalStage
+
+VOCAB = ["basen", "sauna", "parking", "zaparkować", "auto", "karnet", "cena", "otwarty"]
+
+
+class BagOfWordsEmbedder:
+    """Deterministyczne 'embeddingi': liczność słów ze słownika."""
+
+    embedding_model = "bow-test"
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, texts, model=None):
+        self.calls += 1
+        return [[float(t.lower().count(w)) for w in VOCAB] for t in texts]
+
+
+FAQ = {
+    "parking": {
+        "answer": "Mamy 2 godziny bezpłatnego parkingu.",
+        "questions": ["gdzie zaparkować auto", "czy jest parking"],
+    },
+    "pool_hours": {"answer": "Basen jest czynny 6-21.", "questions": ["kiedy otwarty basen"]},
+    "membership_price": "Karnet od 139 zł.",
+}
+
+
+@mock_aws
+def test_semantic_search_matches_free_text_to_faq_topic():
+    s3 = boto3.client("s3", region_name="eu-central-1")
+    s3.create_bucket(Bucket="kb-sem", CreateBucketConfiguration={"LocationConstraint": "eu-central-1"})
+    s3.put_object(Bucket="kb-sem", Key="t-1/faq_pl.json", Body=json.dumps(FAQ).encode("utf-8"))
+
+    embedder = BagOfWordsEmbedder()
+    matrix, meta = build_index(FAQ, embedder.embed, embedder.embedding_model)
+    assert matrix.shape == (4, len(VOCAB))
+    assert meta["topics"] == ["parking", "parking", "pool_hours", "membership_price"]
+    upload_index("kb-sem", "t-1", "pl", matrix, meta)
+
+    kb = KBService(embedder=embedder)
+    kb.bucket = "kb-sem"
+
+    hits = kb.search("Gdzie mogę zaparkować auto?", "t-1", "pl-PL", threshold=0.5)
+    assert hits[0][0] == "parking"
+    assert hits[0][1] > 0.99
+
+    # brak podobnych pytań -> pusto, intent trafi do LLM
+    assert kb.search("Jak się nazywa trener?", "t-1", "pl", threshold=0.5) == []
+
+    stage = FaqRetrievalStage(kb=kb, threshold=0.5)
+    result = stage.classify("czy basen jest otwarty", "pl", tenant_id="t-1")
+    assert result["intent"] == "faq"
+    assert result["slots"] == {"topic": "pool_hours"}
+    # odpowiedź z wpisu z wariantami pytań
+    assert kb.answer("pool_hours", tenant_id="t-1", language_code="pl") == "Basen jest czynny 6-21."
+
+
+@mock_aws
+def test_search_without_index_does_not_call_embedder():
+    s3 = boto3.client("s3", region_name="eu-central-1")
+    s3.create_bucket(Bucket="kb-sem", CreateBucketConfiguration={"LocationConstraint": "eu-central-1"})
+
+    embedder = BagOfWordsEmbedder()
+    kb = KBService(embedder=embedder)
+    kb.bucket = "kb-sem"
+
+    assert kb.search("gdzie zaparkować", "t-2", "pl") == []
+    assert kb.search("gdzie zaparkować", "t-2", "pl") == []
+    assert embedder.calls == 0
+
+
+@mock_aws
+def test_repeated_text_is_embedded_once_and_load_errors_are_not_cached():
+    s3 = boto3.client("s3", region_name="eu-central-1")
+    embedder = BagOfWordsEmbedder()
+    kb = KBService(embedder=embedder)
+    kb.bucket = "kb-sem"
+
+    # bucket jeszcze nie istnieje (błąd S3, nie brak indeksu) – nie zapamiętujemy None
+    assert kb.search("gdzie zaparkować auto", "t-1", "pl") == []
+
+    s3.create_bucket(Bucket="kb-sem", CreateBucketConfiguration={"LocationConstraint": "eu-central-1"})
+    matrix, meta = build_index(FAQ, embedder.embed, embedder.embedding_model)
+    upload_index("kb-sem", "t-1", "pl", matrix, meta)
+    embedder.calls = 0
+
+    assert kb.search("Gdzie zaparkować auto?", "t-1", "pl", threshold=0.5)[0][0] == "parking"
+    assert kb.search("gdzie zaparkować  auto", "t-1", "pl", threshold=0.5)[0][0] == "parking"
+    assert embedder.calls == 1
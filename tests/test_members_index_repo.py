@@ -0,0 +1,23 @@
+from src.common.utils import normalize_phone
+from src.repos.members_index_repo import MembersIndexRepo
+
+
+def test_normalize_phone_to_e164():
+    assert normalize_phone("whatsapp:+48 600-100-200") == "+48600100200"
+    assert normalize_phone("0048600100200") == "+48600100200"
+    assert normalize_phone("+48600100200") == "+48600100200"
+    assert normalize_phone("") == ""
+    assert normalize_phone("whatsapp:") is None
+
+
+def test_find_by_phone_uses_gsi_query(aws_stack):
+    repo = MembersIndexRepo()
+    repo.put_member("t-1", "m-1", "whatsapp:+48 600 100 200", first_name="Ala")
+    repo.put_member("t-2", "m-2", "+48600100200")
+
+    member = repo.get_member("t-1", "whatsapp:+48600100200")
+    assert member["id"] == "m-1"
+    assert member["phone"] == "+48600100200"
+
+    assert repo.find_by_phone("t-2", "+48 600 100 200")["id"] == "m-2"
+    assert repo.find_by_phone("t-1", "+48999999999") is None
@@ -1,4 +1,6 @@
 import json
+import threading
+import time
 
 from src.lambdas.message_router import handler
 
@@ -29,7 +31,7 @@ def test_message_router_faq_to_outbound(monkeypatch):
     """
     Sprawdzamy glue:
     - event SQS -> Message -> ROUTER.handle
-    - reply trafia do sqs_client().send_message z właściwą kolejką/payloadem
+    - reply trafia do sqs_client().send_message_batch z właściwą kolejką/payloadem
     """
 
     actions = [
@@ -47,8 +49,10 @@ def test_message_router_faq_to_outbound(monkeypatch):
     sent_messages = []
 
     class DummySQS:
-        def send_message(self, QueueUrl, MessageBody):
-            sent_messages.append({"QueueUrl": QueueUrl, "MessageBody": MessageBody})
+        def send_message_batch(self, QueueUrl, Entries):
+            for e in Entries:
+                sent_messages.append({"QueueUrl": QueueUrl, "MessageBody": e["MessageBody"]})
+            return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
 
     # jeśli handler używa aws.sqs_client():
     if hasattr(handler, "aws"):
@@ -84,3 +88,152 @@ def test_message_router_faq_to_outbound(monkeypatch):
     payload = json.loads(sent_messages[0]["MessageBody"])
     assert payload["to"] == "whatsapp:+48123123123"
     assert "godzin" in payload["body"].lower() or "otwar" in payload["body"].lower()
+
+
+def test_message_router_reports_only_failed_records(monkeypatch):
+    """
+    Wyjątek w jednym rekordzie nie wywala całego batcha:
+    - pozostałe rekordy są przetworzone i ich odpowiedzi wysłane,
+    - w batchItemFailures jest tylko messageId rekordu, który padł.
+    """
+
+    class FlakyRouter:
+        def handle(self, msg):
+            if msg.body == "boom":
+                raise RuntimeError("router failed")
+            return [DummyAction({"to": msg.from_phone, "body": "ok", "tenant_id": "default"})]
+
+    monkeypatch.setattr(handler, "ROUTER", FlakyRouter())
+
+    sent_messages = []
+
+    class DummySQS:
+        def send_message_batch(self, QueueUrl, Entries):
+            sent_messages.extend(Entries)
+            return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+    monkeypatch.setattr(handler, "sqs_client", lambda: DummySQS(), raising=False)
+    monkeypatch.setenv("OutboundQueueUrl", "dummy-outbound-url")
+
+    def record(mid, phone, body):
+        return {
+            "messageId": mid,
+            "body": json.dumps({"from": phone, "to": "whatsapp:+48000", "body": body}),
+        }
+
+    event = {
+        "Records": [
+            record("m-1", "whatsapp:+48111", "hej"),
+            record("m-2", "whatsapp:+48222", "boom"),
+            record("m-3", "whatsapp:+48333", "hej"),
+        ]
+    }
+
+    result = handler.lambda_handler(event, None)
+
+    assert result["batchItemFailures"] == [{"itemIdentifier": "m-2"}]
+    assert len(sent_messages) == 2
+
+
+def test_message_router_reports_records_with_unsent_replies(monkeypatch):
+    monkeypatch.setattr(
+        handler,
+        "ROUTER",
+        DummyRouter([DummyAction({"to": "whatsapp:+48123", "body": "ok", "tenant_id": "default"})]),
+    )
+
+    class RejectingSQS:
+        def send_message_batch(self, QueueUrl, Entries):
+            return {
+                "Successful": [],
+                "Failed": [
+                    {"Id": e["Id"], "SenderFault": True, "Code": "InvalidMessageContents"}
+                    for e in Entries
+                ],
+            }
+
+    monkeypatch.setattr(handler, "sqs_client", lambda: RejectingSQS(), raising=False)
+    monkeypatch.setenv("OutboundQueueUrl", "dummy-outbound-url")
+
+    event = {
+        "Records": [
+            {"messageId": "m-1", "body": json.dumps({"from": "whatsapp:+48123", "body": "hej"})},
+        ]
+    }
+
+    result = handler.lambda_handler(event, None)
+
+    assert result["batchItemFailures"] == [{"itemIdentifier": "m-1"}]
+
+
+def test_message_router_parallel_keeps_per_user_order(monkeypatch):
+    """
+    Z ROUTER_MAX_CONCURRENCY > 1:
+    - różne rozmowy są routowane równolegle,
+    - rekordy jednego channel_user_id idą po kolei, a po błędzie
+      kolejne rekordy tej rozmowy też wracają do kolejki,
+    - odpowiedzi są publikowane w kolejności rekordów z batcha.
+    """
+    monkeypatch.setenv("ROUTER_MAX_CONCURRENCY", "4")
+    monkeypatch.setenv("OutboundQueueUrl", "dummy-outbound-url")
+
+    lock = threading.Lock()
+    in_flight = {"now": 0, "max": 0}
+    handled = []
+
+    class SlowRouter:
+        def handle(self, msg):
+            with lock:
+                in_flight["now"] += 1
+                in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            time.sleep(0.05)
+            with lock:
+                in_flight["now"] -= 1
+                handled.append(msg.body)
+            if msg.body == "b-1":
+                raise RuntimeError("router failed")
+            return [DummyAction({"to": msg.from_phone, "body": msg.body, "tenant_id": "default"})]
+
+    monkeypatch.setattr(handler, "ROUTER", SlowRouter())
+
+    sent_bodies = []
+
+    class DummySQS:
+        def send_message_batch(self, QueueUrl, Entries):
+            sent_bodies.extend(json.loads(e["MessageBody"])["body"] for e in Entries)
+            return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+    monkeypatch.setattr(handler, "sqs_client", lambda: DummySQS(), raising=False)
+
+    def record(mid, phone, body):
+        return {"messageId": mid, "body": json.dumps({"from": phone, "body": body})}
+
+    event = {
+        "Records": [
+            record("m-1", "whatsapp:+48111", "a-1"),
+            record("m-2", "whatsapp:+48222", "b-1"),
+            record("m-3", "whatsapp:+48111", "a-2"),
+            record("m-4", "whatsapp:+48222", "b-2"),
+            record("m-5", "whatsapp:+48333", "c-1"),
+        ]
+    }
+
+    result = handler.lambda_handler(event, None)
+
+    assert in_flight["max"] > 1
+    assert handled.index("a-1") < handled.index("a-2")
+    assert "b-2" not in handled
+    assert sent_bodies == ["a-1", "a-2", "c-1"]
+    assert result["batchItemFailures"] == [{"itemIdentifier": "m-2"}, {"itemIdentifier": "m-4"}]
+
+
+def test_router_pool_is_reused_and_threads_get_own_tables():
+    from src.repos.conversations_repo import ConversationsRepo
+
+    pool = handler._pool(2)
+    assert handler._pool(2) is pool
+
+    repo = ConversationsRepo()  # zbudowane w wątku głównym, jak ROUTER
+    tables = list(pool.map(lambda _: id(repo.table._table()), range(8)))
+
+    assert id(repo.table._table()) not in tables
@@ -0,0 +1,94 @@
+from src.services.nlu_service import NLUService
+from src.common.utils import normalize_text
+from src.repos.nlu_cache_repo import NluCacheRepo
+from src.common.cache import TTLCache
+
+
+class CountingClient:
+    model = "test-model"
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def classify(self, text, lang="pl"):
+        self.calls.append((text, lang))
+        return dict(self.result)
+
+
+class FakeMetrics:
+    def __init__(self):
+        self.events = []
+
+    def incr(self, name, **labels):
+        self.events.append((name, labels))
+
+
+def test_normalize_text_strips_case_punctuation_and_whitespace():
+    assert normalize_text("  Godziny   OTWARCIA?! ") == "godziny otwarcia"
+    assert normalize_text("Zajęcia, jutro.") == "zajęcia jutro"
+    assert normalize_text("!!!") == ""
+
+
+def test_classify_intent_hits_memory_cache_for_near_identical_text():
+    client = CountingClient({"intent": "faq", "confidence": 0.9, "slots": {"topic": "hours"}})
+    metrics = FakeMetrics()
+    nlu = NLUService(client=client, cache=TTLCache(), metrics=metrics, pre_classifiers=[])
+
+    first = nlu.classify_intent("Godziny otwarcia?", "pl")
+    second = nlu.classify_intent("godziny  otwarcia", "pl")
+    other_lang = nlu.classify_intent("godziny otwarcia", "en")
+
+    assert first == second == other_lang
+    assert len(client.calls) == 2  # pl (miss), en (miss)
+    results = [labels["result"] for name, labels in metrics.events if name == "nlu_cache"]
+    assert results == ["miss", "hit", "miss"]
+
+
+def test_classify_intent_does_not_cache_fallbacks():
+    client = CountingClient({"intent": "clarify", "confidence": 0.3, "slots": {"note": "LLM unavailable"}})
+    nlu = NLUService(client=client, cache=TTLCache(), metrics=FakeMetrics(), pre_classifiers=[])
+
+    nlu.classify_intent("cennik", "pl")
+    nlu.classify_intent("cennik", "pl")
+
+    assert len(client.calls) == 2
+
+
+def test_classify_intent_uses_shared_ddb_tier(aws_stack):
+    repo = NluCacheRepo(table_name="NluCache")
+    client = CountingClient({"intent": "faq", "confidence": 0.9, "slots": {"topic": "price"}})
+
+    # pierwszy "kontener" – klasyfikuje i zapisuje do DDB
+    NLUService(client=client, cache=TTLCache(), shared_cache=repo, metrics=FakeMetrics(), pre_classifiers=[]).classify_intent(
+        "Cennik", "pl"
+    )
+
+    # drugi "kontener" z pustym cache w pamięci – trafia w DDB
+    metrics = FakeMetrics()
+    nlu = NLUService(client=client, cache=TTLCache(), shared_cache=repo, metrics=metrics, pre_classifiers=[])
+    result = nlu.classify_intent("cennik!", "pl")
+
+    assert result["slots"] == {"topic": "price"}
+    assert len(client.calls) == 1
+    assert ("nlu_cache", {"result": "hit", "tier": "ddb"}) in metrics.events
+
+
+def test_results_with_user_data_slots_are_not_cached(aws_stack):
+    class EchoEmailClient(CountingClient):
+        def classify(self, text, lang="pl"):
+            self.calls.append((text, lang))
+            return {"intent": "pg_contract_status", "confidence": 0.9, "slots": {"email": text.split()[-1]}}
+
+    repo = NluCacheRepo(table_name="NluCache")
+    client = EchoEmailClient({})
+    nlu = NLUService(client=client, cache=TTLCache(), shared_cache=repo, metrics=FakeMetrics(), pre_classifiers=[])
+
+    # po normalizacji oba teksty dają ten sam klucz – nie mogą dzielić slotów
+    first = nlu.classify_intent("status umowy jan.kowalski@ex.pl", "pl")
+    second = nlu.classify_intent("status umowy jankowalski@expl", "pl")
+
+    assert first["slots"]["email"] == "jan.kowalski@ex.pl"
+    assert second["slots"]["email"] == "jankowalski@expl"
+    assert len(client.calls) == 2
+    assert repo.table.scan()["Items"] == []
@@ -123,3 +123,40 @@ def test_outbound_sender_web_without_queue(monkeypatch):
     assert res["statusCode"] == 200
     # brak WebOutboundEventsQueueUrl => nie wywołaliśmy SQS
     assert sent_to_web == []
+
+
+def test_outbound_sender_reports_only_failed_records(monkeypatch):
+    """
+    Błąd Twilio dla jednej wiadomości nie powoduje ponownej wysyłki
+    pozostałych – w batchItemFailures jest tylko nieudany rekord.
+    """
+    sent = []
+
+    class FlakyTwilio:
+        def send_text(self, to, body):
+            if to == "whatsapp:+48999":
+                return {"status": "ERROR", "error": "boom"}
+            sent.append(to)
+            return {"status": "OK", "sid": "fake-sid"}
+
+    monkeypatch.setattr(handler, "twilio", FlakyTwilio())
+
+    def record(mid, to):
+        return {
+            "messageId": mid,
+            "body": json.dumps({"channel": "whatsapp", "to": to, "body": "Hej!", "tenant_id": "default"}),
+        }
+
+    event = {
+        "Records": [
+            record("m-1", "whatsapp:+48123"),
+            record("m-2", "whatsapp:+48999"),
+            {"messageId": "m-3", "body": "{not-json"},
+        ]
+    }
+
+    res = handler.lambda_handler(event, None)
+
+    assert res["statusCode"] == 200
+    assert res["batchItemFailures"] == [{"itemIdentifier": "m-2"}]
+    assert sent == ["whatsapp:+48123"]
@@ -0,0 +1,122 @@
+import asyncio
+
+import httpx
+
+from src.adapters import perfectgym_client as pgc
+from src.adapters.perfectgym_client import PerfectGymClient
+from src.common.config import settings
+
+
+class _Resp:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def raise_for_status(self):
+        return None
+
+    def json(self):
+        return self._payload
+
+
+class RecordingSession:
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        return _Resp({"value": [{"url": url}]})
+
+
+def test_shared_session_is_pooled_and_reused(monkeypatch):
+    pgc.reset_pg_session()
+    monkeypatch.setattr(pgc, "PG_POOL_SIZE", 7)
+    try:
+        session = pgc.pg_session()
+        assert pgc.pg_session() is session
+        assert PerfectGymClient().session is session
+        adapter = session.get_adapter("https://example.perfectgym.com")
+        assert adapter._pool_maxsize == 7
+    finally:
+        pgc.reset_pg_session()
+
+
+def test_requests_use_per_endpoint_timeouts(monkeypatch):
+    monkeypatch.setattr(settings, "pg_base_url", "https://example.perfectgym.com")
+    monkeypatch.setitem(pgc.PG_READ_TIMEOUTS, "contracts", 2.5)
+    session = RecordingSession()
+    client = PerfectGymClient(session=session)
+
+    client.get_contracts_by_email_and_phone("a@b.pl", "+48123")
+    client.get_available_classes(top=5)
+
+    (contracts_url, contracts_kw), (classes_url, classes_kw) = session.calls
+    assert contracts_url.endswith("/Contracts")
+    assert contracts_kw["timeout"] == (pgc.PG_CONNECT_TIMEOUT, 2.5)
+    assert classes_url.endswith("/Classes")
+    assert classes_kw["timeout"] == pgc.pg_timeout("classes")
+    assert classes_kw["params"]["$top"] == "5"
+
+
+def test_async_entry_point_builds_same_request(monkeypatch):
+    monkeypatch.setattr(settings, "pg_base_url", "https://example.perfectgym.com")
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(request)
+        return httpx.Response(200, json={"value": [{"id": 1}, {"id": 2}]})
+
+    client = PerfectGymClient(async_transport=httpx.MockTransport(handler))
+
+    async def run():
+        async with client:
+            return await asyncio.gather(
+                client.get_contracts_by_email_and_phone_async("a@b.pl", "+48123"),
+                client.get_member_balance_async(42),
+            )
+
+    contracts, balance = asyncio.run(run())
+
+    assert len(contracts["value"]) == 2
+    assert balance == {"value": [{"id": 1}, {"id": 2}]}
+    assert seen[0].url.path == "/Contracts"
+    assert "Member/email eq 'a@b.pl'" in seen[0].url.params["$filter"]
+    assert seen[1].url.path == "/Members(42)/Balance"
+    assert client._async_client is None
+
+
+def test_async_error_falls_back_to_empty(monkeypatch):
+    monkeypatch.setattr(settings, "pg_base_url", "https://example.perfectgym.com")
+    client = PerfectGymClient(async_transport=httpx.MockTransport(lambda request: httpx.Response(503)))
+
+    async def run():
+        async with client:
+            return await client.get_available_classes_async()
+
+    assert asyncio.run(run()) == {"value": []}
+
+
+def test_async_client_is_not_kept_across_event_loops(monkeypatch):
+    monkeypatch.setattr(settings, "pg_base_url", "https://example.perfectgym.com")
+    opened = []
+
+    class TrackingClient(httpx.AsyncClient):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            opened.append(self)
+
+    monkeypatch.setattr(pgc.httpx, "AsyncClient", TrackingClient)
+    client = PerfectGymClient(async_transport=httpx.MockTransport(lambda r: httpx.Response(200, json={"value": []})))
+
+    async def scoped():
+        async with client:
+            await client.get_member_balance_async(1)
+            await client.get_member_balance_async(2)
+
+    # każde asyncio.run (nowa pętla, jak kolejne wywołania Lambdy) zamyka swojego klienta
+    asyncio.run(scoped())
+    asyncio.run(scoped())
+    asyncio.run(client.get_member_balance_async(3))  # poza `async with` – klient na jedno wywołanie
+
+    assert len(opened) == 3
+    assert all(c.is_closed for c in opened)
+    assert client._async_client is None
@@ -40,19 +40,14 @@ def test_pg_available_classes_happy_path(requests_mock, mock_ai, monkeypatch):
             self.data.setdefault(key, {}).update(attrs)
 
         # używane w handle() przy pending rezerwacji
-        def _pending_key(self, phone):
-            return f"pending#{phone}"
+        def get_pending(self, tenant_id, phone):
+            return self.pending.get((tenant_id, phone))
 
-        def get(self, key):
-            return self.pending.get(key)
+        def put_pending(self, tenant_id, phone, **attrs):
+            self.pending[(tenant_id, phone)] = attrs
 
-        def put(self, item: dict):
-            key = item.get("pk")
-            if key:
-                self.pending[key] = item
-
-        def delete(self, key):
-            self.pending.pop(key, None)
+        def delete_pending(self, tenant_id, phone):
+            self.pending.pop((tenant_id, phone), None)
 
         def set_language(self, tenant_id, phone, new_lang):
             return None
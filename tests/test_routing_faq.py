@@ -3,7 +3,7 @@ from src.domain.models import Message
 
 def test_faq_intent_uses_kb_service_answer():
     class DummyNLU:
-        def classify_intent(self, text: str, lang: str | None):
+        def classify_intent(self, text: str, lang: str | None, tenant_id="default"):
             return {
                 "intent": "faq",
                 "confidence": 0.9,
@@ -60,13 +60,11 @@ def test_faq_intent_uses_kb_service_answer():
             def get_conversation(self, tenant_id, channel, channel_user_id):
                 return None
 
-            def get(self, pk):
-                return self._store.get(pk)
+            def get_pending(self, tenant_id, phone):
+                return self._store.get((tenant_id, phone))
 
-            def put(self, item):
-                pk = item.get("pk")
-                if pk:
-                    self._store[pk] = item
+            def put_pending(self, tenant_id, phone, **attrs):
+                self._store[(tenant_id, phone)] = attrs
 
         class DummyMessages:
             def save_inbound(self, *args, **kwargs):
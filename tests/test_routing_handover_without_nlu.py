@@ -6,7 +6,7 @@ def test_handover_without_nlu_uses_precomputed_intent(monkeypatch):
     called = {"nlu_called": False}
 
     class DummyNLU:
-        def classify_intent(self, text: str, lang: str | None):
+        def classify_intent(self, text: str, lang: str | None, tenant_id="default"):
             called["nlu_called"] = True
             return {
                 "intent": "faq",
@@ -27,16 +27,14 @@ def test_handover_without_nlu_uses_precomputed_intent(monkeypatch):
             # symulacja zapisania handoveru
             self.last_upsert = kwargs
 
-        def get(self, key):
-            return self.pending.get(key)
+        def get_pending(self, tenant_id, phone):
+            return self.pending.get((tenant_id, phone))
 
-        def put(self, item: dict):
-            pk = item.get("pk")
-            if pk:
-                self.pending[pk] = item
+        def put_pending(self, tenant_id, phone, **attrs):
+            self.pending[(tenant_id, phone)] = attrs
 
-        def delete(self, key):
-            self.pending.pop(key, None)
+        def delete_pending(self, tenant_id, phone):
+            self.pending.pop((tenant_id, phone), None)
 
         def assign_agent(self, tenant_id, channel, channel_user_id, agent_id):
             self.assigned = {
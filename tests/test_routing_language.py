@@ -17,16 +17,15 @@ class FakeConvRepo:
         self.last_upsert = {"tenant_id": tenant_id, "channel": channel, "channel_user_id":channel_user_id, **kwargs}
         return self.last_upsert
 
-    def put(self, item: dict):
-        key = item["pk"]
-        self.pending[key] = dict(item)
-        
-    def get(self, pk: str):
+    def put_pending(self, tenant_id: str, phone: str, **attrs):
+        self.pending[(tenant_id, phone)] = dict(attrs)
+
+    def get_pending(self, tenant_id: str, phone: str):
         return None
 
-    def delete(self, key: str):
-        self.deleted.append(key)
-        self.pending.pop(key, None)
+    def delete_pending(self, tenant_id: str, phone: str):
+        self.deleted.append((tenant_id, phone))
+        self.pending.pop((tenant_id, phone), None)
 
     def find_by_verification_code(self, tenant_id, verification_code):
         return None
@@ -50,7 +49,7 @@ def test_routing_uses_tenant_language_for_nlu_and_kb(monkeypatch):
     # 1) Patch NLUService.classify_intent i KBService.answer, żeby zebrać użyte lang
     called = {}
 
-    def fake_classify_intent(self, text: str, lang: str):
+    def fake_classify_intent(self, text: str, lang: str, tenant_id="default"):
         called["nlu_lang"] = lang
         return {"intent": "faq", "confidence": 0.9, "slots": {"topic": "hours"}}
 
@@ -100,7 +99,7 @@ def test_routing_prefers_existing_conversation_language(monkeypatch):
     """
     called = {}
 
-    def fake_classify_intent(self, text: str, lang: str):
+    def fake_classify_intent(self, text: str, lang: str, tenant_id="default"):
         called["nlu_lang"] = lang
         return {"intent": "faq", "confidence": 0.9, "slots": {"topic": "hours"}}
 
@@ -6,7 +6,7 @@ class DummyNLU:
     def __init__(self, result):
         self._result = result
 
-    def classify_intent(self, text: str, lang: str | None):
+    def classify_intent(self, text: str, lang: str | None, tenant_id="default"):
         return self._result
 
 
@@ -62,13 +62,11 @@ class DummyRepos:
         def get_conversation(self, tenant_id, channel, channel_user_id):
             return None
 
-        def get(self, pk):
-            return self._store.get(pk)
+        def get_pending(self, tenant_id, phone):
+            return self._store.get((tenant_id, phone))
 
-        def put(self, item):
-            pk = item.get("pk")
-            if pk:
-                self._store[pk] = item
+        def put_pending(self, tenant_id, phone, **attrs):
+            self._store[(tenant_id, phone)] = attrs
 
     class DummyMessages:
         def save_inbound(self, *args, **kwargs):
@@ -0,0 +1,164 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from src.common.cache import TTLCache
+from src.services.schedule_service import ScheduleService, SPOT_FIELDS
+
+
+class FakeMetrics:
+    def __init__(self):
+        self.calls = []
+
+    def incr(self, name, **labels):
+        self.calls.append((name, labels))
+
+
+class FakePG:
+    def __init__(self, classes, delay=0.0):
+        self.classes = classes
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def iter_available_classes(self, from_iso=None, to_iso=None, club_id=None, fields=None, **kw):
+        with self._lock:
+            self.calls.append({"club_id": club_id, "from": from_iso, "to": to_iso, "fields": fields})
+        time.sleep(self.delay)
+        if fields:
+            return [{f: c.get(f) for f in fields} for c in self.classes]
+        return [dict(c) for c in self.classes]
+
+
+CLASSES = [
+    {"id": 1, "startDate": "2026-03-02T10:00:00+01:00", "attendeesCount": 3, "attendeesLimit": 10,
+     "classType": {"name": "Zumba"}},
+    {"id": 2, "startDate": "2026-03-03T18:00:00+01:00", "attendeesCount": 0, "attendeesLimit": 12,
+     "classType": {"name": "Yoga"}},
+    {"id": 3, "startDate": "2026-03-05T07:30:00+01:00", "attendeesCount": 9, "attendeesLimit": 9,
+     "classType": {"name": "Crossfit"}},
+]
+
+
+class Clock:
+    def __init__(self):
+        self.t = 1000.0
+        self.wall = datetime(2026, 3, 2, 6, 0, tzinfo=timezone.utc)
+
+    def __call__(self):
+        return self.t
+
+
+def _service(pg, clock, **kw):
+    return ScheduleService(
+        pg=pg,
+        cache=TTLCache(ttl_seconds=300, now_fn=clock),
+        metrics=FakeMetrics(),
+        now_fn=clock,
+        utcnow_fn=lambda: clock.wall,
+        **kw,
+    )
+
+
+def test_window_is_cached_and_filtered_in_memory():
+    clock = Clock()
+    pg = FakePG(CLASSES)
+    svc = _service(pg, clock)
+
+    assert [c["id"] for c in svc.list_classes("t1")] == [1, 2, 3]
+    assert [c["id"] for c in svc.list_classes("t1", date_from="2026-03-03")] == [2, 3]
+    assert [c["id"] for c in svc.list_classes("t1", date_from="2026-03-03", date_to="2026-03-03")] == [2]
+    assert [c["id"] for c in svc.list_classes("t1", limit=1)] == [1]
+    assert len(pg.calls) == 1
+    assert pg.calls[0]["to"] is not None
+
+    # inny klub = osobne okno z filtrem po stronie PG
+    svc.list_classes("t1", club_id=7)
+    assert pg.calls[-1]["club_id"] == 7
+    assert len(pg.calls) == 2
+
+
+def test_started_classes_drop_out_and_window_expires():
+    clock = Clock()
+    pg = FakePG(CLASSES)
+    svc = _service(pg, clock, spots_ttl_seconds=10_000)
+
+    svc.list_classes("t1")
+    clock.wall = datetime(2026, 3, 2, 9, 30, tzinfo=timezone.utc)  # Zumba (9:00 UTC) już trwa
+    assert [c["id"] for c in svc.list_classes("t1")] == [2, 3]
+    assert len(pg.calls) == 1
+
+    clock.t += 301
+    svc.list_classes("t1")
+    assert len(pg.calls) == 2
+
+
+def test_spot_counts_refresh_incrementally():
+    clock = Clock()
+    pg = FakePG([dict(c) for c in CLASSES])
+    svc = _service(pg, clock, spots_ttl_seconds=30)
+
+    svc.list_classes("t1")
+    pg.classes[1]["attendeesCount"] = 12
+    pg.classes[1]["classType"] = {"name": "changed"}
+
+    assert svc.list_classes("t1")[1]["attendeesCount"] == 0  # jeszcze świeże
+
+    clock.t += 31
+    yoga = svc.list_classes("t1")[1]
+    assert yoga["attendeesCount"] == 12
+    assert yoga["classType"] == {"name": "Yoga"}  # reszta z okna, tylko liczniki z PG
+    assert pg.calls[-1]["fields"] == SPOT_FIELDS
+    assert len(pg.calls) == 2
+
+
+def test_concurrent_misses_share_one_upstream_call():
+    clock = Clock()
+    pg = FakePG(CLASSES, delay=0.1)
+    svc = _service(pg, clock)
+    results = []
+
+    def worker():
+        results.append(len(svc.list_classes("t-coalesce")))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [3] * 8
+    assert len(pg.calls) == 1
+    outcomes = [labels["result"] for name, labels in svc.metrics.calls if name == "pg_schedule_cache"]
+    assert outcomes.count("miss") == 1
+    assert outcomes.count("coalesced") == 7
+
+
+def test_empty_schedule_uses_short_ttl():
+    clock = Clock()
+    pg = FakePG([])
+    svc = _service(pg, clock, empty_ttl_seconds=20)
+
+    assert svc.list_classes("t1") == []
+    clock.t += 21
+    svc.list_classes("t1")
+    assert len(pg.calls) == 2
+
+
+def test_pg_error_mid_pagination_keeps_fetched_pages_on_short_ttl():
+    class FlakyPG(FakePG):
+        def iter_available_classes(self, **kw):
+            self.calls.append(kw)
+            yield dict(CLASSES[0])
+            raise requests.ConnectionError("PG reset")
+
+    clock = Clock()
+    pg = FlakyPG(CLASSES)
+    svc = _service(pg, clock, empty_ttl_seconds=20)
+
+    assert [c["id"] for c in svc.list_classes("t1")] == [1]
+    clock.t += 21
+    svc.list_classes("t1")
+    assert len(pg.calls) == 2
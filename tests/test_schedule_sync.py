@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta, timezone
+
+from src.adapters.perfectgym_client import PerfectGymClient
+from src.common.aws import ddb_resource
+from src.common.cache import TTLCache
+from src.common.config import settings
+from src.lambdas.schedule_sync import handler as schedule_sync
+from src.repos.class_schedule_repo import ClassScheduleRepo
+from src.services.schedule_service import ScheduleService
+
+
+class _Resp:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def raise_for_status(self):
+        return None
+
+    def json(self):
+        return self._payload
+
+
+class PagedSession:
+    """Odpowiedzi /Classes podzielone na strony z @odata.nextLink."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.urls = []
+
+    def get(self, url, params=None, **kwargs):
+        self.urls.append(url)
+        idx = len(self.urls) - 1
+        payload = {"value": self.pages[idx]}
+        if idx + 1 < len(self.pages):
+            payload["@odata.nextLink"] = f"Classes?$skip={(idx + 1) * 2}"
+        return _Resp(payload)
+
+
+class FakeMetrics:
+    def __init__(self):
+        self.events = []
+
+    def incr(self, name, **labels):
+        self.events.append((name, labels))
+
+
+class FailingPG:
+    def iter_available_classes(self, **kwargs):
+        raise AssertionError("router nie powinien wołać PG, gdy grafik jest w DDB")
+
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def _cls(cid, hours, club=1, count=0, limit=10, name="Zumba"):
+    start = (NOW + timedelta(hours=hours)).isoformat()
+    return {"id": cid, "startDate": start, "clubId": club, "attendeesCount": count,
+            "attendeesLimit": limit, "classType": {"name": name, "description": "x" * 50}}
+
+
+def test_sync_follows_next_link_and_drops_stale_rows(aws_stack, monkeypatch):
+    monkeypatch.setattr(settings, "pg_base_url", "https://example.perfectgym.com/odata")
+    repo = ClassScheduleRepo(table_name="ClassSchedule")
+    repo.put_classes("t1", [_cls(99, 30)], synced_at=1)  # odwołane od poprzedniej synchronizacji
+
+    session = PagedSession([[_cls(1, 2), _cls(2, 26, club=2)], [_cls(3, 50, count=10)]])
+    pg = PerfectGymClient(session=session)
+
+    result = schedule_sync.sync_tenant("t1", pg, repo, days=7, now=NOW)
+
+    assert result == {"tenant_id": "t1", "written": 3, "deleted": 1}
+    assert session.urls[1] == "https://example.perfectgym.com/odata/Classes?$skip=2"
+    rows = repo.query_classes("t1", NOW.date().isoformat())
+    assert [r["id"] for r in rows] == [1, 2, 3]
+    assert rows[0]["classType"] == {"name": "Zumba"}
+    assert [r["id"] for r in repo.query_classes("t1", NOW.date().isoformat(), club_id=2)] == [2]
+    assert repo.get_sync_state("t1")["count"] == 3
+
+
+def test_router_schedule_reads_synced_table(aws_stack):
+    repo = ClassScheduleRepo(table_name="ClassSchedule")
+    repo.put_classes("t1", [_cls(1, 2), _cls(2, 26, club=2)], synced_at=int(NOW.timestamp()))
+    repo.put_sync_state("t1", int(NOW.timestamp()), (NOW + timedelta(days=14)).isoformat(), 2)
+
+    svc = ScheduleService(pg=FailingPG(), cache=TTLCache(), metrics=FakeMetrics(), repo=repo)
+
+    assert [c["id"] for c in svc.list_classes("t1")] == [1, 2]
+    assert [c["id"] for c in svc.list_classes("t1", club_id=2)] == [2]
+
+
+def test_stale_sync_falls_back_to_pg(aws_stack):
+    repo = ClassScheduleRepo(table_name="ClassSchedule")
+    repo.put_sync_state("t1", int(NOW.timestamp()) - 7200, NOW.isoformat(), 0)
+
+    class PG:
+        calls = 0
+
+        def iter_available_classes(self, **kwargs):
+            PG.calls += 1
+            return [_cls(7, 3)]
+
+    svc = ScheduleService(pg=PG(), cache=TTLCache(), metrics=FakeMetrics(), repo=repo,
+                          sync_max_age_seconds=3600)
+
+    assert [c["id"] for c in svc.list_classes("t1")] == [7]
+    assert PG.calls == 1
+
+
+def test_handler_isolates_tenant_failures(monkeypatch, aws_stack):
+    def fake_sync(tenant_id, pg, repo, **kw):
+        if tenant_id == "bad":
+            raise RuntimeError("PG 503")
+        return {"tenant_id": tenant_id, "written": 0, "deleted": 0}
+
+    monkeypatch.setattr(schedule_sync, "sync_tenant", fake_sync)
+
+    resp = schedule_sync.lambda_handler({"tenants": ["bad", "ok"]}, None)
+
+    assert resp["failed"] == 1
+    assert [r["tenant_id"] for r in resp["synced"]] == ["ok"]
+
+
+def test_router_pg_fallback_reads_all_pages(monkeypatch):
+    monkeypatch.setattr(settings, "pg_base_url", "https://example.perfectgym.com/odata")
+    session = PagedSession([[_cls(1, 2), _cls(2, 5)], [_cls(3, 8)]])
+    svc = ScheduleService(pg=PerfectGymClient(session=session), cache=TTLCache(), metrics=FakeMetrics())
+
+    assert [c["id"] for c in svc.list_classes("t1")] == [1, 2, 3]
+    assert len(session.urls) == 2
+
+
+def test_handler_syncs_every_tenant_from_table(monkeypatch, aws_stack):
+    monkeypatch.delenv("SCHEDULE_SYNC_TENANTS", raising=False)
+    tenants = ddb_resource().Table("Tenants")
+    for tenant_id in ("club-b", "club-a"):
+        tenants.put_item(Item={"tenant_id": tenant_id, "language_code": "pl"})
+    synced = []
+    monkeypatch.setattr(schedule_sync, "sync_tenant",
+                        lambda tenant_id, pg, repo, **kw: synced.append(tenant_id) or {"tenant_id": tenant_id})
+
+    schedule_sync.lambda_handler({}, None)
+    assert synced == ["club-a", "club-b"]
+
+    monkeypatch.setenv("SCHEDULE_SYNC_TENANTS", "club-b")
+    schedule_sync.lambda_handler({}, None)
+    assert synced[-1:] == ["club-b"]
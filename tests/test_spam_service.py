@@ -1,6 +1,10 @@
 import uuid
-from src.services.spam_service import SpamService
+
+import pytest
+
+from src.services.spam_service import SpamService, TOTAL_SK
 from src.common.aws import ddb_resource
+from src.common.cache import TTLCache, MISSING
 
 
 def test_spam_service_blocks_after_limit(aws_stack):
@@ -26,3 +30,162 @@ def test_spam_service_blocks_after_limit(aws_stack):
     # Pierwsze 3 wiadomości przechodzą, 4 i 5 są blokowane
     assert blocked_flags[:3] == [False, False, False]
     assert blocked_flags[3:] == [True, True]
+
+
+class Clock:
+    def __init__(self, ts):
+        self.ts = ts
+
+    def __call__(self):
+        return self.ts
+
+
+def test_spam_service_honours_bucket_seconds_and_block_outlives_window(aws_stack):
+    clock = Clock(1_700_000_000 - 1_700_000_000 % 10)
+    svc = SpamService(now_fn=clock, bucket_seconds=10, max_per_bucket=2, tenant_max_per_bucket=1000,
+                      local_state=TTLCache(), mode="ddb")
+    tenant = f"t-{uuid.uuid4().hex}"
+
+    assert [svc.is_blocked(tenant, "p1") for _ in range(3)] == [False, False, True]
+
+    # nowe 10-sekundowe okno, ale blokada (bucket_seconds) jeszcze trwa
+    clock.ts += 9
+    assert svc.is_blocked(tenant, "p1") is True
+    clock.ts += 1
+    assert svc.is_blocked(tenant, "p1") is False
+    # inny numer nie jest dotknięty blokadą
+    assert svc.is_blocked(tenant, "p2") is False
+
+
+def test_spam_service_tenant_limit_and_single_round_trip(aws_stack, monkeypatch):
+    svc = SpamService(now_fn=lambda: 1_700_000_000, max_per_bucket=5, tenant_max_per_bucket=3, mode="ddb",
+                      tenant_shards=1)
+    tenant = f"t-{uuid.uuid4().hex}"
+    calls = []
+    original = svc.table.meta.client.transact_write_items
+
+    def counting(**kwargs):
+        calls.append(kwargs)
+        return original(**kwargs)
+
+    monkeypatch.setattr(svc.table.meta.client, "transact_write_items", counting)
+
+    flags = [svc.is_blocked(tenant, f"p{i}") for i in range(4)]
+
+    assert flags == [False, False, False, True]
+    assert len(calls) == 4  # jedno wywołanie DDB na wiadomość
+    # limit tenanta nie blokuje numeru na przyszłość
+    assert ddb_resource().Table("IntentsStats").get_item(Key={"pk": f"{tenant}#blocked", "sk": "p3"}).get("Item") is None
+
+
+class FakeTenants:
+    def __init__(self, items):
+        self.items = items
+
+    def get(self, tenant_id):
+        return self.items.get(tenant_id)
+
+
+def _count_transactions(svc, monkeypatch):
+    calls = []
+    original = svc.table.meta.client.transact_write_items
+
+    def counting(**kwargs):
+        calls.append(kwargs)
+        return original(**kwargs)
+
+    monkeypatch.setattr(svc.table.meta.client, "transact_write_items", counting)
+    return calls
+
+
+def test_flood_from_one_number_is_rejected_in_memory(aws_stack, monkeypatch):
+    clock = Clock(1_700_000_000)
+    svc = SpamService(now_fn=clock, bucket_seconds=60, max_per_bucket=3, tenant_max_per_bucket=1000,
+                      local_state=TTLCache(), tenants=FakeTenants({}), mode="hybrid")
+    calls = _count_transactions(svc, monkeypatch)
+
+    flags = [svc.is_blocked("t1", "p1") for _ in range(50)]
+
+    assert flags[:3] == [False] * 3
+    assert all(flags[3:])
+    assert len(calls) == 3  # tylko dozwolone wiadomości dotykają DDB
+
+    # blokada lokalna trwa bucket_seconds, potem bucket jest znowu pełny
+    clock.ts += 60
+    assert svc.is_blocked("t1", "p1") is False
+
+
+def test_ddb_block_is_cached_locally(aws_stack, monkeypatch):
+    svc = SpamService(now_fn=lambda: 1_700_000_000, max_per_bucket=2, tenant_max_per_bucket=1000,
+                      local_state=TTLCache(), tenants=FakeTenants({}), mode="ddb")
+    calls = _count_transactions(svc, monkeypatch)
+
+    flags = [svc.is_blocked("t1", "p1") for _ in range(10)]
+
+    assert flags == [False, False] + [True] * 8
+    assert len(calls) == 3  # trzecia wiadomość ustawia blokadę, reszta z cache
+
+
+def test_limiter_mode_is_configurable_per_tenant(aws_stack, monkeypatch):
+    tenants = FakeTenants({
+        "local-tenant": {"spam_limiter": {"mode": "local"}},
+        "lazy-tenant": {"spam_limiter": {"mode": "hybrid", "local_ddb_ratio": 0.5}},
+    })
+    svc = SpamService(now_fn=lambda: 1_700_000_000, max_per_bucket=4, tenant_max_per_bucket=1000,
+                      local_state=TTLCache(), tenants=tenants, mode="ddb")
+    calls = _count_transactions(svc, monkeypatch)
+
+    assert [svc.is_blocked("local-tenant", "p1") for _ in range(5)] == [False] * 4 + [True]
+    assert calls == []
+
+    # hybrid z ratio 0.5: pierwsze 2 z 4 wiadomości bez DDB, dalej DDB
+    assert [svc.is_blocked("lazy-tenant", "p1") for _ in range(4)] == [False] * 4
+    assert len(calls) == 2
+
+    svc.is_blocked("default-tenant", "p1")
+    assert len(calls) == 3
+
+
+def test_tenant_counter_is_sharded(aws_stack):
+    shards = iter(range(1000))
+    svc = SpamService(now_fn=lambda: 1_700_000_000, max_per_bucket=100, tenant_max_per_bucket=8,
+                      local_state=TTLCache(), tenants=FakeTenants({}), mode="ddb",
+                      tenant_shards=4, shard_fn=lambda: next(shards) % 4)
+    tenant = f"t-{uuid.uuid4().hex}"
+
+    flags = [svc.is_blocked(tenant, f"p{i}") for i in range(9)]
+
+    assert flags == [False] * 8 + [True]
+    assert svc.tenant_count(tenant) == 8
+    pk = f"{tenant}#{svc._bucket_for_ts(1_700_000_000)}"
+    table = ddb_resource().Table("IntentsStats")
+    counts = [int(table.get_item(Key={"pk": pk, "sk": f"__TOTAL__#{i}"})["Item"]["cnt"]) for i in range(4)]
+    assert counts == [2, 2, 2, 2]
+
+
+def test_full_shard_retries_other_shard_and_caches_block_only_at_tenant_limit(aws_stack):
+    svc = SpamService(now_fn=lambda: 1_700_000_000, max_per_bucket=100, tenant_max_per_bucket=8,
+                      local_state=TTLCache(), tenants=FakeTenants({}), mode="ddb",
+                      tenant_shards=4, shard_fn=lambda: 0)
+    tenant = f"t-{uuid.uuid4().hex}"
+
+    # shard 0 zapełnia się po 2 wiadomościach – kolejne trafiają do wolnych shardów
+    assert [svc.is_blocked(tenant, f"p{i}") for i in range(8)] == [False] * 8
+    assert svc.local.get(("blocked", tenant, TOTAL_SK)) is MISSING
+
+    assert svc.is_blocked(tenant, "p8") is True
+    assert svc.tenant_shard_counts(tenant) == {0: 2, 1: 2, 2: 2, 3: 2}
+    assert svc.local.get(("blocked", tenant, TOTAL_SK)) is not MISSING
+
+
+@pytest.mark.parametrize("limit, shards", [(300, 8), (3, 8), (10, 3)])
+def test_random_shards_enforce_exact_tenant_limit(aws_stack, limit, shards):
+    svc = SpamService(now_fn=lambda: 1_700_000_000, max_per_bucket=1000, tenant_max_per_bucket=limit,
+                      local_state=TTLCache(), tenants=FakeTenants({}), mode="ddb", tenant_shards=shards)
+    tenant = f"t-{uuid.uuid4().hex}"
+
+    flags = [svc.is_blocked(tenant, f"p{i}") for i in range(limit + 5)]
+
+    assert flags == [False] * limit + [True] * 5
+    assert svc.tenant_count(tenant) == limit
+    assert svc.tenant_shards == min(shards, limit)
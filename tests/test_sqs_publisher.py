@@ -0,0 +1,59 @@
+import json
+
+from src.common.sqs_publisher import SqsBatchPublisher
+
+
+class FlakySQS:
+    """Fake SQS: pierwsza próba dla wybranych Id kończy się błędem (SenderFault=False)."""
+
+    def __init__(self, fail_first=(), sender_fault=()):
+        self.calls = []
+        self.fail_first = set(fail_first)
+        self.sender_fault = set(sender_fault)
+        self.delivered = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.calls.append([e["Id"] for e in Entries])
+        ok, failed = [], []
+        for e in Entries:
+            body = json.loads(e["MessageBody"])
+            if body["n"] in self.sender_fault:
+                failed.append({"Id": e["Id"], "SenderFault": True, "Code": "InvalidMessageContents"})
+            elif body["n"] in self.fail_first:
+                self.fail_first.discard(body["n"])
+                failed.append({"Id": e["Id"], "SenderFault": False, "Code": "InternalError"})
+            else:
+                ok.append({"Id": e["Id"]})
+                self.delivered.append(body["n"])
+        return {"Successful": ok, "Failed": failed}
+
+
+def test_publisher_batches_by_ten_and_flushes_on_exit(monkeypatch):
+    monkeypatch.setattr("src.common.sqs_publisher.time.sleep", lambda s: None)
+    sqs = FlakySQS()
+
+    with SqsBatchPublisher(sqs) as pub:
+        for n in range(23):
+            pub.publish("q-url", {"n": n})
+        assert len(sqs.calls) == 2  # dwie pełne paczki po 10
+
+    assert [len(c) for c in sqs.calls] == [10, 10, 3]
+    assert sorted(sqs.delivered) == list(range(23))
+    assert pub.sent == 23
+    assert pub.failed == []
+
+
+def test_publisher_retries_only_failed_entries(monkeypatch):
+    monkeypatch.setattr("src.common.sqs_publisher.time.sleep", lambda s: None)
+    sqs = FlakySQS(fail_first={1, 3}, sender_fault={4})
+
+    pub = SqsBatchPublisher(sqs)
+    for n in range(5):
+        pub.publish("q-url", {"n": n})
+    failed = pub.flush()
+
+    assert len(sqs.calls) == 2
+    assert len(sqs.calls[1]) == 2  # ponowione tylko 2 wpisy
+    assert sorted(sqs.delivered) == [0, 1, 2, 3]
+    assert len(failed) == 1
+    assert json.loads(failed[0]["MessageBody"]) == {"n": 4}
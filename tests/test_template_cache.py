@@ -0,0 +1,100 @@
+from src.common.cache import TTLCache
+from src.services.template_service import TemplateService, invalidate_templates
+
+
+class CountingTemplatesRepo:
+    def __init__(self, templates):
+        self.templates = templates
+        self.calls = []
+
+    def get_template(self, tenant_id, name, language_code):
+        self.calls.append((tenant_id, name, language_code))
+        return self.templates.get((name, language_code))
+
+
+class CountingTenants:
+    def __init__(self, lang):
+        self.lang = lang
+        self.calls = 0
+
+    def get(self, tenant_id):
+        self.calls += 1
+        return {"tenant_id": tenant_id, "language_code": self.lang}
+
+
+def _service(templates, tenant_lang="pl", cache=None):
+    repo = CountingTemplatesRepo(templates)
+    svc = TemplateService(repo=repo, cache=cache)
+    svc.tenants = CountingTenants(tenant_lang)
+    return svc, repo
+
+
+def test_render_named_caches_hits_misses_and_lang_chain():
+    svc, repo = _service({("greet", "pl"): {"body": "Cześć {name}"}})
+
+    # pl-PL (brak) -> pl (jest)
+    assert svc.render_named("t-1", "greet", "pl-PL", {"name": "Ala"}) == "Cześć Ala"
+    first_calls = len(repo.calls)
+    assert first_calls == 2
+
+    assert svc.render_named("t-1", "greet", "pl-PL", {"name": "Ola"}) == "Cześć Ola"
+    assert len(repo.calls) == first_calls
+    assert svc.tenants.calls == 1
+
+    stats = svc.cache_stats()
+    assert stats["hits"] >= 3
+    assert stats["misses"] >= 3
+
+
+def test_missing_template_is_negatively_cached_and_invalidated():
+    svc, repo = _service({})
+
+    assert svc.render_named("t-1", "nope", "pl", {}) == "nope"
+    calls = len(repo.calls)
+    assert svc.render_named("t-1", "nope", "pl", {}) == "nope"
+    assert len(repo.calls) == calls
+
+    repo.templates[("nope", "pl")] = {"body": "Już jest"}
+    invalidate_templates(tenant_id="t-1", name="nope")
+    assert svc.render_named("t-1", "nope", "pl", {}) == "Już jest"
+
+
+def test_ttl_cache_expires_and_evicts_lru():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl_seconds=10, now_fn=lambda: now[0])
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)  # wyrzuca "b" (najdawniej używany)
+
+    assert cache.get("b", None) is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+    now[0] = 11
+    assert cache.get("a", None) is None
+
+
+def test_preload_warms_cache_with_single_batch_get(aws_stack):
+    import boto3
+    from src.repos.templates_repo import TemplatesRepo
+
+    table = boto3.resource("dynamodb", region_name="eu-central-1").Table("Templates")
+    table.put_item(Item={"pk": "t-1#clarify_generic#pl", "body": "Doprecyzuj"})
+    table.put_item(Item={"pk": "t-1#faq_no_info#pl", "body": "Brak info"})
+
+    repo = TemplatesRepo()
+    svc = TemplateService(repo=repo)
+    svc.tenants = CountingTenants("pl")
+
+    get_calls = []
+    original_get = repo.get_template
+    repo.get_template = lambda *a: get_calls.append(a) or original_get(*a)
+
+    assert svc.render_named("t-1", "clarify_generic", "pl", {}) == "Doprecyzuj"
+    assert svc.render_named("t-1", "faq_no_info", "pl", {}) == "Brak info"
+    # brakujący, ale znany szablon – też z cache (negative entry z preloadu)
+    assert svc.render_named("t-1", "www_verified", "pl", {}) == "www_verified"
+
+    assert get_calls == []
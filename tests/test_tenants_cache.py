@@ -0,0 +1,66 @@
+import boto3
+
+from src.repos.tenants_repo import TenantsRepo
+
+
+def test_tenants_repo_caches_reads_and_writes_through(aws_stack):
+    table = boto3.resource("dynamodb", region_name="eu-central-1").Table("Tenants")
+    table.put_item(Item={"tenant_id": "t-1", "language_code": "pl"})
+
+    repo = TenantsRepo()
+    assert repo.get("t-1")["language_code"] == "pl"
+
+    # zmiana "za plecami" cache – do czasu TTL/invalidate widzimy starą wersję
+    table.put_item(Item={"tenant_id": "t-1", "language_code": "de"})
+    assert TenantsRepo().get("t-1")["language_code"] == "pl"
+
+    repo.invalidate("t-1")
+    assert repo.get("t-1")["language_code"] == "de"
+
+    # set_language podbija wersję i od razu aktualizuje cache
+    repo.set_language("t-1", "en")
+    item = TenantsRepo().get("t-1")
+    assert item["language_code"] == "en"
+    assert int(item["config_version"]) == 1
+
+    # brak tenanta też jest cache'owany
+    assert repo.get("missing") is None
+    table.put_item(Item={"tenant_id": "missing", "language_code": "pl"})
+    assert repo.get("missing") is None
+
+
+def test_set_language_drops_cached_template_lang_chain(aws_stack):
+    from src.services.template_service import TemplateService
+
+    table = boto3.resource("dynamodb", region_name="eu-central-1").Table("Tenants")
+    table.put_item(Item={"tenant_id": "t-2", "language_code": "pl"})
+    repo = TenantsRepo()
+    svc = TemplateService(tenants=repo)
+
+    assert svc._lang_chain("t-2", None)[0] == "pl"
+
+    repo.set_language("t-2", "en")
+
+    assert svc._lang_chain("t-2", None)[0] == "en"
+
+
+def test_other_container_sees_new_config_version_after_revalidation(aws_stack):
+    from src.common.cache import TTLCache
+    from src.services.template_service import TemplateService
+
+    table = boto3.resource("dynamodb", region_name="eu-central-1").Table("Tenants")
+    table.put_item(Item={"tenant_id": "t-3", "language_code": "pl"})
+    clock = [0.0]
+    # "inny kontener": osobny cache tenantów i szablonów
+    other = TenantsRepo(cache=TTLCache(), revalidate_seconds=30, now_fn=lambda: clock[0])
+    other_svc = TemplateService(tenants=other)
+    assert other_svc._lang_chain("t-3", None)[0] == "pl"
+
+    TenantsRepo(cache=TTLCache()).set_language("t-3", "en")
+
+    # przed rewalidacją kontener widzi (i cache'uje) starą konfigurację
+    assert other_svc._lang_chain("t-3", None)[0] == "pl"
+    clock[0] += 31
+    assert other.get("t-3")["language_code"] == "en"
+    # nowa wersja unieważniła też łańcuch języków (TENANT_CHANGE_LISTENERS)
+    assert other_svc._lang_chain("t-3", None)[0] == "en"
@@ -4,7 +4,7 @@ from src.domain.models import Message
 
 def test_ticket_payload_contains_history_and_meta(monkeypatch):
     class DummyNLU:
-        def classify_intent(self, text: str, lang: str | None):
+        def classify_intent(self, text: str, lang: str | None, tenant_id="default"):
             return {
                 "intent": "ticket",
                 "confidence": 0.99,
@@ -34,16 +34,14 @@ def test_ticket_payload_contains_history_and_meta(monkeypatch):
         def upsert_conversation(self, *args, **kwargs):
             pass
 
-        def get(self, key):
-            return self.pending.get(key)
+        def get_pending(self, tenant_id, phone):
+            return self.pending.get((tenant_id, phone))
 
-        def put(self, item: dict):
-            pk = item.get("pk")
-            if pk:
-                self.pending[pk] = item
+        def put_pending(self, tenant_id, phone, **attrs):
+            self.pending[(tenant_id, phone)] = attrs
 
-        def delete(self, key):
-            self.pending.pop(key, None)
+        def delete_pending(self, tenant_id, phone):
+            self.pending.pop((tenant_id, phone), None)
 
     class DummyMessagesRepo:
         def get_last_messages(self, tenant_id, conv_key, limit=10):
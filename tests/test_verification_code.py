@@ -0,0 +1,22 @@
+import time
+
+from src.repos.conversations_repo import ConversationsRepo
+
+
+def test_verification_code_roundtrip_and_expiry(conversations_table):
+    repo = ConversationsRepo()
+
+    repo.put_verification_code("t-1", "abc123", "web", "session-1")
+    found = repo.find_by_verification_code("t-1", "ABC123")
+    assert found["channel"] == "web"
+    assert found["channel_user_id"] == "session-1"
+
+    # inny tenant nie widzi kodu
+    assert repo.find_by_verification_code("t-2", "ABC123") is None
+
+    repo.delete_verification_code("t-1", "ABC123")
+    assert repo.find_by_verification_code("t-1", "ABC123") is None
+
+    # wygasły kod (TTL jeszcze go nie usunął) jest ignorowany
+    repo.put_verification_code("t-1", "OLD999", "web", "session-2", ttl_seconds=-1)
+    assert repo.find_by_verification_code("t-1", "OLD999") is None